@@ -0,0 +1,454 @@
+"""
+In-process stand-ins for WebInspect, Fortify SSC and ThreadFix, for tests and benchmarks that need real HTTP.
+Each server listens on a free port of 127.0.0.1 from a background thread, and can be slowed down with latency,
+made to fail a share of its requests with failure_rate, and sized with its own options.
+"""
+
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zipfile
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:  # Python3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeRequest(object):
+    def __init__(self, method, path, query, headers, body, match):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.match = match
+
+    def param(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+
+class Disconnect(Exception):
+    """
+    Raised by the chunks of a FakeResponse to drop the connection part way through the body
+    """
+    pass
+
+
+def interrupted(chunks, after):
+    """
+    :return: Generator of chunks that drops the connection after sending after bytes
+    """
+    sent = 0
+    for chunk in chunks:
+        if sent + len(chunk) >= after:
+            yield chunk[:after - sent]
+            raise Disconnect()
+        sent += len(chunk)
+        yield chunk
+
+
+class FakeResponse(object):
+    def __init__(self, status=200, body=b'', headers=None, chunks=None):
+        """
+        :param body: bytes, text, or anything else to send as JSON
+        :param chunks: Iterable of bytes to stream instead of body
+        """
+        self.status = status
+        self.headers = headers if headers else {}
+        self.chunks = chunks
+        if chunks is None:
+            if isinstance(body, bytes):
+                self.body = body
+            elif isinstance(body, type(u'')):
+                self.body = body.encode('utf-8')
+            else:
+                self.body = json.dumps(body).encode('utf-8')
+                self.headers.setdefault('Content-Type', 'application/json')
+
+
+class FakeServer(object):
+    """
+    Routes requests to the handlers added with route, after waiting latency seconds. A failure_rate share of the
+    requests fail with a 503 instead, chosen by a random generator seeded with seed so that runs can be repeated.
+    peak_in_flight is the most requests that were being handled at once.
+    """
+
+    def __init__(self, latency=0, failure_rate=0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.routes = []
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.server = ThreadedHTTPServer(('127.0.0.1', 0), self.__handler__())
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def route(self, method, pattern, handler):
+        self.routes.append((method, re.compile(pattern + '$'), handler))
+
+    def call_count(self, handler_name=None):
+        with self.lock:
+            if handler_name:
+                return self.calls.get(handler_name, 0)
+            return sum(self.calls.values())
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __fails__(self):
+        with self.lock:
+            return self.failure_rate and self.random.random() < self.failure_rate
+
+    def dispatch(self, method, raw_path, headers, body):
+        url = urlparse(raw_path)
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                with self.lock:
+                    self.calls[handler.__name__] = self.calls.get(handler.__name__, 0) + 1
+                    self.in_flight += 1
+                    self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                try:
+                    if self.latency:
+                        time.sleep(self.latency)
+                    if self.__fails__():
+                        return FakeResponse(503, {'message': 'Injected failure'})
+                    return handler(FakeRequest(method, url.path, parse_qs(url.query), headers, body, match))
+                finally:
+                    with self.lock:
+                        self.in_flight -= 1
+        return FakeResponse(404, {'message': 'No route for {0} {1}'.format(method, url.path)})
+
+    def __handler__(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def __handle__(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                response = server.dispatch(self.command, self.path, self.headers, body)
+                self.send_response(response.status)
+                for name, value in response.headers.items():
+                    self.send_header(name, value)
+                if response.chunks is None:
+                    self.send_header('Content-Length', str(len(response.body)))
+                    self.end_headers()
+                    self.wfile.write(response.body)
+                    return
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for chunk in response.chunks:
+                        self.wfile.write('{0:x}\r\n'.format(len(chunk)).encode('ascii') + chunk + b'\r\n')
+                except Disconnect:
+                    self.close_connection = True
+                    return
+                self.wfile.write(b'0\r\n\r\n')
+
+            do_GET = do_POST = do_PUT = do_DELETE = __handle__
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def export_chunks(size, start=0):
+    """
+    :return: Generator of the bytes start to size of a repeatable export of size bytes
+    """
+    block = (b'<Issue>fake</Issue>' * (CHUNK_SIZE // 19 + 1))[:CHUNK_SIZE]
+    position = start
+    while position < size:
+        end = min(size, (position // CHUNK_SIZE + 1) * CHUNK_SIZE)
+        yield block[position % CHUNK_SIZE:position % CHUNK_SIZE + end - position]
+        position = end
+
+
+class FakeWebInspect(FakeServer):
+    """
+    A WebInspect scan engine. Scans go from Running to Complete after status_checks status checks, and their
+    exports are export_size bytes, sent with an ETag and honouring Range requests.
+    """
+
+    def __init__(self, status_checks=2, export_size=1024, running_scans=0, **kwargs):
+        super(FakeWebInspect, self).__init__(**kwargs)
+        self.status_checks = status_checks
+        self.export_size = export_size
+        self.scans = {}
+        for _ in range(running_scans):
+            self.__add_scan__('Busy scan', status_checks=float('inf'))
+        self.uploads = []
+        scan = r'/webinspect/scanner/scans/(?P<scan_id>[0-9a-f-]+)'
+        self.route('GET', r'/webinspect/scanner/scans/?', self.list_scans)
+        self.route('POST', r'/webinspect/scanner/scans/?', self.create_scan)
+        self.route('GET', scan, self.scan_action)
+        self.route('POST', scan, self.scan_action)
+        self.route('GET', scan + r'\.(?P<extension>\w+)', self.export_scan)
+        self.route('GET', r'/webinspect/scanner/settings', self.list_assets)
+        self.route('GET', r'/webinspect/scanner/macro', self.list_assets)
+        self.route('GET', r'/webinspect/securebase/policy', self.list_assets)
+        self.route('PUT', r'/webinspect/scanner/settings', self.upload_asset)
+        self.route('PUT', r'/webinspect/scanner/macro', self.upload_asset)
+        self.route('POST', r'/webinspect/securebase/policy', self.upload_asset)
+
+    def __add_scan__(self, name, status_checks):
+        scan_id = str(uuid.uuid4())
+        with self.lock:
+            self.scans[scan_id] = {'ID': scan_id, 'Name': name, 'Status': 'Running', 'checks_left': status_checks}
+        return scan_id
+
+    def list_scans(self, request):
+        name = request.param('Name')
+        with self.lock:
+            scans = [{'ID': s['ID'], 'Name': s['Name'], 'Status': s['Status']} for s in self.scans.values()
+                     if name is None or s['Name'] == name]
+        return FakeResponse(200, scans)
+
+    def create_scan(self, request):
+        settings = json.loads(request.body.decode('utf-8'))
+        return FakeResponse(200, {'ScanId': self.__add_scan__(settings.get('overrides', {}).get('scanName', 'scan'),
+                                                              self.status_checks)})
+
+    def scan_action(self, request):
+        scan_id = request.match.group('scan_id')
+        action = request.param('action')
+        with self.lock:
+            scan = self.scans.get(scan_id)
+            if not scan:
+                return FakeResponse(404, {'message': 'No such scan'})
+            if action == 'stop':
+                scan['Status'] = 'Stopped'
+            elif action == 'getcurrentstatus' and scan['Status'] == 'Running':
+                scan['checks_left'] -= 1
+                if scan['checks_left'] <= 0:
+                    scan['Status'] = 'Complete'
+            status = scan['Status']
+        return FakeResponse(200, {'ScanStatus': status})
+
+    def export_scan(self, request):
+        scan_id = request.match.group('scan_id')
+        etag = '"{}"'.format(hashlib.sha1('{0}{1}'.format(scan_id, self.export_size).encode('utf-8')).hexdigest())
+        headers = {'ETag': etag, 'Content-Type': 'application/octet-stream'}
+        byte_range = re.match(r'bytes=(\d+)-$', request.headers.get('Range') or '')
+        if byte_range and request.headers.get('If-Range') in (None, etag):
+            start = int(byte_range.group(1))
+            if start >= self.export_size:
+                return FakeResponse(416, b'')
+            headers['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, self.export_size - 1, self.export_size)
+            return FakeResponse(206, headers=headers, chunks=export_chunks(self.export_size, start))
+        return FakeResponse(200, headers=headers, chunks=export_chunks(self.export_size))
+
+    def list_assets(self, request):
+        return FakeResponse(200, [])
+
+    def upload_asset(self, request):
+        with self.lock:
+            self.uploads.append(len(request.body))
+        return FakeResponse(200, b'')
+
+
+class FakeSsc(FakeServer):
+    """
+    A Fortify Software Security Center with projects projects of versions versions each, answering the REST calls
+    made through fortifyapi. Every version's artifact is an FPR holding artifact_size bytes, sent with an ETag and
+    honouring Range requests. The first interrupted_downloads downloads are dropped half way through.
+    """
+
+    def __init__(self, projects=10, versions=10, artifact_size=1024, interrupted_downloads=0, **kwargs):
+        super(FakeSsc, self).__init__(**kwargs)
+        self.artifact_size = artifact_size
+        fpr = io.BytesIO()
+        with zipfile.ZipFile(fpr, 'w', zipfile.ZIP_STORED) as archive:
+            archive.writestr('audit.fvdl', b''.join(export_chunks(artifact_size)))
+        self.artifact = fpr.getvalue()
+        self.interrupted_downloads = interrupted_downloads
+        self.projects = [{'id': p + 1, 'name': 'project-{}'.format(p + 1)} for p in range(projects)]
+        self.versions = [{'id': p * versions + v + 1, 'name': 'version-{}'.format(v + 1), 'project': project}
+                         for p, project in enumerate(self.projects) for v in range(versions)]
+        self.uploads = []
+        self.route('POST', r'/ssc/api/v1/tokens', self.create_token)
+        self.route('POST', r'/ssc/api/v1/fileTokens', self.create_token)
+        self.route('GET', r'/ssc/api/v1/projects', self.list_projects)
+        self.route('GET', r'/ssc/api/v1/projectVersions', self.list_versions)
+        self.route('GET', r'/ssc/api/v1/projects/(?P<project_id>\d+)/versions', self.list_versions)
+        self.route('GET', r'/ssc/api/v1/attributeDefinitions', self.list_attribute_definitions)
+        self.route('POST', r'/ssc/upload/resultFileUpload.html', self.upload_artifact)
+        self.route('GET', r'/ssc/download/currentStateFprDownload.html', self.download_artifact)
+
+    @property
+    def url(self):
+        return super(FakeSsc, self).url + '/ssc'
+
+    @staticmethod
+    def __page__(request, items):
+        start = int(request.param('start', 0))
+        limit = int(request.param('limit', 200))
+        page = items[start:] if limit < 0 else items[start:start + limit]
+        fields = request.param('fields')
+        if fields:
+            page = [dict((key, value) for key, value in item.items() if key in fields.split(',')) for item in page]
+        body = {'data': page, 'count': len(items), 'responseCode': 200}
+        etag = '"{}"'.format(hashlib.md5(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest())
+        if request.headers.get('If-None-Match') == etag:
+            return FakeResponse(304, headers={'ETag': etag})
+        return FakeResponse(200, body, {'ETag': etag})
+
+    @staticmethod
+    def __matches__(item, query):
+        # SSC joins the terms of a search with +, all of which have to match
+        for term in query.split('+') if query else []:
+            field, _, value = term.partition(':')
+            target = item
+            for part in field.split('.'):
+                target = target.get(part, {}) if isinstance(target, dict) else {}
+            if str(target) != value.strip('"'):
+                return False
+        return True
+
+    def create_token(self, request):
+        return FakeResponse(201, {'data': {'token': str(uuid.uuid4())}, 'responseCode': 201})
+
+    def list_projects(self, request):
+        return self.__page__(request, [p for p in self.projects if self.__matches__(p, request.param('q'))])
+
+    def list_versions(self, request):
+        versions = self.versions
+        if 'project_id' in request.match.groupdict():
+            versions = [v for v in versions if v['project']['id'] == int(request.match.group('project_id'))]
+        return self.__page__(request, [v for v in versions if self.__matches__(v, request.param('q'))])
+
+    def list_attribute_definitions(self, request):
+        return self.__page__(request, [{'id': 1, 'name': 'CI Number'}])
+
+    def upload_artifact(self, request):
+        with self.lock:
+            self.uploads.append(len(request.body))
+        return FakeResponse(200, u'<?xml version="1.0" encoding="UTF-8"?><Response><code>-10001</code>'
+                                 u'<msg>Background submission succeeded.</msg></Response>',
+                            {'Content-Type': 'application/xml'})
+
+    def download_artifact(self, request):
+        etag = '"{}"'.format(hashlib.sha1(self.artifact).hexdigest())
+        headers = {'ETag': etag, 'Content-Type': 'application/octet-stream',
+                   'Content-Disposition': 'attachment; filename="version-{}.fpr"'.format(request.param('id'))}
+        status, start = 200, 0
+        byte_range = re.match(r'bytes=(\d+)-$', request.headers.get('Range') or '')
+        if byte_range and request.headers.get('If-Range') in (None, etag):
+            status, start = 206, int(byte_range.group(1))
+            if start >= len(self.artifact):
+                return FakeResponse(416, b'')
+            headers['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, len(self.artifact) - 1, len(self.artifact))
+        body = self.artifact[start:]
+        with self.lock:
+            interrupt = self.interrupted_downloads > 0
+            self.interrupted_downloads -= 1 if interrupt else 0
+        if interrupt:
+            return FakeResponse(status, headers=headers, chunks=interrupted([body], len(body) // 2))
+        return FakeResponse(status, body, headers)
+
+
+class FakeThreadFix(FakeServer):
+    """
+    A ThreadFix server with teams teams of apps_per_team applications each, and scans_per_app scans per application.
+    The first rate_limited requests for a team are turned down with 429 Too Many Requests.
+    """
+
+    def __init__(self, teams=10, apps_per_team=10, scans_per_app=2, rate_limited=0, **kwargs):
+        super(FakeThreadFix, self).__init__(**kwargs)
+        self.rate_limited = rate_limited
+        self.teams = []
+        for t in range(teams):
+            applications = [{'id': t * apps_per_team + a + 1, 'name': 'team-{0}-app-{1}'.format(t + 1, a + 1)}
+                            for a in range(apps_per_team)]
+            self.teams.append({'id': t + 1, 'name': 'team-{}'.format(t + 1), 'applications': applications})
+        self.scans_per_app = scans_per_app
+        self.uploads = []
+        self.route('GET', r'/threadfix/rest/latest/teams', self.list_teams)
+        self.route('GET', r'/threadfix/rest/latest/teams/(?P<team_id>\d+)', self.get_team)
+        self.route('GET', r'/threadfix/rest/latest/applications/(?P<team>[^/]+)/lookup', self.lookup_application)
+        self.route('GET', r'/threadfix/rest/latest/applications/(?P<app_id>\d+)/scans', self.list_scans)
+        self.route('GET', r'/threadfix/rest/latest/scans/(?P<scan_id>\d+)', self.get_scan)
+        self.route('POST', r'/threadfix/rest/latest/applications/(?P<app_id>\d+)/upload', self.upload_scan)
+
+    @property
+    def url(self):
+        return super(FakeThreadFix, self).url + '/threadfix/'
+
+    @staticmethod
+    def __result__(data, success=True, message=''):
+        return FakeResponse(200, {'message': message, 'success': success, 'responseCode': -1, 'object': data})
+
+    def list_teams(self, request):
+        return self.__result__(self.teams)
+
+    def get_team(self, request):
+        with self.lock:
+            if self.rate_limited:
+                self.rate_limited -= 1
+                return FakeResponse(429, 'Too Many Requests')
+        for team in self.teams:
+            if team['id'] == int(request.match.group('team_id')):
+                return self.__result__(team)
+        return self.__result__(None, success=False, message='No team found')
+
+    def lookup_application(self, request):
+        for team in self.teams:
+            if team['name'] == request.match.group('team'):
+                for app in team['applications']:
+                    if app['name'] == request.param('name'):
+                        return self.__result__(app)
+        return self.__result__(None, success=False, message='No application found')
+
+    def list_scans(self, request):
+        app_id = int(request.match.group('app_id'))
+        return self.__result__([{'id': app_id * 1000 + s, 'scannerName': 'WebInspect'}
+                                for s in range(self.scans_per_app)])
+
+    def get_scan(self, request):
+        return self.__result__({'id': int(request.match.group('scan_id')),
+                                'originalFileNames': ['scan-{}.xml'.format(request.match.group('scan_id'))]})
+
+    def upload_scan(self, request):
+        with self.lock:
+            self.uploads.append(len(request.body))
+        return self.__result__({'id': 1})
@@ -0,0 +1,140 @@
+"""
+End-to-end timings of WebBreaker flows against the servers in fakeservers. The default sizes keep the suite fast;
+set WEBBREAKER_BENCHMARK_SCALE to multiply them, and WEBBREAKER_BENCHMARK_OUTPUT to a file to append the timings
+to as JSON lines, e.g.
+    WEBBREAKER_BENCHMARK_SCALE=20 WEBBREAKER_BENCHMARK_OUTPUT=bench.jsonl python -m pytest -s tests/test_benchmarks.py
+"""
+
+import json
+import mock
+import os
+import pytest
+import time
+from contextlib import contextmanager
+
+from tests.fakeservers import FakeSsc, FakeThreadFix, FakeWebInspect
+from webbreaker.threadfixclient import ThreadFixClient
+from webbreaker.webinspectclient import WebinspectClient
+from webbreaker.webinspectmanifest import AssetManifest
+from webbreaker.webinspectsession import PooledWebInspectApi, close_sessions
+
+SCALE = int(os.getenv('WEBBREAKER_BENCHMARK_SCALE', '1'))
+OUTPUT = os.getenv('WEBBREAKER_BENCHMARK_OUTPUT')
+
+SCAN_SETTINGS = {'webinspect_scan_size': 'size_large',
+                 'webinspect_settings': 'Default',
+                 'webinspect_scan_name': 'benchmark-scan',
+                 'webinspect_upload_settings': None,
+                 'webinspect_upload_policy': None,
+                 'webinspect_upload_webmacros': [],
+                 'webinspect_overrides_scan_mode': None,
+                 'webinspect_overrides_scan_scope': None,
+                 'webinspect_overrides_login_macro': None,
+                 'webinspect_overrides_scan_policy': None,
+                 'webinspect_overrides_scan_start': None,
+                 'webinspect_overrides_start_urls': [],
+                 'webinspect_workflow_macros': [],
+                 'webinspect_allowed_hosts': []}
+
+
+@contextmanager
+def benchmark(name, **sizes):
+    start = time.time()
+    yield
+    elapsed = time.time() - start
+    print("{0} {1}: {2:.3f}s".format(name, sizes, elapsed))
+    if OUTPUT:
+        with open(OUTPUT, 'a') as f:
+            f.write(json.dumps({'benchmark': name, 'sizes': sizes, 'seconds': elapsed, 'scale': SCALE}) + '\n')
+
+
+@contextmanager
+def fake_servers(servers):
+    for server in servers:
+        server.start()
+    try:
+        yield servers
+    finally:
+        for server in servers:
+            server.stop()
+        close_sessions()
+
+
+def webinspect_config(engines):
+    return mock.Mock(endpoints=[[engine.url, '2'] for engine in engines], sizing=[['size_large', '2']],
+                     probe_timeout=5, probe_pool_size=8, scheduler='least_loaded', lease_backend='sqlite',
+                     lease_ttl=600, upload_pool_size=4, scan_poll_interval=0.01, scan_max_poll_interval=0.05,
+                     scan_reconnect_timeout=5, scan_stall_timeout=5, scan_long_poll_timeout=1)
+
+
+@mock.patch('webbreaker.webinspectclient.get_lease_backend', return_value=None)
+def test_benchmark_webinspect_scan(lease_mock, tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    engine_count = 4 * SCALE
+    # Every engine but the last is full
+    engines = [FakeWebInspect(running_scans=2, latency=0.01) for _ in range(engine_count - 1)]
+    engines.append(FakeWebInspect(export_size=256 * 1024, latency=0.01))
+
+    with fake_servers(engines), \
+            mock.patch('webbreaker.webinspectclient.WebInspectConfig', return_value=webinspect_config(engines)), \
+            mock.patch('webbreaker.webinspectclient.AssetManifest',
+                       lambda: AssetManifest(db_path=str(tmpdir.join('manifest.db')))):
+        with benchmark('webinspect scan', engines=engine_count):
+            client = WebinspectClient(SCAN_SETTINGS)
+            scan_id = client.create_scan()
+            status = client.watch_scan(scan_id)
+            client.export_scan_results(scan_id, 'fpr', 'xml')
+
+    assert client.url == engines[-1].url
+    assert status == 'Complete'
+    assert tmpdir.join('benchmark-scan.fpr').size() == 256 * 1024
+    assert tmpdir.join('benchmark-scan.xml').size() == 256 * 1024
+
+
+def test_benchmark_webinspect_large_export(tmpdir):
+    export_size = 16 * 1024 * 1024 * SCALE
+    with fake_servers([FakeWebInspect(export_size=export_size)]) as (engine,):
+        scan_id = '0f2a5c1e'
+        file_path = str(tmpdir.join('export.fpr'))
+        with benchmark('webinspect export', megabytes=export_size // (1024 * 1024)):
+            response = PooledWebInspectApi(engine.url).download_scan_format(scan_id, 'fpr', file_path)
+
+    assert response.success
+    assert os.path.getsize(file_path) == export_size
+
+
+def test_benchmark_webinspect_export_failures(tmpdir):
+    with fake_servers([FakeWebInspect(failure_rate=1)]) as (engine,):
+        response = PooledWebInspectApi(engine.url).download_scan_format('0000', 'fpr', str(tmpdir.join('export.fpr')))
+
+    assert not response.success
+    assert response.response_code == 503
+
+
+def test_benchmark_fortify_upload(tmpdir):
+    fortify = pytest.importorskip('fortifyapi.fortify')
+    if not hasattr(fortify.FortifyApi, 'upload_artifact_scan'):
+        pytest.skip('FortifyClient needs the fortifyapi upload API')
+    from webbreaker.fortifyclient import FortifyClient
+    from webbreaker.fortifyindex import FortifyIndex
+    scan_file = tmpdir.join('benchmark-scan.fpr')
+    scan_file.write_binary(b'0' * (4 * 1024 * 1024 * SCALE))
+
+    # upload_scan reads the scan from the working directory
+    with fake_servers([FakeSsc(projects=50 * SCALE, versions=20)]) as (ssc,), tmpdir.as_cwd():
+        with benchmark('fortify upload', projects=50 * SCALE, megabytes=4 * SCALE):
+            client = FortifyClient(ssc.url, application_name='project-1', scan_name='version-1', extension='fpr',
+                                   token='benchmark-token', index=FortifyIndex(str(tmpdir.join('index.db')), 3600))
+            client.upload_scan(str(scan_file))
+
+    assert ssc.uploads
+
+
+def test_benchmark_threadfix_list():
+    teams = 20 * SCALE
+    with fake_servers([FakeThreadFix(teams=teams, apps_per_team=100, latency=0.002)]) as (threadfix,):
+        with benchmark('threadfix list', teams=teams, applications=teams * 100):
+            applications = ThreadFixClient(threadfix.url, 'api-key').list_all_apps()
+
+    assert len(applications) == teams * 100
+    assert applications[0] == {'team_id': 1, 'team_name': 'team-1', 'app_id': 1, 'app_name': 'team-1-app-1'}
@@ -1,6 +1,7 @@
 import mock
 from mock import mock_open
 
+from webbreaker import confighelper
 from webbreaker.confighelper import Config
 import os
 
@@ -192,7 +193,7 @@ def test_set_config_basic(set_vars_mock, conf_get_mock):
 
     Config()
 
-    assert conf_get_mock.call_count == 46
+    assert conf_get_mock.call_count == 72
 
 
 @mock.patch('webbreaker.confighelper.Config.set_vars')
@@ -254,3 +255,43 @@ def test_conf_get_option_exec(open_mock, write_mock, set_mock, read_mock, set_co
     assert open_mock.call_count == 1
     assert write_mock.call_count == 1
     assert result == 'test_value'
+
+
+def config_at(tmpdir):
+    with mock.patch('webbreaker.confighelper.Config.set_vars'), \
+            mock.patch('webbreaker.confighelper.Config.set_config'):
+        test_obj = Config()
+    test_obj.config = str(tmpdir.join('config.ini'))
+    tmpdir.join('config.ini').write('[fortify]\nssc_url = https://fortify.test\n')
+    return test_obj
+
+
+def test_conf_get_parses_once(tmpdir):
+    Config.invalidate()
+    test_obj = config_at(tmpdir)
+
+    with mock.patch.object(confighelper.config, 'read', wraps=confighelper.config.read) as read_mock:
+        assert test_obj.conf_get('fortify', 'ssc_url') == 'https://fortify.test'
+        assert test_obj.conf_get('fortify', 'ssc_url') == 'https://fortify.test'
+        assert read_mock.call_count == 1
+
+        # Changed on disk
+        tmpdir.join('config.ini').write('[fortify]\nssc_url = https://other-fortify.test\n')
+        assert test_obj.conf_get('fortify', 'ssc_url') == 'https://other-fortify.test'
+        assert read_mock.call_count == 2
+    Config.invalidate()
+
+
+def test_set_config_writes_defaults_once(tmpdir):
+    Config.invalidate()
+    test_obj = config_at(tmpdir)
+
+    with mock.patch.object(confighelper.config, 'write', wraps=confighelper.config.write) as write_mock:
+        test_obj.set_config()
+        assert write_mock.call_count == 1
+        test_obj.set_config()
+        assert write_mock.call_count == 1
+
+    assert test_obj.conf_get('fortify', 'ssc_url') == 'https://fortify.test'
+    assert 'probe_timeout = 15' in tmpdir.join('config.ini').read()
+    Config.invalidate()
@@ -301,3 +301,15 @@ def test_fortify_download_version_id_failure(client_mock, test_mock, runner, cap
 
 # TODO: Test webbreaker fortifiy upload
 # TODO: Test webbreaker fortify scan
+
+
+@mock.patch('webbreaker.__main__.FortifyConfig')
+@mock.patch('webbreaker.__main__.FortifyClient')
+def test_fortify_list_refresh(client_mock, test_mock, runner):
+    test_mock.return_value.has_auth_creds.return_value = True
+
+    result = runner.invoke(webbreaker, ['fortify', 'list', '--refresh'])
+
+    client_mock.return_value.refresh_index.assert_called_once_with(force=True)
+    client_mock.return_value.list_versions.assert_called_once_with()
+    assert result.exit_code == 0
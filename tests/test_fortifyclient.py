@@ -0,0 +1,106 @@
+import mock
+import pytest
+
+from tests.fakeservers import FakeSsc
+from webbreaker.fortifyclient import FortifyClient, search_term
+from webbreaker.fortifyindex import FortifyIndex
+from fortifyapi.fortify import FortifyApi, FortifyResponse
+
+
+@pytest.fixture
+def ssc():
+    with FakeSsc(projects=30, versions=10) as ssc:
+        yield ssc
+
+
+@pytest.fixture
+def index(tmpdir):
+    return FortifyIndex(str(tmpdir.join('webinspect.db')), ttl=3600)
+
+
+def test_find_version_id_single_request(ssc, index):
+    client = FortifyClient(ssc.url, application_name='project-12', token='test-token', index=index)
+
+    assert client.find_version_id('version-3') == 113
+    assert client.find_version_id('version-99') is False
+    assert ssc.call_count('list_versions') == 2
+    # Served from the index
+    assert client.find_version_id('version-3') == 113
+    assert ssc.call_count('list_versions') == 2
+
+
+def test_get_project_version_searches_by_name(ssc, index):
+    client = FortifyClient(ssc.url, application_name='project-2', scan_name='version-10', token='test-token',
+                           index=index)
+
+    assert client.__get_project_version__() == 20
+    assert client.__get_project_id__('project-2') == 2
+    assert ssc.call_count('list_projects') == 0
+    client.application_name = 'missing-project'
+    assert client.__get_project_version__() == -2
+
+
+def test_refresh_index_conditional(ssc, index):
+    client = FortifyClient(ssc.url, token='test-token', index=index)
+
+    assert client.refresh_index() is None
+    assert len(index.versions(ssc.url)) == 300
+    assert not index.is_stale(ssc.url)
+    # Current, so nothing is requested
+    client.refresh_index()
+    assert ssc.call_count('list_versions') == 2
+
+    del ssc.versions[150]
+    with mock.patch('fortifyapi.fortify.FortifyApi._request', wraps=FortifyApi(ssc.url)._request) as request_mock:
+        client.refresh_index(force=True)
+    assert [call[1]['headers'].get('If-None-Match') is not None for call in request_mock.call_args_list] == \
+        [True, True]
+    assert len(index.versions(ssc.url)) == 299
+    assert index.version_id(ssc.url, 'project-16', 'version-1') is None
+    assert index.version_id(ssc.url, 'project-16', 'version-2') == 152
+
+
+def test_refresh_index_unchanged(ssc, index):
+    client = FortifyClient(ssc.url, token='test-token', index=index)
+    client.refresh_index()
+
+    with mock.patch.object(index, 'store_page') as store_mock:
+        client.refresh_index(force=True)
+
+    assert not store_mock.called
+    assert len(index.versions(ssc.url)) == 300
+
+
+def test_list_application_versions_from_index(ssc, index):
+    client = FortifyClient(ssc.url, token='test-token', index=index)
+    client.refresh_index()
+
+    with mock.patch('webbreaker.fortifyclient.Logger') as logger_mock:
+        client.list_application_versions('project-3')
+
+    assert logger_mock.console.info.call_count == 12
+    assert ssc.call_count('list_versions') == 2
+
+
+def test_search_pages_through_results(ssc, index):
+    client = FortifyClient(ssc.url, token='test-token', index=index)
+
+    response = client.__search__('/api/v1/projectVersions', fields='id,name,project', page_size=40)
+
+    assert response.success
+    assert [v['id'] for v in response.data['data']] == list(range(1, 301))
+    assert ssc.call_count('list_versions') == 8
+
+
+@mock.patch('fortifyapi.fortify.FortifyApi._request')
+def test_get_project_version_unauthorized(request_mock):
+    request_mock.return_value = FortifyResponse(success=False, message='401 Client Error: Unauthorized')
+    client = FortifyClient('https://fortify.example.com/ssc', application_name='test-app', scan_name='test-version',
+                           token='test-token', index=False)
+
+    assert client.__get_project_version__() == -1
+
+
+def test_search_term_quotes_value():
+    assert search_term('project.name', 'My App') == 'project.name:"My App"'
+    assert search_term('name', 'say "hi"') == 'name:"say \\"hi\\""'
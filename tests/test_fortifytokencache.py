@@ -0,0 +1,130 @@
+import mock
+import pytest
+import time
+from cryptography.fernet import Fernet
+
+from webbreaker.fortifytokencache import FortifyTokenCache, parse_terminal_date
+
+SSC_URL = 'https://fortify.example.com/ssc'
+
+
+@pytest.fixture
+def token_cache(tmpdir):
+    return FortifyTokenCache(str(tmpdir.join('webinspect.db')), Fernet.generate_key(), token_ttl=3600,
+                             refresh_margin=300)
+
+
+def test_token_reused_across_instances(tmpdir, token_cache):
+    authenticate = mock.Mock(return_value=('test-token', time.time() + 3600))
+
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) == 'test-token'
+    other_cache = FortifyTokenCache(token_cache.db_path, token_cache.fernet_key, token_ttl=3600, refresh_margin=300)
+    assert other_cache.get(SSC_URL, 'user', 'password', authenticate) == 'test-token'
+    assert authenticate.call_count == 1
+
+
+def test_token_encrypted_at_rest(token_cache):
+    import sqlite3
+    token_cache.get(SSC_URL, 'user', 'password', mock.Mock(return_value=('test-token', None)))
+
+    stored = sqlite3.connect(token_cache.db_path).execute("SELECT token FROM fortify_user_tokens").fetchone()[0]
+    assert b'test-token' not in bytes(stored)
+
+
+def test_password_not_guessable_from_cache(token_cache):
+    import hashlib
+    import sqlite3
+    token_cache.get(SSC_URL, 'user', 'password', mock.Mock(return_value=('test-token', None)))
+
+    rows = sqlite3.connect(token_cache.db_path).execute("SELECT ssc_url, username, fingerprint "
+                                                        "FROM fortify_user_tokens").fetchall()
+    assert rows[0][:2] == (SSC_URL, 'user')
+    # Checking a guess takes the secret
+    for guess in ('password', '\n'.join([SSC_URL, 'user', 'password'])):
+        assert hashlib.sha256(guess.encode('utf-8')).hexdigest() != rows[0][2]
+
+
+def test_token_refreshed_ahead_of_expiry(token_cache):
+    authenticate = mock.Mock(side_effect=[('old-token', time.time() + 60), ('new-token', time.time() + 3600)])
+
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) == 'old-token'
+    # Expires within the refresh margin
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) == 'new-token'
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) == 'new-token'
+    assert authenticate.call_count == 2
+
+
+def test_token_not_shared_across_credentials(token_cache):
+    authenticate = mock.Mock(side_effect=[('user-token', None), ('other-token', None), ('changed-token', None)])
+
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) == 'user-token'
+    assert token_cache.get(SSC_URL, 'other', 'password', authenticate) == 'other-token'
+    assert token_cache.get(SSC_URL, 'user', 'changed', authenticate) == 'changed-token'
+    # The token of the old password was replaced
+    assert token_cache.get(SSC_URL, 'user', 'password', mock.Mock(return_value=('new-token', None))) == 'new-token'
+
+
+def test_token_invalidate(token_cache):
+    authenticate = mock.Mock(side_effect=[('revoked-token', None), ('new-token', None)])
+
+    token_cache.get(SSC_URL, 'user', 'password', authenticate)
+    token_cache.invalidate(SSC_URL, 'user', 'password')
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) == 'new-token'
+
+
+def test_token_undecryptable_is_replaced(token_cache):
+    authenticate = mock.Mock(side_effect=[('test-token', None), ('new-token', None)])
+    token_cache.get(SSC_URL, 'user', 'password', authenticate)
+    # The secret was rotated
+    token_cache.fernet_key = Fernet.generate_key()
+
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) == 'new-token'
+
+
+def test_failed_authentication_not_cached(token_cache):
+    authenticate = mock.Mock(side_effect=[(None, None), ('test-token', None)])
+
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) is None
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) == 'test-token'
+
+
+def test_parse_terminal_date():
+    assert parse_terminal_date('2018-03-14T18:32:06.000+0000') == 1521052326
+    assert parse_terminal_date('2018-03-14T18:32:06.000+0100') == 1521052326 - 3600
+    assert parse_terminal_date('2018-03-14T18:32:06.000-05:00') == 1521052326 + 5 * 3600
+    assert parse_terminal_date(None) is None
+    assert parse_terminal_date('not a date') is None
+
+
+@mock.patch('webbreaker.fortifyclient.FortifyApi')
+def test_fortify_client_reauthenticates_rejected_token(api_mock, token_cache):
+    from webbreaker.fortifyclient import FortifyClient
+    api_mock.return_value.get_token.side_effect = [
+        mock.Mock(success=True, data={'data': {'token': 'revoked-token'}}),
+        mock.Mock(success=True, data={'data': {'token': 'new-token', 'terminalDate': '2099-01-01T00:00:00.000+0000'}})]
+    client = FortifyClient(SSC_URL, application_name='test-app', fortify_username='user', fortify_password='password',
+                           scan_name='test-version', token_cache=token_cache)
+
+    with mock.patch.object(FortifyClient, '__get_project_version__', side_effect=[-1, 10]), \
+            mock.patch.object(FortifyClient, '__get_project_id__', return_value=1):
+        assert client.build_pv_url().endswith('/version/10')
+    assert client.token == 'new-token'
+    assert FortifyClient(SSC_URL, fortify_username='user', fortify_password='password',
+                         token_cache=token_cache).token == 'new-token'
+
+
+def test_login_does_not_lock_token_database(token_cache):
+    import sqlite3
+
+    def authenticate():
+        # Other users of the database, e.g. leases, carry on while this run logs in
+        connection = sqlite3.connect(token_cache.db_path, timeout=0, isolation_level=None)
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("ROLLBACK")
+        connection.close()
+        # While other runs wait on the login lock
+        with pytest.raises(sqlite3.OperationalError):
+            sqlite3.connect(token_cache.lock_path, timeout=0, isolation_level=None).execute("BEGIN IMMEDIATE")
+        return 'test-token', None
+
+    assert token_cache.get(SSC_URL, 'user', 'password', authenticate) == 'test-token'
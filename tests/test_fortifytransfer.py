@@ -0,0 +1,160 @@
+import mock
+import pytest
+import requests
+
+from tests.fakeservers import FakeSsc
+from fortifyapi.fortify import FortifyApi
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from webbreaker.fortifytransfer import download_artifact, response_digest, upload_artifact
+from webbreaker.transferutil import MultipartFileStream, TransferProgress
+
+
+@pytest.fixture
+def scan_file(tmpdir):
+    scan_file = tmpdir.join('test-scan.fpr')
+    scan_file.write_binary(b'0123456789' * 10000)
+    return str(scan_file)
+
+
+def test_multipart_file_stream_reads_in_chunks(scan_file):
+    body = MultipartFileStream(scan_file, chunk_size=4096)
+    chunks = []
+    for chunk in iter(lambda: body.read(8192), b''):
+        assert len(chunk) <= 4096
+        chunks.append(chunk)
+    data = b''.join(chunks)
+
+    assert len(data) == len(body)
+    assert data.startswith('--{}\r\n'.format(body.boundary).encode('utf-8'))
+    assert b'filename="test-scan.fpr"' in data
+    assert b'\r\n\r\n' + b'0123456789' * 10000 + '\r\n--{}--\r\n'.format(body.boundary).encode('utf-8') in data
+    assert body.content_type == 'multipart/form-data; boundary={}'.format(body.boundary)
+    body.close()
+
+
+@mock.patch('webbreaker.transferutil.Logger')
+def test_transfer_progress_steps(logger_mock):
+    progress = TransferProgress('Uploading test-scan.fpr', 1000, step=25)
+    for done in range(0, 1001, 100):
+        progress.update(done)
+
+    assert logger_mock.console.info.call_count == 4
+    assert 'MB/s' in logger_mock.console.info.call_args[0][0]
+    progress.finish()
+    assert 'seconds' in logger_mock.console.info.call_args[0][0]
+
+
+@mock.patch('webbreaker.fortifytransfer.Logger')
+def test_upload_artifact_streams_file(logger_mock, scan_file):
+    with FakeSsc() as ssc:
+        api = FortifyApi(ssc.url, token='test-token', verify_ssl=False)
+        response = upload_artifact(api, scan_file, 1, retries=0)
+
+    assert response.success
+    assert len(ssc.uploads) == 1
+    assert ssc.uploads[0] > 100000
+
+
+@mock.patch('webbreaker.fortifytransfer.time.sleep')
+@mock.patch('webbreaker.fortifytransfer.Logger')
+def test_upload_artifact_retries_transient_failure(logger_mock, sleep_mock, scan_file):
+    send = requests.post
+    outcomes = [requests.exceptions.ConnectTimeout('Test error'),
+                requests.exceptions.ConnectionError(MaxRetryError(None, '/upload', NewConnectionError(None, 'Test')))]
+
+    def post(*args, **kwargs):
+        if not outcomes:
+            return send(*args, **kwargs)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with FakeSsc() as ssc:
+        api = FortifyApi(ssc.url, token='test-token', verify_ssl=False)
+        with mock.patch('webbreaker.fortifytransfer.requests.post', side_effect=post):
+            response = upload_artifact(api, scan_file, 1, retries=2, backoff=1)
+
+    assert response.success
+    # Neither attempt got as far as sending the scan
+    assert [call[0][0] for call in sleep_mock.call_args_list] == [1, 2]
+    # A new file token for every attempt
+    assert ssc.call_count('create_token') == 3
+    assert len(ssc.uploads) == 1
+
+
+@pytest.mark.parametrize('outcome', [requests.exceptions.ReadTimeout('Test error'),
+                                     requests.exceptions.ConnectionError('Connection aborted.'),
+                                     mock.Mock(status_code=503, reason='Service Unavailable')])
+@mock.patch('webbreaker.fortifytransfer.time.sleep')
+@mock.patch('webbreaker.fortifytransfer.Logger')
+def test_upload_artifact_sent_scan_not_retried(logger_mock, sleep_mock, outcome, scan_file):
+    api = mock.Mock(host='https://fortify.example.com/ssc', token='test-token', verify_ssl=False, timeout=60)
+    api.get_file_token.return_value = mock.Mock(success=True, data={'data': {'token': 'file-token'}})
+    with mock.patch('webbreaker.fortifytransfer.requests.post', side_effect=[outcome]) as post_mock:
+        response = upload_artifact(api, scan_file, 1, retries=3)
+
+    # SSC may have processed the scan, sending it again could add the artifact twice
+    assert not response.success
+    assert post_mock.call_count == 1
+    assert not sleep_mock.called
+
+
+@mock.patch('webbreaker.fortifytransfer.time.sleep')
+@mock.patch('webbreaker.fortifytransfer.Logger')
+def test_upload_artifact_unauthorized_not_retried(logger_mock, sleep_mock, scan_file):
+    with mock.patch('webbreaker.fortifytransfer.requests.post',
+                    return_value=mock.Mock(status_code=401, reason='Unauthorized')) as post_mock:
+        api = mock.Mock(host='https://fortify.example.com/ssc', token='test-token', verify_ssl=False, timeout=60)
+        api.get_file_token.return_value = mock.Mock(success=True, data={'data': {'token': 'file-token'}})
+        response = upload_artifact(api, scan_file, 1, retries=3)
+
+    assert "401" in response.message
+    assert post_mock.call_count == 1
+    assert not sleep_mock.called
+
+
+@mock.patch('webbreaker.fortifytransfer.Logger')
+def test_download_artifact_streams_to_file(logger_mock, tmpdir):
+    with FakeSsc(artifact_size=300000) as ssc:
+        api = FortifyApi(ssc.url, token='test-token', verify_ssl=False)
+        response, file_path = download_artifact(api, 7, str(tmpdir), retries=0, chunk_size=4096)
+
+    assert response.success
+    assert file_path == str(tmpdir.join('version-7.fpr'))
+    assert tmpdir.join('version-7.fpr').read_binary() == ssc.artifact
+    assert tmpdir.listdir() == [tmpdir.join('version-7.fpr')]
+
+
+@mock.patch('webbreaker.fortifytransfer.time.sleep')
+@mock.patch('webbreaker.fortifytransfer.Logger')
+def test_download_artifact_resumes_interrupted(logger_mock, sleep_mock, tmpdir):
+    with FakeSsc(artifact_size=300000, interrupted_downloads=1) as ssc:
+        api = FortifyApi(ssc.url, token='test-token', verify_ssl=False)
+        with mock.patch('webbreaker.fortifytransfer.requests.get', wraps=requests.get) as get_mock:
+            response, file_path = download_artifact(api, 7, str(tmpdir), retries=2)
+
+    assert response.success
+    assert tmpdir.join('version-7.fpr').read_binary() == ssc.artifact
+    assert sleep_mock.call_count == 1
+    assert get_mock.call_args_list[1][1]['headers']['Range'].startswith('bytes=')
+    assert tmpdir.listdir() == [tmpdir.join('version-7.fpr')]
+
+
+@mock.patch('webbreaker.fortifytransfer.time.sleep')
+@mock.patch('webbreaker.fortifytransfer.Logger')
+def test_download_artifact_rejects_corrupt_fpr(logger_mock, sleep_mock, tmpdir):
+    with FakeSsc(artifact_size=300000) as ssc:
+        ssc.artifact = ssc.artifact[:1000] + b'corrupt' + ssc.artifact[1007:]
+        api = FortifyApi(ssc.url, token='test-token', verify_ssl=False)
+        response, file_path = download_artifact(api, 7, str(tmpdir), retries=1)
+
+    assert not response.success
+    assert file_path is None
+    assert tmpdir.listdir() == []
+
+
+def test_response_digest():
+    assert response_digest({'Digest': 'SHA-256=abc='}) == ('sha256', 'abc=')
+    assert response_digest({'Content-MD5': 'def='}) == ('md5', 'def=')
+    assert response_digest({}) is None
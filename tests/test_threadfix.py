@@ -147,6 +147,28 @@ def test_threadfix_scans(test_mock, runner, caplog):
     assert result.exit_code == 0
 
 
+@mock.patch('webbreaker.__main__.ThreadFixClient')
+def test_threadfix_scans_no_filenames(test_mock, runner, caplog):
+    test_mock.return_value.list_scans_by_app.return_value = [
+        {"id": 246,
+         "scannerName": 'Burp Suite'
+         },
+    ]
+
+    result = runner.invoke(webbreaker, ['threadfix', 'scans', '--app_id', 321, '--no_filenames'])
+
+    caplog.check(
+        ('__webbreaker__', 'INFO', 'Successfully listed threadfix scans'),
+    )
+    caplog.uninstall()
+
+    test_mock.return_value.list_scans_by_app.assert_called_once_with('321', filenames=False)
+    assert """    ID     Scanner Name                  
+---------- ------------------------------
+   246     Burp Suite""" in result.output
+    assert result.exit_code == 0
+
+
 @mock.patch('webbreaker.__main__.ThreadFixClient')
 def test_threadfix_scans_none(test_mock, runner, caplog):
     test_mock.return_value.list_scans_by_app.return_value = None
@@ -215,27 +237,14 @@ def test_threadfix_upload_success(test_mock, runner, caplog):
 
 @mock.patch('webbreaker.__main__.ThreadFixClient')
 def test_threadfix_upload_team_name_match(test_mock, runner, caplog):
-    test_mock.return_value.list_all_apps.return_value = [
-                                                        {
-                                                          'team_name': 'Marketing',
-                                                          'team_id': 321,
-                                                          'app_id': 123,
-                                                          'app_name': 'our_app'
-                                                        },
-                                                        {
-                                                          'team_name': 'AppSec',
-                                                          'team_id': 654,
-                                                          'app_id': 456,
-                                                          'app_name': 'appsec_app'
-                                                        },
-                                                        {
-                                                          'team_name': 'Operations',
-                                                          'team_id': 987,
-                                                          'app_id': 789,
-                                                          'app_name': 'our_app'
-                                                        }
-                                                    ]
-    test_mock.list_all_apps()
+    test_mock.return_value.find_apps.return_value = [
+                                                    {
+                                                      'team_name': 'AppSec',
+                                                      'team_id': 654,
+                                                      'app_id': 456,
+                                                      'app_name': 'appsec_app'
+                                                    }
+                                                ]
 
     test_mock.return_value.upload_scan.return_value = "Scan upload process started."
     test_mock.upload_scan()
@@ -246,32 +255,27 @@ def test_threadfix_upload_team_name_match(test_mock, runner, caplog):
                  ('__webbreaker__', 'INFO', 'Scan upload process started.'))
     caplog.uninstall()
 
+    test_mock.return_value.find_apps.assert_called_once_with(app_name='appsec_app', exact=True)
+    test_mock.return_value.upload_scan.assert_called_once_with(456, 'kyler_secret_scan.xml')
     assert result.exit_code == 0
 
 
 @mock.patch('webbreaker.__main__.ThreadFixClient')
 def test_threadfix_upload_team_name_match_multi(test_mock, runner, caplog):
-    test_mock.return_value.list_all_apps.return_value = [
-                                                        {
-                                                          'team_name': 'Marketing',
-                                                          'team_id': 321,
-                                                          'app_id': 123,
-                                                          'app_name': 'our_app'
-                                                        },
-                                                        {
-                                                          'team_name': 'AppSec',
-                                                          'team_id': 654,
-                                                          'app_id': 456,
-                                                          'app_name': 'appsec_app'
-                                                        },
-                                                        {
-                                                          'team_name': 'Operations',
-                                                          'team_id': 987,
-                                                          'app_id': 789,
-                                                          'app_name': 'our_app'
-                                                        }
-                                                    ]
-    test_mock.list_all_apps()
+    test_mock.return_value.find_apps.return_value = [
+                                                    {
+                                                      'team_name': 'Marketing',
+                                                      'team_id': 321,
+                                                      'app_id': 123,
+                                                      'app_name': 'our_app'
+                                                    },
+                                                    {
+                                                      'team_name': 'Operations',
+                                                      'team_id': 987,
+                                                      'app_id': 789,
+                                                      'app_name': 'our_app'
+                                                    }
+                                                ]
 
     test_mock.return_value.upload_scan.return_value = "Scan upload process started."
     test_mock.upload_scan()
@@ -297,27 +301,7 @@ def test_threadfix_upload_team_name_match_multi(test_mock, runner, caplog):
 
 @mock.patch('webbreaker.__main__.ThreadFixClient')
 def test_threadfix_upload_team_name_match_none(test_mock, runner, caplog):
-    test_mock.return_value.list_all_apps.return_value = [
-                                                        {
-                                                          'team_name': 'Marketing',
-                                                          'team_id': 321,
-                                                          'app_id': 123,
-                                                          'app_name': 'our_app'
-                                                        },
-                                                        {
-                                                          'team_name': 'AppSec',
-                                                          'team_id': 654,
-                                                          'app_id': 456,
-                                                          'app_name': 'appsec_app'
-                                                        },
-                                                        {
-                                                          'team_name': 'Operations',
-                                                          'team_id': 987,
-                                                          'app_id': 789,
-                                                          'app_name': 'our_app'
-                                                        }
-                                                    ]
-    test_mock.list_all_apps()
+    test_mock.return_value.find_apps.return_value = []
 
     test_mock.return_value.upload_scan.return_value = "Scan upload process started."
     test_mock.upload_scan()
@@ -334,7 +318,7 @@ def test_threadfix_upload_team_name_match_none(test_mock, runner, caplog):
 
 @mock.patch('webbreaker.__main__.ThreadFixClient')
 def test_threadfix_list_success(test_mock, runner, caplog):
-    test_mock.return_value.list_all_apps.return_value = [
+    test_mock.return_value.find_apps.return_value = [
                                                         {
                                                           'team_name': 'Marketing',
                                                           'app_id': 123,
@@ -345,7 +329,7 @@ def test_threadfix_list_success(test_mock, runner, caplog):
                                                           'app_id': 456,
                                                           'app_name': 'Buggy App'
                                                         }]
-    test_mock.list_all_apps()
+    test_mock.find_apps()
 
     result = runner.invoke(webbreaker, ['threadfix', 'list'])
 
@@ -367,8 +351,8 @@ def test_threadfix_list_success(test_mock, runner, caplog):
 
 @mock.patch('webbreaker.__main__.ThreadFixClient')
 def test_threadfix_list_failure(test_mock, runner, caplog):
-    test_mock.return_value.list_all_apps.return_value = False
-    test_mock.list_all_apps()
+    test_mock.return_value.find_apps.return_value = False
+    test_mock.find_apps()
 
     result = runner.invoke(webbreaker, ['threadfix', 'list'])
 
@@ -380,8 +364,8 @@ def test_threadfix_list_failure(test_mock, runner, caplog):
 
 @mock.patch('webbreaker.__main__.ThreadFixClient')
 def test_threadfix_list_empty(test_mock, runner, caplog):
-    test_mock.return_value.list_all_apps.return_value = []
-    test_mock.list_all_apps()
+    test_mock.return_value.find_apps.return_value = []
+    test_mock.find_apps()
 
     result = runner.invoke(webbreaker, ['threadfix', 'list'])
 
@@ -392,8 +376,8 @@ def test_threadfix_list_empty(test_mock, runner, caplog):
 
 @mock.patch('webbreaker.__main__.ThreadFixClient')
 def test_threadfix_list_empty_query(test_mock, runner, caplog):
-    test_mock.return_value.list_all_apps.return_value = []
-    test_mock.list_all_apps()
+    test_mock.return_value.find_apps.return_value = []
+    test_mock.find_apps()
 
     result = runner.invoke(webbreaker, ['threadfix', 'list', '--team', 'Security', '--application', 'Extra Super Secret App'])
 
@@ -402,3 +386,19 @@ def test_threadfix_list_empty_query(test_mock, runner, caplog):
 
     assert result.exit_code == 0
 
+
+@mock.patch('webbreaker.__main__.ThreadFixClient')
+def test_threadfix_list_refresh(test_mock, runner, caplog):
+    test_mock.return_value.refresh_index.return_value = True
+    test_mock.return_value.find_apps.return_value = [{'team_name': 'Marketing', 'app_id': 123,
+                                                      'app_name': 'Secret App'}]
+
+    result = runner.invoke(webbreaker, ['threadfix', 'list', '--team', 'Marketing', '--refresh'])
+
+    caplog.check(('__webbreaker__', 'INFO', 'ThreadFix List successfully completed'), )
+    caplog.uninstall()
+
+    test_mock.return_value.refresh_index.assert_called_once_with(force=True)
+    test_mock.return_value.find_apps.assert_called_once_with('Marketing', None)
+    assert 'Secret App' in result.output
+    assert result.exit_code == 0
@@ -0,0 +1,201 @@
+import mock
+import pytest
+import requests
+import sqlite3
+
+from tests.fakeservers import FakeThreadFix
+from webbreaker.transferutil import CHUNK_SIZE, MultipartFileStream
+from webbreaker.threadfixcache import ThreadFixScanCache
+from webbreaker.threadfixclient import ThreadFixClient
+from webbreaker.threadfixindex import ThreadFixIndex
+
+
+@pytest.fixture
+def threadfix():
+    with FakeThreadFix(teams=12, apps_per_team=3, latency=0.05) as threadfix:
+        yield threadfix
+
+
+def test_list_all_apps_keeps_team_order(threadfix):
+    applications = ThreadFixClient(threadfix.url, 'api-key', pool_size=4).list_all_apps()
+
+    assert [app['app_id'] for app in applications] == list(range(1, 37))
+    assert applications[3] == {'team_id': 2, 'team_name': 'team-2', 'app_id': 4, 'app_name': 'team-2-app-1'}
+
+
+def test_list_all_apps_filters(threadfix):
+    applications = ThreadFixClient(threadfix.url, 'api-key', pool_size=4).list_all_apps('team-1', 'app-2')
+
+    assert [app['app_name'] for app in applications] == ['team-1-app-2', 'team-10-app-2', 'team-11-app-2',
+                                                         'team-12-app-2']
+    assert threadfix.call_count('get_team') == 4
+
+
+def test_list_all_apps_concurrent(threadfix):
+    applications = ThreadFixClient(threadfix.url, 'api-key', pool_size=4).list_all_apps()
+
+    assert len(applications) == 36
+    assert 1 < threadfix.peak_in_flight <= 4
+
+
+class FakeClock(object):
+    """Stands in for the time module, sleeping by moving the clock on"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@mock.patch('webbreaker.threadfixclient.RATE_LIMIT_BACKOFF', 0.1)
+def test_list_all_apps_rate_limited():
+    clock = FakeClock()
+    with FakeThreadFix(teams=3, apps_per_team=2, rate_limited=2) as threadfix, \
+            mock.patch('webbreaker.threadfixclient.time', clock):
+        applications = ThreadFixClient(threadfix.url, 'api-key', pool_size=1).list_all_apps()
+
+        assert len(applications) == 6
+        assert threadfix.call_count('get_team') == 5
+    # Held off for 0.1 then 0.2 seconds
+    assert clock.sleeps == [pytest.approx(0.1), pytest.approx(0.2)]
+
+
+def test_list_scans_by_app_caches_filenames(tmpdir):
+    cache = ThreadFixScanCache(str(tmpdir.join('webinspect.db')))
+    with FakeThreadFix(teams=1, apps_per_team=1, scans_per_app=20) as threadfix:
+        client = ThreadFixClient(threadfix.url, 'api-key', pool_size=4, scan_cache=cache)
+
+        scans = client.list_scans_by_app(1)
+        assert [scan['filename'] for scan in scans] == ['scan-{}.xml'.format(1000 + s) for s in range(20)]
+        assert threadfix.call_count('get_scan') == 20
+
+        threadfix.scans_per_app = 25
+        scans = ThreadFixClient(threadfix.url, 'api-key', scan_cache=cache).list_scans_by_app(1)
+        assert scans[-1]['filename'] == 'scan-1024.xml'
+        # Only the new scans are looked up
+        assert threadfix.call_count('get_scan') == 25
+
+
+def test_list_scans_by_app_without_filenames(threadfix):
+    scans = ThreadFixClient(threadfix.url, 'api-key', scan_cache=False).list_scans_by_app(1, filenames=False)
+
+    assert [scan['id'] for scan in scans] == [1000, 1001]
+    assert 'filename' not in scans[0]
+    assert threadfix.call_count() == 1
+
+
+def test_connections_kept_alive(threadfix):
+    client = ThreadFixClient(threadfix.url, 'api-key', pool_size=4, scan_cache=False)
+    client.list_all_apps()
+    client.list_scans_by_app(1)
+
+    stats = client.pool_stats()
+    assert stats['pool_size'] == 4
+    assert stats['requests'] == threadfix.call_count() == 16
+    assert stats['connections'] <= 4
+
+
+@mock.patch('webbreaker.threadfixapi.threadfix.RETRY_BACKOFF', 0.01)
+def test_requests_retried_by_session():
+    with FakeThreadFix(teams=2, apps_per_team=2, failure_rate=0.3, seed=1) as threadfix:
+        client = ThreadFixClient(threadfix.url, 'api-key', pool_size=1)
+        assert len(client.list_all_apps()) == 4
+        # Every 503 was retried by the session
+        assert threadfix.call_count() > 3
+
+
+def test_rate_limit_left_to_client():
+    clock = FakeClock()
+    with FakeThreadFix(teams=2, apps_per_team=2, rate_limited=1) as threadfix, \
+            mock.patch('webbreaker.threadfixclient.time', clock):
+        client = ThreadFixClient(threadfix.url, 'api-key', pool_size=1)
+        assert len(client.list_all_apps()) == 4
+        assert threadfix.call_count('get_team') == 3
+    # The session passed the 429 on, so the client held back all of its requests
+    assert client.throttled_until > 0
+    assert clock.sleeps == [pytest.approx(1)]
+
+
+@pytest.fixture
+def index(tmpdir):
+    return ThreadFixIndex(str(tmpdir.join('webinspect.db')), ttl=3600)
+
+
+def test_find_apps_from_index(threadfix, index):
+    client = ThreadFixClient(threadfix.url, 'api-key', index=index)
+
+    assert client.find_apps(app_name='team-3-app-2', exact=True) == [
+        {'team_id': 3, 'team_name': 'team-3', 'app_id': 8, 'app_name': 'team-3-app-2'}]
+    assert threadfix.call_count() == 13
+    # Substring lookups filter the way list_all_apps does
+    assert [app['app_id'] for app in client.find_apps('TEAM-1', 'App-3')] == [3, 30, 33, 36]
+    assert client.find_apps('team-1', 'app-3') == client.list_all_apps('team-1', 'app-3')
+    assert client.find_apps(app_name='team-3-app', exact=True) == []
+    # Served from the index apart from list_all_apps, the index was refreshed too recently to refresh for the
+    # application that wasn't found
+    assert threadfix.call_count('list_teams') == 2
+
+
+def test_find_apps_refreshes_for_new_applications(threadfix, index):
+    client = ThreadFixClient(threadfix.url, 'api-key', index=index)
+    client.refresh_index()
+    threadfix.teams[0]['applications'].append({'id': 100, 'name': 'new app'})
+
+    # Refreshed 10 minutes ago
+    sqlite3.connect(index.db_path, isolation_level=None).execute(
+        "UPDATE threadfix_index_refreshes SET refreshed = refreshed - 600")
+
+    assert client.find_apps(app_name='new app', exact=True)[0]['app_id'] == 100
+    assert threadfix.call_count('list_teams') == 2
+    # Refreshed for the miss, so the next miss is answered from the index
+    assert client.find_apps(app_name='missing app', exact=True) == []
+    assert threadfix.call_count('list_teams') == 2
+
+
+def test_find_apps_without_index(threadfix):
+    client = ThreadFixClient(threadfix.url, 'api-key', index=False)
+
+    assert [app['app_id'] for app in client.find_apps(app_name='team-1-app-1', exact=True)] == [1]
+    assert [app['app_id'] for app in client.find_apps('team-1', 'app-1')] == [1, 28, 31, 34]
+
+
+@mock.patch('webbreaker.transferutil.Logger')
+def test_upload_scan_streams_file(logger_mock, threadfix, tmpdir):
+    scan_file = tmpdir.join('scan.xml')
+    scan_file.write_binary(b'<Scan/>' * 500000)
+
+    reads = []
+    stream_read = MultipartFileStream.read
+
+    def read(body, size=-1):
+        data = stream_read(body, size)
+        reads.append(len(data))
+        return data
+
+    with mock.patch.object(MultipartFileStream, 'read', read):
+        assert ThreadFixClient(threadfix.url, 'api-key').upload_scan(1, str(scan_file)) == {'id': 1}
+
+    assert threadfix.uploads[0] == sum(reads) > 3500000
+    assert max(reads) <= CHUNK_SIZE
+    # Throughput of the upload is reported once it's done
+    assert 'MB/s' in logger_mock.console.info.call_args[0][0]
+
+
+@mock.patch('webbreaker.transferutil.Logger')
+def test_upload_scan_closes_file(logger_mock, threadfix, tmpdir):
+    scan_file = tmpdir.join('scan.xml')
+    scan_file.write_binary(b'<Scan/>')
+
+    close = mock.Mock(side_effect=MultipartFileStream.close)
+    with mock.patch.object(MultipartFileStream, 'close', lambda body: close(body)), \
+            mock.patch('requests.Session.request', side_effect=requests.exceptions.ConnectionError('Test error')):
+        assert ThreadFixClient(threadfix.url, 'api-key').upload_scan(1, str(scan_file)) is False
+
+    assert close.call_count == 1
+    assert not threadfix.uploads
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+from webbreaker.webbreakerhelper import LazyImport
+
+# Imported by the clients, which commands only load when they run
+HEAVY_MODULES = ('git', 'fortifyapi', 'webinspectapi', 'cryptography', 'requests', 'webbreaker.webinspectclient',
+                 'webbreaker.fortifyclient', 'webbreaker.threadfixclient', 'webbreaker.gitclient')
+
+
+def test_cli_import_skips_clients():
+    loaded = subprocess.check_output([sys.executable, '-c',
+                                      'import sys, webbreaker.__main__; print(" ".join(sys.modules))'])
+    loaded = set(loaded.decode().split())
+
+    assert [module for module in HEAVY_MODULES if module in loaded] == []
+
+
+def test_lazy_import_resolves_on_use():
+    lazy_join = LazyImport('os.path', 'join')
+
+    assert lazy_join.target is None
+    assert lazy_join('a', 'b') == os.path.join('a', 'b')
+    assert lazy_join.__name__ == 'join'
+
+
+def test_fortify_client_skips_webinspect():
+    loaded = subprocess.check_output([sys.executable, '-c',
+                                      'import sys, webbreaker.fortifyclient; print(" ".join(sys.modules))'])
+    loaded = set(loaded.decode().split())
+
+    assert [module for module in ('webinspectapi', 'webbreaker.webinspectsession') if module in loaded] == []
+
+
+def test_threadfix_client_skips_fortify_and_webinspect():
+    loaded = subprocess.check_output([sys.executable, '-c',
+                                      'import sys, webbreaker.threadfixclient; print(" ".join(sys.modules))'])
+    loaded = set(loaded.decode().split())
+
+    assert [module for module in ('fortifyapi', 'webinspectapi', 'webbreaker.fortifytransfer',
+                                  'webbreaker.webinspectsession') if module in loaded] == []
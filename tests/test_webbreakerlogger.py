@@ -0,0 +1,52 @@
+import logging
+
+from webbreaker import webbreakerlogger
+from webbreaker.webbreakerlogger import NonBlockingQueueHandler, file_handler, flush_logs, queued
+
+try:
+    import Queue as queue
+except ImportError:  # Python3
+    import queue
+
+SETTINGS = {'queue_size': 100, 'max_bytes': 0, 'backup_count': 5}
+
+
+def test_queue_handler_drops_when_full():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, 'Test message', None, None)
+
+    handler.handle(record)
+    handler.handle(record)
+
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+
+
+def test_queued_records_written_on_flush(tmpdir):
+    log_path = tmpdir.join('test.log')
+    target = file_handler(str(log_path), SETTINGS)
+    target.setFormatter(logging.Formatter('%(message)s'))
+    test_logger = logging.getLogger('__webbreaker_debug__')
+    handler = queued(target, SETTINGS)
+    test_logger.addHandler(handler)
+    try:
+        test_logger.error('Test message')
+        flush_logs()
+
+        assert log_path.read() == 'Test message\n'
+        assert webbreakerlogger._listeners == []
+        # Written synchronously once the background writer is gone
+        assert handler not in test_logger.handlers
+        test_logger.error('Later message')
+        assert log_path.read() == 'Test message\nLater message\n'
+    finally:
+        test_logger.removeHandler(target)
+        target.close()
+
+
+def test_file_handler_rotates(tmpdir):
+    handler = file_handler(str(tmpdir.join('test.log')), dict(SETTINGS, max_bytes=1024))
+
+    assert isinstance(handler, logging.handlers.RotatingFileHandler)
+    assert handler.backupCount == 5
+    handler.close()
@@ -0,0 +1,72 @@
+import json
+import mock
+import pytest
+
+from webbreaker.webbreakermetrics import Metrics, instrumented_request, path_template
+from webinspectapi.webinspect import WebInspectResponse
+
+
+@pytest.fixture
+def test_metrics(tmpdir):
+    test_metrics = Metrics()
+    test_metrics.configured = True
+    test_metrics.jsonl_path = str(tmpdir.join('metrics.jsonl'))
+    test_metrics.prometheus_file = str(tmpdir.join('metrics.prom'))
+    return test_metrics
+
+
+def test_span_records_outcome(test_metrics):
+    with test_metrics.span('http_request', client='webinspect') as span:
+        span.record(WebInspectResponse(success=False, message='Test api message'))
+    with test_metrics.span('http_request', client='webinspect'):
+        pass
+    with pytest.raises(ValueError):
+        with test_metrics.span('http_request', client='webinspect'):
+            raise ValueError('Test error')
+
+    for outcome in ('ok', 'error', 'exception'):
+        assert test_metrics.counters[('http_request_total', (('client', 'webinspect'), ('outcome', outcome)))] == 1
+    assert test_metrics.histograms[('http_request_seconds', (('client', 'webinspect'),))].count == 3
+
+
+def test_timed_labels_operation(test_metrics):
+    @test_metrics.timed('fortify_client')
+    def upload_scan(file_name):
+        return False
+
+    assert upload_scan('test.fpr') is False
+    assert test_metrics.counters[('fortify_client_total', (('operation', 'upload_scan'), ('outcome', 'error')))] == 1
+
+
+def test_flush_writes_jsonl_and_prometheus(test_metrics, tmpdir):
+    with test_metrics.span('webinspect_client', operation='create_scan'):
+        pass
+    test_metrics.flush()
+
+    events = [json.loads(line) for line in tmpdir.join('metrics.jsonl').readlines()]
+    assert [(e['name'], e['outcome'], e['labels']) for e in events] == [
+        ('webinspect_client', 'ok', {'operation': 'create_scan'})]
+    prometheus = tmpdir.join('metrics.prom').read()
+    assert '# TYPE webbreaker_webinspect_client_total counter' in prometheus
+    assert 'webbreaker_webinspect_client_total{operation="create_scan",outcome="ok"} 1' in prometheus
+    assert 'webbreaker_webinspect_client_seconds_bucket{operation="create_scan",le="+Inf"} 1' in prometheus
+    assert 'webbreaker_webinspect_client_seconds_count{operation="create_scan"} 1' in prometheus
+
+
+def test_path_template():
+    assert path_template('/webinspect/scanner/scans/3e1c1d21-6c4e-4b2c-9a0b-8c2d7a8a0f11/log?x=1') == \
+        '/webinspect/scanner/scans/{id}/log'
+    assert path_template('rest/latest/applications/42/upload') == 'rest/latest/applications/{id}/upload'
+
+
+def test_instrumented_request(test_metrics):
+    class TestApi(object):
+        @instrumented_request('threadfix')
+        def _request(self, method, url):
+            return WebInspectResponse(success=True)
+
+    with mock.patch('webbreaker.webbreakermetrics.metrics', test_metrics):
+        assert TestApi()._request('GET', 'rest/latest/teams/7').success
+
+    assert test_metrics.counters[('http_request_total', (('client', 'threadfix'), ('method', 'GET'),
+                                                         ('outcome', 'ok'), ('path', 'rest/latest/teams/{id}')))] == 1
@@ -267,11 +267,13 @@ def test_webinspect_list_protocol_change_success(test_mock, runner, caplog):
 
 
 @mock.patch('webbreaker.__main__.create_scan_event_handler')
+@mock.patch('webbreaker.webinspectclient.ScanWatcher')
 @mock.patch('webbreaker.webinspectclient.WebInspectJitScheduler')
-@mock.patch('webbreaker.webinspectclient.webinspectapi.WebInspectApi')
+@mock.patch('webbreaker.webinspectclient.PooledWebInspectApi')
 @mock.patch('webbreaker.webinspectclient.open', new_callable=mock_open, read_data="data")
 @mock.patch('webbreaker.__main__.open', new_callable=mock_open, read_data="data")
-def test_webinspect_scan_req(main_open_mock, open_mock, scan_mock, endpoint_mock, email_mock, runner, caplog):
+def test_webinspect_scan_req(main_open_mock, open_mock, scan_mock, endpoint_mock, watcher_mock, email_mock, runner,
+                             caplog):
     endpoint_mock.return_value.get_endpoint.return_value = "test.hq.target.com"
     endpoint_mock.has_auth_creds()
 
@@ -282,6 +284,7 @@ def test_webinspect_scan_req(main_open_mock, open_mock, scan_mock, endpoint_mock
     scan_mock.return_value.export_scan_format.return_value = WebInspectResponseTest()
     scan_mock.export_scan_format()
 
+    watcher_mock.return_value.watch.return_value = 'complete'
     email_mock.handle_scan_event = True
 
     result = runner.invoke(webbreaker,
@@ -301,6 +304,18 @@ def test_webinspect_scan_req(main_open_mock, open_mock, scan_mock, endpoint_mock
     assert result.exit_code == 0
 
 
+@mock.patch('webbreaker.__main__.WebinspectClient')
+def test_webinspect_scan_prepare_failure(client_mock, runner, caplog):
+    client_mock.return_value.prepare_scan.return_value = False
+
+    result = runner.invoke(webbreaker, ['webinspect', 'scan'])
+
+    assert result.exit_code == 1
+    assert client_mock.return_value.create_scan.call_count == 0
+    assert client_mock.return_value.release_endpoint.call_count == 1
+    caplog.uninstall()
+
+
 @mock.patch('webbreaker.__main__.WebInspectConfig')
 def test_webinspect_servers(test_mock, runner, caplog):
     result = runner.invoke(webbreaker, ['webinspect', 'servers'])
@@ -679,3 +694,33 @@ def test_webinspect_no_proxy_command(runner, caplog):
     caplog.uninstall()
 
     assert result.exit_code == 1
+
+
+@mock.patch('webbreaker.__main__.AdmissionQueue')
+def test_webinspect_queue_unavailable(queue_mock, runner, caplog):
+    import sqlite3
+    queue_mock.return_value.entries.side_effect = sqlite3.OperationalError('database is locked')
+
+    result = runner.invoke(webbreaker, ['webinspect', 'queue'])
+
+    caplog.check(('__webbreaker__', 'ERROR', 'Unable to read the WebInspect scan queue: database is locked'), )
+    caplog.uninstall()
+
+    assert result.exit_code == 0
+
+
+@mock.patch('webbreaker.__main__.WebInspectBatch')
+@mock.patch('webbreaker.__main__.WebInspectConfig')
+def test_webinspect_batch_fetches_every_settings(config_mock, batch_mock, runner, tmpdir):
+    manifest = tmpdir.join('scans.json')
+    manifest.write(json.dumps({'scans': [{'scan_name': 'app-1', 'settings': 'SettingsB'},
+                                         {'scan_name': 'app-2'},
+                                         {'scan_name': 'app-3', 'settings': 'SettingsA'},
+                                         {'scan_name': 'app-4', 'settings': 'SettingsB'}]}))
+    batch_mock.return_value.run.return_value = True
+
+    result = runner.invoke(webbreaker, ['webinspect', 'batch', '--manifest', str(manifest)])
+
+    config_mock.return_value.fetch_webinspect_configs.assert_called_once_with({'settings': ['SettingsA',
+                                                                                           'SettingsB']})
+    assert result.exit_code == 0
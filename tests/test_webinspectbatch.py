@@ -0,0 +1,121 @@
+import json
+import mock
+import pytest
+
+from webbreaker.webinspectbatch import WebInspectBatch, load_batch_manifest
+
+
+def write_manifest(tmpdir, manifest):
+    manifest_file = tmpdir.join('scans.json')
+    manifest_file.write(json.dumps(manifest))
+    return str(manifest_file)
+
+
+def test_load_batch_manifest_defaults(tmpdir):
+    scans = load_batch_manifest(write_manifest(tmpdir, {
+        'defaults': {'settings': 'MySettings', 'size': 'large'},
+        'scans': [{'scan_name': 'app-1', 'start_urls': 'https://app-1'},
+                  {'scan_name': 'app-2', 'settings': 'OtherSettings'}]}))
+
+    assert [scan['scan_name'] for scan in scans] == ['app-1', 'app-2']
+    assert [scan['settings'] for scan in scans] == ['MySettings', 'OtherSettings']
+    assert scans[0]['start_urls'] == ['https://app-1']
+    assert scans[1]['start_urls'] == []
+    assert scans[1]['size'] == 'large'
+
+
+def test_load_batch_manifest_unknown_option(tmpdir):
+    with pytest.raises(ValueError):
+        load_batch_manifest(write_manifest(tmpdir, [{'scan_name': 'app-1', 'scan_nmae': 'typo'}]))
+
+
+def test_load_batch_manifest_duplicate_name(tmpdir):
+    with pytest.raises(ValueError):
+        load_batch_manifest(write_manifest(tmpdir, [{'scan_name': 'app-1'}, {'scan_name': 'app-2'},
+                                                    {'scan_name': 'app-1'}]))
+
+
+class BatchClientHelper(object):
+    """Stand-in WebinspectClient whose scans complete after a couple of status checks."""
+    busy = 0
+    launched = []
+    exported = []
+
+    def __init__(self, settings):
+        if BatchClientHelper.busy:
+            BatchClientHelper.busy -= 1
+            raise EnvironmentError("Scheduler found no available endpoints.")
+        self.name = settings['webinspect_scan_name']
+        self.url = 'https://test-server:8083'
+        self.config = mock.Mock(scan_poll_interval=0.01, scan_max_poll_interval=0.02, scan_reconnect_timeout=1,
+                                scan_stall_timeout=1)
+        self.statuses = ['Running', 'Running', 'Complete']
+        self.released = False
+
+    def prepare_scan(self, mapped_policies):
+        return True
+
+    def create_scan(self):
+        BatchClientHelper.launched.append(self.name)
+        return self.name + '-id'
+
+    def current_scan_status(self, scan_id):
+        return self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+
+    def export_scan_results(self, scan_id, *extensions):
+        BatchClientHelper.exported.append((scan_id, extensions))
+
+    def release_endpoint(self):
+        self.released = True
+
+
+@mock.patch('webbreaker.webinspectbatch.create_scan_event_handler')
+@mock.patch('webbreaker.webinspectbatch.WebinspectClient', BatchClientHelper)
+def test_batch_runs_every_scan(event_mock):
+    BatchClientHelper.busy = 1
+    BatchClientHelper.launched = []
+    BatchClientHelper.exported = []
+    webinspect_config = mock.Mock(mapped_policies=[])
+    webinspect_config.parse_webinspect_options.side_effect = lambda options: {
+        'webinspect_scan_name': options['scan_name']}
+    scans = [{'scan_name': 'app-1'}, {'scan_name': 'app-2'}]
+
+    batch = WebInspectBatch(scans, webinspect_config, launch_interval=0.05)
+
+    assert batch.run()
+    # app-1 waited for an engine, the batch moved on with it once one was free
+    assert sorted(BatchClientHelper.launched) == ['app-1', 'app-2']
+    assert sorted(BatchClientHelper.exported) == [('app-1-id', ('fpr', 'xml')), ('app-2-id', ('fpr', 'xml'))]
+    assert all(scan.client.released for scan in batch.scans)
+    events = [c[0][0] for c in event_mock.return_value.call_args_list]
+    assert events.count('scan_start') == 2
+    assert events.count('scan_end') == 2
+
+
+@mock.patch('webbreaker.webinspectbatch.create_scan_event_handler')
+@mock.patch('webbreaker.webinspectbatch.WebinspectClient', BatchClientHelper)
+def test_batch_reports_failed_scan(event_mock):
+    BatchClientHelper.busy = 0
+    webinspect_config = mock.Mock(mapped_policies=[])
+    webinspect_config.parse_webinspect_options.side_effect = lambda options: {
+        'webinspect_scan_name': options['scan_name']}
+
+    batch = WebInspectBatch([{'scan_name': 'app-1'}], webinspect_config)
+    with mock.patch.object(BatchClientHelper, 'create_scan', return_value=False):
+        assert not batch.run()
+
+
+@mock.patch('webbreaker.webinspectbatch.create_scan_event_handler')
+@mock.patch('webbreaker.webinspectbatch.WebinspectClient', BatchClientHelper)
+def test_batch_unnamed_scans_get_unique_names(event_mock):
+    BatchClientHelper.busy = 0
+    BatchClientHelper.launched = []
+    webinspect_config = mock.Mock(mapped_policies=[])
+    # Under Jenkins every unnamed scan is named after the job
+    webinspect_config.parse_webinspect_options.side_effect = lambda options: {'webinspect_scan_name': 'job'}
+
+    batch = WebInspectBatch([{'scan_name': None}, {'scan_name': None}, {'scan_name': None}], webinspect_config,
+                            launch_interval=0.05)
+
+    assert batch.run()
+    assert sorted(BatchClientHelper.launched) == ['job', 'job-2', 'job-3']
@@ -0,0 +1,185 @@
+import mock
+import pytest
+import sqlite3
+import threading
+import time
+
+from webbreaker.webinspectclient import WebinspectClient
+from webbreaker.webinspectmanifest import AssetManifest
+from webbreaker.webinspectqueue import AdmissionQueue
+from webinspectapi.webinspect import WebInspectResponse
+
+SETTINGS = {'webinspect_scan_size': 'size_large',
+            'webinspect_settings': 'Default',
+            'webinspect_scan_name': 'test-scan',
+            'webinspect_upload_settings': 'settings/test.xml',
+            'webinspect_upload_policy': 'policies/test.policy',
+            'webinspect_upload_webmacros': ['webmacros/login.webmacro', 'webmacros/flow.webmacro'],
+            'webinspect_overrides_scan_mode': None,
+            'webinspect_overrides_scan_scope': None,
+            'webinspect_overrides_login_macro': None,
+            'webinspect_overrides_scan_policy': None,
+            'webinspect_overrides_scan_start': None,
+            'webinspect_overrides_start_urls': [],
+            'webinspect_workflow_macros': [],
+            'webinspect_allowed_hosts': []}
+
+
+class UploadApiHelper(object):
+    """Stand-in WebInspectApi recording how many uploads are in flight at once."""
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    fail = ()
+    uploaded = []
+    listed = []
+
+    def __init__(self, host, verify_ssl=True):
+        self.host = host
+
+    def __upload__(self, path):
+        with self.lock:
+            UploadApiHelper.in_flight += 1
+            UploadApiHelper.max_in_flight = max(UploadApiHelper.max_in_flight, UploadApiHelper.in_flight)
+        time.sleep(0.05)
+        with self.lock:
+            UploadApiHelper.in_flight -= 1
+            UploadApiHelper.uploaded.append(path)
+        return WebInspectResponse(success=path not in self.fail, message='Test api message')
+
+    def upload_settings(self, path):
+        return self.__upload__(path)
+
+    def upload_webmacro(self, path):
+        return self.__upload__(path)
+
+    def upload_policy(self, path):
+        return self.__upload__(path)
+
+    def list_settings(self):
+        return WebInspectResponse(success=True, data=self.listed)
+
+    def list_webmacros(self):
+        return WebInspectResponse(success=True, data=self.listed)
+
+    def get_policy_by_name(self, name):
+        return WebInspectResponse(success=False, response_code=404)
+
+
+@pytest.fixture
+def client(tmpdir):
+    """WebinspectClient on a fake endpoint, keeping its lease and upload manifest databases in tmpdir"""
+    UploadApiHelper.in_flight = 0
+    UploadApiHelper.max_in_flight = 0
+    UploadApiHelper.fail = ()
+    UploadApiHelper.uploaded = []
+    UploadApiHelper.listed = []
+    with mock.patch('webbreaker.webinspectclient.WebInspectJitScheduler') as scheduler_mock, \
+            mock.patch('webbreaker.webinspectclient.get_lease_backend', return_value=None), \
+            mock.patch('webbreaker.webinspectclient.AssetManifest',
+                       lambda: AssetManifest(db_path=str(tmpdir.join('manifest.db')))):
+        scheduler_mock.return_value.get_endpoint.return_value = 'https://test-server:8083'
+        scheduler_mock.return_value.lease = None
+        yield WebinspectClient(SETTINGS)
+
+
+@mock.patch('webbreaker.webinspectclient.PooledWebInspectApi', UploadApiHelper)
+def test_upload_assets_concurrent(client):
+    failed = client.upload_assets(upload_policy=True)
+
+    assert failed == []
+    assert UploadApiHelper.max_in_flight > 1
+
+
+@mock.patch('webbreaker.webinspectclient.PooledWebInspectApi', UploadApiHelper)
+def test_upload_assets_reports_failures_together(client):
+    UploadApiHelper.fail = ('settings/test.xml', 'webmacros/flow.webmacro')
+
+    failed = client.upload_assets()
+
+    assert failed == ['settings/test.xml', 'webmacros/flow.webmacro']
+
+
+@mock.patch('webbreaker.webinspectclient.PooledWebInspectApi', UploadApiHelper)
+def test_prepare_scan_stops_on_failed_upload(client):
+    UploadApiHelper.fail = ('webmacros/flow.webmacro',)
+
+    assert not client.prepare_scan([])
+
+
+@mock.patch('webbreaker.webinspectclient.PooledWebInspectApi', UploadApiHelper)
+def test_upload_assets_skips_unchanged(client, tmpdir):
+    settings = tmpdir.join('test.xml')
+    settings.write('<settings/>')
+    webmacro = tmpdir.join('login.webmacro')
+    webmacro.write('macro')
+    UploadApiHelper.listed = ['test', 'login']
+    client.webinspect_upload_settings = str(settings)
+    client.webinspect_upload_webmacros = [str(webmacro)]
+
+    client.upload_assets()
+    assert sorted(UploadApiHelper.uploaded) == sorted([str(settings), str(webmacro)])
+
+    UploadApiHelper.uploaded = []
+    client.upload_assets()
+    assert UploadApiHelper.uploaded == []
+
+    # Changed locally
+    webmacro.write('new macro')
+    client.upload_assets()
+    assert UploadApiHelper.uploaded == [str(webmacro)]
+
+    # Gone from the server
+    UploadApiHelper.uploaded = []
+    UploadApiHelper.listed = ['login']
+    client.upload_assets()
+    assert UploadApiHelper.uploaded == [str(settings)]
+
+
+@mock.patch('webbreaker.webinspectclient.get_lease_backend', return_value=None)
+@mock.patch('webbreaker.webinspectclient.WebInspectJitScheduler')
+def test_late_arrival_waits_behind_queue(scheduler_mock, lease_mock, tmpdir):
+    db_path = str(tmpdir.join('queue.db'))
+    # A run already waiting on an engine when one frees up
+    AdmissionQueue(db_path=db_path).enqueue('earlier-scan')
+    scheduler_mock.return_value.get_endpoint.return_value = 'https://test-server:8083'
+    settings = dict(SETTINGS, webinspect_max_wait=1)
+
+    with mock.patch('webbreaker.webinspectclient.AdmissionQueue',
+                    lambda **kwargs: AdmissionQueue(db_path=db_path, **kwargs)):
+        with pytest.raises(EnvironmentError):
+            WebinspectClient(settings)
+
+    # The freed slot was left for the earlier run
+    assert scheduler_mock.return_value.get_endpoint.call_count == 0
+
+
+@mock.patch('webbreaker.webinspectclient.get_lease_backend', return_value=None)
+@mock.patch('webbreaker.webinspectclient.WebInspectJitScheduler')
+def test_queued_run_admitted_when_first_in_line(scheduler_mock, lease_mock, tmpdir):
+    db_path = str(tmpdir.join('queue.db'))
+    scheduler_mock.return_value.get_endpoint.return_value = 'https://test-server:8083'
+    scheduler_mock.return_value.lease = None
+    settings = dict(SETTINGS, webinspect_max_wait=1)
+
+    with mock.patch('webbreaker.webinspectclient.AdmissionQueue',
+                    lambda **kwargs: AdmissionQueue(db_path=db_path, **kwargs)):
+        test_client = WebinspectClient(settings)
+
+    assert test_client.url == 'https://test-server:8083'
+    assert AdmissionQueue(db_path=db_path).entries() == []
+
+
+@mock.patch('webbreaker.webinspectclient.get_lease_backend', return_value=None)
+@mock.patch('webbreaker.webinspectclient.WebInspectJitScheduler')
+def test_queue_unavailable_probes_directly(scheduler_mock, lease_mock):
+    scheduler_mock.return_value.get_endpoint.return_value = 'https://test-server:8083'
+    scheduler_mock.return_value.lease = None
+    settings = dict(SETTINGS, webinspect_max_wait=1)
+
+    with mock.patch('webbreaker.webinspectclient.AdmissionQueue',
+                    side_effect=sqlite3.OperationalError('attempt to write a readonly database')):
+        test_client = WebinspectClient(settings)
+
+    assert test_client.url == 'https://test-server:8083'
+    assert scheduler_mock.return_value.get_endpoint.call_count == 1
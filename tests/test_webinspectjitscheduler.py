@@ -0,0 +1,205 @@
+import mock
+import time
+import logging
+
+from webbreaker.webinspectjitscheduler import WebInspectJitScheduler
+from webbreaker.webinspectlease import SqliteLeaseBackend
+from webbreaker.webinspectqueue import AdmissionQueue
+from webinspectapi.webinspect import WebInspectResponse
+
+# Disable debugging for log clarity in testing
+logging.disable(logging.DEBUG)
+
+ENDPOINTS = [['https://test-server-1:8083', '2'],
+             ['https://test-server-2:8083', '2'],
+             ['https://test-server-3:8083', '1']]
+SIZES = [['size_large', '2'], ['size_medium', '1']]
+
+
+class ApiHelper(object):
+    """Stand-in WebInspectApi whose list_scans answer depends on the host it was built for."""
+    running = {}
+    delay = {}
+
+    def __init__(self, host, verify_ssl=True, timeout=None):
+        self.host = host
+        self.timeout = timeout
+
+    def list_scans(self):
+        time.sleep(self.delay.get(self.host, 0))
+        return WebInspectResponse(success=True,
+                                  data=[{'Status': 'Running'}] * self.running.get(self.host, 0))
+
+
+def scheduler(**kwargs):
+    return WebInspectJitScheduler(endpoints=ENDPOINTS, size_list=SIZES, size_needed='size_large', **kwargs)
+
+
+@mock.patch('webbreaker.webinspectjitscheduler.PooledWebInspectApi', ApiHelper)
+def test_get_endpoint_skips_full_endpoints():
+    ApiHelper.running = {'https://test-server-1:8083': 2, 'https://test-server-2:8083': 1}
+    ApiHelper.delay = {}
+
+    assert scheduler().get_endpoint() == 'https://test-server-2:8083'
+
+
+@mock.patch('webbreaker.webinspectjitscheduler.PooledWebInspectApi', ApiHelper)
+def test_get_endpoint_none_available():
+    ApiHelper.running = {'https://test-server-1:8083': 2, 'https://test-server-2:8083': 2}
+    ApiHelper.delay = {}
+
+    assert scheduler().get_endpoint() is None
+
+
+@mock.patch('webbreaker.webinspectjitscheduler.PooledWebInspectApi', ApiHelper)
+def test_get_endpoint_does_not_wait_on_slow_endpoint():
+    ApiHelper.running = {}
+    ApiHelper.delay = {'https://test-server-1:8083': 5}
+
+    start = time.time()
+    endpoint = scheduler(probe_timeout=2).get_endpoint()
+
+    assert endpoint == 'https://test-server-2:8083'
+    assert time.time() - start < 2
+
+
+@mock.patch('webbreaker.webinspectjitscheduler.PooledWebInspectApi', ApiHelper)
+def test_get_endpoint_probe_timeout():
+    ApiHelper.running = {}
+    ApiHelper.delay = {'https://test-server-1:8083': 5, 'https://test-server-2:8083': 5}
+
+    start = time.time()
+    endpoint = scheduler(probe_timeout=0.5).get_endpoint()
+
+    assert endpoint is None
+    assert time.time() - start < 2
+
+
+@mock.patch('webbreaker.webinspectjitscheduler.PooledWebInspectApi', ApiHelper)
+def test_get_endpoint_least_loaded():
+    endpoints = [['https://test-server-1:8083', '4'],
+                 ['https://test-server-2:8083', '4'],
+                 ['https://test-server-3:8083', '4']]
+    ApiHelper.running = {'https://test-server-1:8083': 3, 'https://test-server-2:8083': 1,
+                         'https://test-server-3:8083': 2}
+    ApiHelper.delay = {}
+
+    test_obj = WebInspectJitScheduler(endpoints=endpoints, size_list=[['size_large', '4']])
+
+    assert test_obj.get_endpoint() == 'https://test-server-2:8083'
+
+
+@mock.patch('webbreaker.webinspectjitscheduler.PooledWebInspectApi', ApiHelper)
+def test_get_endpoint_least_loaded_tie_break_on_latency():
+    endpoints = [['https://test-server-1:8083', '4'],
+                 ['https://test-server-2:8083', '4']]
+    ApiHelper.running = {'https://test-server-1:8083': 1, 'https://test-server-2:8083': 1}
+    ApiHelper.delay = {'https://test-server-1:8083': 0.3}
+
+    test_obj = WebInspectJitScheduler(endpoints=endpoints, size_list=[['size_large', '4']])
+
+    assert test_obj.get_endpoint() == 'https://test-server-2:8083'
+
+
+@mock.patch('webbreaker.webinspectjitscheduler.PooledWebInspectApi', ApiHelper)
+def test_get_endpoint_counts_leases(tmpdir):
+    endpoints = [['https://test-server-1:8083', '2'],
+                 ['https://test-server-2:8083', '2']]
+    ApiHelper.running = {}
+    ApiHelper.delay = {}
+    leases = SqliteLeaseBackend(db_path=str(tmpdir.join('leases.db')))
+
+    # Two simultaneous runs see the same idle farm, but each is handed a different endpoint
+    first = WebInspectJitScheduler(endpoints=endpoints, size_list=[['size_large', '2']], leases=leases)
+    second = WebInspectJitScheduler(endpoints=endpoints, size_list=[['size_large', '2']], leases=leases)
+
+    assert first.get_endpoint() != second.get_endpoint()
+    assert leases.count('https://test-server-1:8083') == 1
+    assert leases.count('https://test-server-2:8083') == 1
+
+
+@mock.patch('webbreaker.webinspectjitscheduler.PooledWebInspectApi', ApiHelper)
+def test_get_endpoint_leases_exhausted(tmpdir):
+    endpoints = [['https://test-server-1:8083', '1']]
+    ApiHelper.running = {}
+    ApiHelper.delay = {}
+    leases = SqliteLeaseBackend(db_path=str(tmpdir.join('leases.db')))
+
+    first = WebInspectJitScheduler(endpoints=endpoints, size_list=[['size_large', '1']], leases=leases)
+    second = WebInspectJitScheduler(endpoints=endpoints, size_list=[['size_large', '1']], leases=leases)
+
+    assert first.get_endpoint() == 'https://test-server-1:8083'
+    assert second.get_endpoint() is None
+
+    first.lease.release()
+    assert second.get_endpoint() == 'https://test-server-1:8083'
+
+
+def test_lease_ignored_once_scan_is_visible(tmpdir):
+    leases = SqliteLeaseBackend(db_path=str(tmpdir.join('leases.db')))
+
+    lease = leases.acquire('https://test-server-1:8083', 1)
+    lease.attach_scan('scan-1')
+
+    assert leases.count('https://test-server-1:8083') == 1
+    assert leases.count('https://test-server-1:8083', visible_scan_ids={'scan-1'}) == 0
+    assert leases.acquire('https://test-server-1:8083', 1) is None
+
+
+def test_lease_expires(tmpdir):
+    leases = SqliteLeaseBackend(db_path=str(tmpdir.join('leases.db')), ttl=0)
+
+    leases.acquire('https://test-server-1:8083', 1)
+
+    assert leases.count('https://test-server-1:8083') == 0
+    assert leases.acquire('https://test-server-1:8083', 1) is not None
+
+
+def test_admission_queue_fifo(tmpdir):
+    queue = AdmissionQueue(db_path=str(tmpdir.join('queue.db')))
+
+    first = queue.enqueue('first-scan')
+    second = queue.enqueue('second-scan')
+    urgent = queue.enqueue('urgent-scan', priority=10)
+
+    assert queue.position(urgent) == (0, 3)
+    assert queue.position(first) == (1, 3)
+    assert queue.position(second) == (2, 3)
+    assert [entry[0] for entry in queue.entries()] == ['urgent-scan', 'first-scan', 'second-scan']
+
+    queue.dequeue(urgent)
+    assert queue.position(first) == (0, 2)
+
+
+def test_admission_queue_admit_after_backoff(tmpdir):
+    queue = AdmissionQueue(db_path=str(tmpdir.join('queue.db')), poll_interval=0.05, max_poll_interval=0.1)
+    answers = [None, None, 'https://test-server-1:8083']
+
+    endpoint = queue.admit(lambda: answers.pop(0), 'test-scan', max_wait=5)
+
+    assert endpoint == 'https://test-server-1:8083'
+    assert not answers
+    assert queue.entries() == []
+
+
+def test_admission_queue_max_wait(tmpdir):
+    queue = AdmissionQueue(db_path=str(tmpdir.join('queue.db')), poll_interval=0.05, max_poll_interval=0.1)
+
+    start = time.time()
+    endpoint = queue.admit(lambda: None, 'test-scan', max_wait=0.3)
+
+    assert endpoint is None
+    assert time.time() - start < 2
+    assert queue.entries() == []
+
+
+def test_admission_queue_waits_its_turn(tmpdir):
+    queue = AdmissionQueue(db_path=str(tmpdir.join('queue.db')), poll_interval=0.05, max_poll_interval=0.1)
+    queue.enqueue('earlier-scan')
+    probes = []
+
+    endpoint = queue.admit(lambda: probes.append(1), 'test-scan', max_wait=0.3)
+
+    # Never reached the head of the queue, so the scan engines were never probed
+    assert endpoint is None
+    assert probes == []
@@ -78,7 +78,7 @@ def test_config_init_variables_all_set():
     assert test_obj.host == "test-server"
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 @mock.patch('webbreaker.webinspectproxyclient.open', new_callable=mock_open, read_data="data")
 def test_get_cert_proxy_success(open_mock, api_mock):
     api_mock.return_value = ClassHelper(True)
@@ -89,7 +89,7 @@ def test_get_cert_proxy_success(open_mock, api_mock):
     assert open_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_get_cert_proxy_failure(api_mock, caplog):
     api_mock.return_value = ClassHelper(False)
     test_obj = WebinspectProxyClient('test-id', '80', 'test-server')
@@ -101,7 +101,7 @@ def test_get_cert_proxy_failure(api_mock, caplog):
     caplog.uninstall()
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 @mock.patch('webbreaker.webinspectproxyclient.open', new_callable=mock_open, read_data="data")
 def test_get_cert_proxy_exception_unbound(open_mock, api_mock, caplog):
     api_mock.return_value = ClassHelper(True)
@@ -120,7 +120,7 @@ def test_get_cert_proxy_exception_unbound(open_mock, api_mock, caplog):
     assert open_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_start_proxy_success(api_mock):
     api_mock.return_value = ClassHelper(True)
 
@@ -131,7 +131,7 @@ def test_start_proxy_success(api_mock):
     assert result == 'Test data'
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_start_proxy_failure(api_mock, caplog):
     api_mock.return_value = ClassHelper(False)
 
@@ -146,7 +146,7 @@ def test_start_proxy_failure(api_mock, caplog):
     assert api_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_delete_proxy_success(api_mock, caplog):
     api_mock.return_value = ClassHelper(True)
 
@@ -161,7 +161,7 @@ def test_delete_proxy_success(api_mock, caplog):
     assert api_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_delete_proxy_failure(api_mock, caplog):
     api_mock.return_value = ClassHelper(False)
 
@@ -176,7 +176,7 @@ def test_delete_proxy_failure(api_mock, caplog):
     assert api_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_list_proxy_success(api_mock):
     api_mock.return_value = ClassHelper(True)
 
@@ -187,7 +187,7 @@ def test_list_proxy_success(api_mock):
     assert result == 'Test data'
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_list_proxy_failure(api_mock, caplog):
     api_mock.return_value = ClassHelper(False)
 
@@ -202,7 +202,7 @@ def test_list_proxy_failure(api_mock, caplog):
     assert api_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 @mock.patch('webbreaker.webinspectproxyclient.open', new_callable=mock_open, read_data="data")
 def test_download_proxy_webmacro_success(open_mock, api_mock, caplog):
     api_mock.return_value = ClassHelper(True)
@@ -219,7 +219,7 @@ def test_download_proxy_webmacro_success(open_mock, api_mock, caplog):
     assert open_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 @mock.patch('webbreaker.webinspectproxyclient.open', new_callable=mock_open, read_data="data")
 def test_download_proxy_setting_success(open_mock, api_mock, caplog):
     api_mock.return_value = ClassHelper(True)
@@ -236,7 +236,7 @@ def test_download_proxy_setting_success(open_mock, api_mock, caplog):
     assert open_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 @mock.patch('webbreaker.webinspectproxyclient.open', new_callable=mock_open, read_data="data")
 def test_download_proxy_no_file_type(open_mock, api_mock, caplog):
     api_mock.return_value = ClassHelper(True)
@@ -254,7 +254,7 @@ def test_download_proxy_no_file_type(open_mock, api_mock, caplog):
     assert open_mock.call_count == 0
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 @mock.patch('webbreaker.webinspectproxyclient.open', new_callable=mock_open, read_data="data")
 def test_download_proxy_failure(open_mock, api_mock, caplog):
     api_mock.return_value = ClassHelper(False)
@@ -271,7 +271,7 @@ def test_download_proxy_failure(open_mock, api_mock, caplog):
     assert open_mock.call_count == 0
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 @mock.patch('webbreaker.webinspectproxyclient.open', new_callable=mock_open, read_data="data")
 def test_download_proxy_unbound_exception(open_mock, api_mock, caplog):
     api_mock.return_value = ClassHelper(True)
@@ -291,7 +291,7 @@ def test_download_proxy_unbound_exception(open_mock, api_mock, caplog):
     assert open_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_upload_proxy_setting_success(api_mock, caplog):
     api_mock.return_value = ClassHelper(True)
 
@@ -307,7 +307,7 @@ def test_upload_proxy_setting_success(api_mock, caplog):
     assert api_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_upload_proxy_failure(api_mock, caplog):
     api_mock.return_value = ClassHelper(False)
 
@@ -323,7 +323,7 @@ def test_upload_proxy_failure(api_mock, caplog):
     assert api_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_upload_proxy_unbound_exception(api_mock, caplog):
     e = UnboundLocalError("Test Error")
     api_mock.side_effect = e
@@ -340,7 +340,7 @@ def test_upload_proxy_unbound_exception(api_mock, caplog):
     assert api_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_upload_proxy_value_error_exception(api_mock, caplog):
     e = ValueError("Test Error")
     api_mock.side_effect = e
@@ -357,7 +357,7 @@ def test_upload_proxy_value_error_exception(api_mock, caplog):
     assert api_mock.call_count == 1
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_get_proxy_success(api_mock):
     api_mock.return_value = ClassHelper(True)
 
@@ -368,7 +368,7 @@ def test_get_proxy_success(api_mock):
     assert result == 'Test data'
 
 
-@mock.patch('webinspectapi.webinspect.WebInspectApi')
+@mock.patch('webbreaker.webinspectproxyclient.PooledWebInspectApi')
 def test_get_proxy_failure(api_mock):
     api_mock.return_value = ClassHelper(False)
 
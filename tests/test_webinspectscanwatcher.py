@@ -0,0 +1,91 @@
+import mock
+
+from webbreaker.webinspectscanwatcher import ScanWatcher, SCAN_STATUS_CHANGE_EVENT
+
+
+class FakeClock(object):
+    """Stands in for the time module, sleeping only moves the clock forward."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def status_source(statuses):
+    """Answer with each of statuses in turn, then keep answering with the last one."""
+    answers = list(statuses)
+
+    def get_status(scan_id):
+        return answers.pop(0) if len(answers) > 1 else answers[0]
+    return get_status
+
+
+@mock.patch('webbreaker.webinspectscanwatcher.time', new_callable=FakeClock)
+def test_watch_returns_on_terminal_status(clock):
+    watcher = ScanWatcher('scan-id', status_source(['Running', 'Running', 'Complete']))
+
+    assert watcher.watch() == 'Complete'
+
+
+@mock.patch('webbreaker.webinspectscanwatcher.time', new_callable=FakeClock)
+def test_watch_emits_transitions(clock):
+    on_event = mock.Mock()
+    watcher = ScanWatcher('scan-id', status_source(['Running', 'Paused', 'Running', 'Complete']), on_event=on_event)
+
+    assert watcher.watch() == 'Complete'
+    assert on_event.call_args_list == [mock.call(SCAN_STATUS_CHANGE_EVENT, status='Paused'),
+                                       mock.call(SCAN_STATUS_CHANGE_EVENT, status='Running'),
+                                       mock.call(SCAN_STATUS_CHANGE_EVENT, status='Complete')]
+
+
+@mock.patch('webbreaker.webinspectscanwatcher.time', new_callable=FakeClock)
+def test_watch_gives_up_on_stalled_scan(clock):
+    watcher = ScanWatcher('scan-id', status_source(['Running', 'Interrupted']), stall_timeout=600)
+
+    assert watcher.watch() == 'Interrupted'
+    assert 600 < clock.now < 800
+
+
+@mock.patch('webbreaker.webinspectscanwatcher.time', new_callable=FakeClock)
+def test_watch_reconnects(clock):
+    on_event = mock.Mock()
+    watcher = ScanWatcher('scan-id', status_source(['Running', None, 'Unknown', None, 'Running', 'Complete']),
+                          on_event=on_event, reconnect_timeout=600)
+
+    assert watcher.watch() == 'Complete'
+    # Losing track of the scan isn't a status change
+    assert on_event.call_args_list == [mock.call(SCAN_STATUS_CHANGE_EVENT, status='Complete')]
+
+
+@mock.patch('webbreaker.webinspectscanwatcher.time', new_callable=FakeClock)
+def test_watch_reconnect_resets_timeout(clock):
+    # Two outages, each shorter than reconnect_timeout but longer together
+    statuses = ['Running'] + [None] * 5 + ['Running'] + [None] * 5 + ['Complete']
+    watcher = ScanWatcher('scan-id', status_source(statuses), poll_interval=10, max_poll_interval=40,
+                          reconnect_timeout=150)
+
+    assert watcher.watch() == 'Complete'
+    assert clock.now > 150
+
+
+@mock.patch('webbreaker.webinspectscanwatcher.time', new_callable=FakeClock)
+def test_watch_gives_up_when_unreachable(clock):
+    watcher = ScanWatcher('scan-id', status_source(['Running', None]), reconnect_timeout=600)
+
+    assert watcher.watch() == 'Running'
+    assert 600 < clock.now < 700
+
+
+@mock.patch('webbreaker.webinspectscanwatcher.time', new_callable=FakeClock)
+def test_watch_long_polls_between_checks(clock):
+    wait_for_change = mock.Mock()
+    watcher = ScanWatcher('scan-id', status_source(['Running', 'Running', 'Complete']),
+                          wait_for_change=wait_for_change)
+
+    assert watcher.watch() == 'Complete'
+    wait_for_change.assert_called_with('scan-id')
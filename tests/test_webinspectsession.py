@@ -0,0 +1,145 @@
+import mock
+import requests
+
+from webbreaker.webinspectsession import PooledWebInspectApi, get_session, close_sessions
+
+
+def test_get_session_shared_per_server():
+    close_sessions()
+    session = get_session('https://test-server:8083/webinspect')
+
+    assert get_session('https://test-server:8083') is session
+    assert get_session('https://other-server:8083') is not session
+    assert PooledWebInspectApi('https://test-server:8083').session is session
+    close_sessions()
+
+
+@mock.patch('webbreaker.webinspectsession.requests.Session.request')
+def test_pooled_api_uses_shared_session(request_mock):
+    close_sessions()
+    response = mock.Mock(status_code=200, text='[]')
+    response.json.return_value = []
+    request_mock.return_value = response
+
+    api = PooledWebInspectApi('https://test-server:8083', timeout=5)
+    result = api.list_scans()
+
+    assert result.success
+    assert request_mock.call_count == 1
+    assert request_mock.call_args[1]['timeout'] == 5
+    assert request_mock.call_args[1]['url'] == 'https://test-server:8083/webinspect/scanner/scans'
+    close_sessions()
+
+
+@mock.patch('webbreaker.webinspectsession.requests.Session.request')
+def test_pooled_api_connection_error(request_mock):
+    request_mock.side_effect = requests.exceptions.ConnectionError()
+
+    result = PooledWebInspectApi('https://test-server:8083').list_scans()
+
+    assert not result.success
+    assert result.message == 'A connection error occurred.'
+
+
+def download_response(status_code, chunks, headers=None):
+    response = mock.Mock(status_code=status_code, content=b'', headers=headers if headers else {})
+    response.iter_content.return_value = chunks
+    return response
+
+
+@mock.patch('webbreaker.webinspectsession.requests.Session.request')
+def test_download_scan_format_streams_to_file(request_mock, tmpdir):
+    request_mock.return_value = download_response(200, [b'<Scan>', b'</Scan>'])
+    file_path = str(tmpdir.join('test-scan.xml'))
+
+    result = PooledWebInspectApi('https://test-server:8083').download_scan_format('scan-id', 'xml', file_path, 'Full')
+
+    assert result.success
+    assert result.data == file_path
+    assert tmpdir.join('test-scan.xml').read() == '<Scan></Scan>'
+    assert tmpdir.listdir() == [tmpdir.join('test-scan.xml')]
+    assert request_mock.call_args[1]['stream']
+    assert request_mock.call_args[1]['params'] == {'detailType': 'Full'}
+
+
+@mock.patch('webbreaker.webinspectsession.requests.Session.request')
+def test_download_scan_format_resumes_part_file(request_mock, tmpdir):
+    tmpdir.join('test-scan.fpr.scan-id.part').write('abc')
+    tmpdir.join('test-scan.fpr.scan-id.part.validator').write('"etag-1"')
+    request_mock.return_value = download_response(206, [b'def'])
+    file_path = str(tmpdir.join('test-scan.fpr'))
+
+    result = PooledWebInspectApi('https://test-server:8083').download_scan_format('scan-id', 'fpr', file_path)
+
+    assert result.success
+    assert request_mock.call_args[1]['headers']['Range'] == 'bytes=3-'
+    assert request_mock.call_args[1]['headers']['If-Range'] == '"etag-1"'
+    assert tmpdir.join('test-scan.fpr').read() == 'abcdef'
+    assert tmpdir.listdir() == [tmpdir.join('test-scan.fpr')]
+
+
+@mock.patch('webbreaker.webinspectsession.requests.Session.request')
+def test_download_scan_format_restarts_changed_export(request_mock, tmpdir):
+    tmpdir.join('test-scan.fpr.scan-id.part').write('abc')
+    tmpdir.join('test-scan.fpr.scan-id.part.validator').write('"etag-1"')
+    # If-Range didn't match, so the server sends the whole export
+    request_mock.return_value = download_response(200, [b'xyz'], {'ETag': '"etag-2"'})
+    file_path = str(tmpdir.join('test-scan.fpr'))
+
+    result = PooledWebInspectApi('https://test-server:8083').download_scan_format('scan-id', 'fpr', file_path)
+
+    assert result.success
+    assert tmpdir.join('test-scan.fpr').read() == 'xyz'
+
+
+@mock.patch('webbreaker.webinspectsession.requests.Session.request')
+def test_download_scan_format_discards_other_scan_part_file(request_mock, tmpdir):
+    # Left by an interrupted run of an earlier scan with the same name
+    tmpdir.join('test-scan.fpr.old-scan-id.part').write('abc')
+    tmpdir.join('test-scan.fpr.old-scan-id.part.validator').write('"etag-1"')
+    request_mock.return_value = download_response(200, [b'def'])
+    file_path = str(tmpdir.join('test-scan.fpr'))
+
+    result = PooledWebInspectApi('https://test-server:8083').download_scan_format('scan-id', 'fpr', file_path)
+
+    assert result.success
+    assert 'Range' not in request_mock.call_args[1]['headers']
+    assert tmpdir.join('test-scan.fpr').read() == 'def'
+    assert tmpdir.listdir() == [tmpdir.join('test-scan.fpr')]
+
+
+@mock.patch('webbreaker.webinspectsession.requests.Session.request')
+def test_download_scan_format_restarts_part_file_without_validator(request_mock, tmpdir):
+    tmpdir.join('test-scan.fpr.scan-id.part').write('abc')
+    request_mock.return_value = download_response(200, [b'def'])
+    file_path = str(tmpdir.join('test-scan.fpr'))
+
+    PooledWebInspectApi('https://test-server:8083').download_scan_format('scan-id', 'fpr', file_path)
+
+    assert 'Range' not in request_mock.call_args[1]['headers']
+    assert tmpdir.join('test-scan.fpr').read() == 'def'
+
+
+@mock.patch('webbreaker.webinspectsession.requests.Session.request')
+def test_download_scan_format_failure_keeps_existing_file(request_mock, tmpdir):
+    tmpdir.join('test-scan.fpr').write('previous')
+    request_mock.return_value = download_response(500, [])
+    file_path = str(tmpdir.join('test-scan.fpr'))
+
+    result = PooledWebInspectApi('https://test-server:8083').download_scan_format('scan-id', 'fpr', file_path)
+
+    assert not result.success
+    assert result.response_code == 500
+    assert tmpdir.join('test-scan.fpr').read() == 'previous'
+
+
+@mock.patch('webbreaker.webinspectsession.requests.Session.request')
+def test_pooled_api_undecodable_json(request_mock):
+    response = mock.Mock(status_code=200, text='{')
+    response.raise_for_status.side_effect = ValueError('bad json')
+    request_mock.return_value = response
+
+    result = PooledWebInspectApi('https://test-server:8083').list_scans()
+
+    assert not result.success
+    assert result.message == 'JSON response could not be decoded bad json.'
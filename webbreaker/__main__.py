@@ -11,32 +11,34 @@ __license__ = "MIT"
 try:
     from signal import *
     from urlparse import urlparse
-    import urllib
 except ImportError:  # Python3
-    import html.entities as htmlentitydefs
     from urllib.parse import urlparse
-    import html.parser as HTMLParser
-    import urllib.request as urllib
 
-import requests.exceptions
-from git.exc import GitCommandError
 import click
 from webbreaker import __version__ as version
 from webbreaker.webbreakerlogger import Logger
-from webbreaker.webinspectconfig import WebInspectConfig
-from webbreaker.webinspectclient import WebinspectClient
-from webbreaker.webinspectqueryclient import WebinspectQueryClient
-from webbreaker.fortifyclient import FortifyClient
-from webbreaker.fortifyconfig import FortifyConfig
-from webbreaker.webinspectscanhelpers import create_scan_event_handler
-from webbreaker.webinspectscanhelpers import scan_running
-from webbreaker.webbreakerhelper import WebBreakerHelper
-from webbreaker.gitclient import GitClient, write_agent_info, read_agent_info, format_git_url
-from webbreaker.gitclient import AgentVerifier
-from webbreaker.secretclient import SecretClient
-from webbreaker.threadfixclient import ThreadFixClient
-from webbreaker.threadfixconfig import ThreadFixConfig
-from webbreaker.webinspectproxyclient import WebinspectProxyClient
+from webbreaker.webbreakerhelper import WebBreakerHelper, LazyImport
+
+# Clients are imported when a command first uses them, so that each command only pays for its own dependencies
+WebInspectConfig = LazyImport('webbreaker.webinspectconfig', 'WebInspectConfig')
+WebinspectClient = LazyImport('webbreaker.webinspectclient', 'WebinspectClient')
+WebinspectQueryClient = LazyImport('webbreaker.webinspectqueryclient', 'WebinspectQueryClient')
+FortifyClient = LazyImport('webbreaker.fortifyclient', 'FortifyClient')
+FortifyConfig = LazyImport('webbreaker.fortifyconfig', 'FortifyConfig')
+create_scan_event_handler = LazyImport('webbreaker.webinspectscanhelpers', 'create_scan_event_handler')
+scan_running = LazyImport('webbreaker.webinspectscanhelpers', 'scan_running')
+GitClient = LazyImport('webbreaker.gitclient', 'GitClient')
+write_agent_info = LazyImport('webbreaker.gitclient', 'write_agent_info')
+read_agent_info = LazyImport('webbreaker.gitclient', 'read_agent_info')
+format_git_url = LazyImport('webbreaker.gitclient', 'format_git_url')
+AgentVerifier = LazyImport('webbreaker.gitclient', 'AgentVerifier')
+SecretClient = LazyImport('webbreaker.secretclient', 'SecretClient')
+ThreadFixClient = LazyImport('webbreaker.threadfixclient', 'ThreadFixClient')
+ThreadFixConfig = LazyImport('webbreaker.threadfixconfig', 'ThreadFixConfig')
+WebinspectProxyClient = LazyImport('webbreaker.webinspectproxyclient', 'WebinspectProxyClient')
+AdmissionQueue = LazyImport('webbreaker.webinspectqueue', 'AdmissionQueue')
+WebInspectBatch = LazyImport('webbreaker.webinspectbatch', 'WebInspectBatch')
+load_batch_manifest = LazyImport('webbreaker.webinspectbatch', 'load_batch_manifest')
 import re
 import sys
 import subprocess
@@ -99,6 +101,15 @@ def webinspect(config):
 @click.option('--login_macro',
               required=False,
               help="Assign login macro to auth app")
+@click.option('--max_wait',
+              type=int,
+              required=False,
+              help="Seconds to wait in queue when all WebInspect servers are busy")
+@click.option('--priority',
+              type=int,
+              default=0,
+              required=False,
+              help="Queue priority, higher priority scans are launched first")
 @click.option('--scan_name',
               type=str,
               required=False,
@@ -145,6 +156,9 @@ def webinspect(config):
               help="Assign workflow macro(s)")
 @pass_config
 def scan(config, **kwargs):
+    import requests.exceptions
+    from git.exc import GitCommandError
+
     # Setup our configuration...
     webinspect_config = WebInspectConfig()
 
@@ -177,87 +191,77 @@ def scan(config, **kwargs):
         Logger.app.critical("Incorrect WebInspect configurations found!! {}".format(str(e)))
         exit(1)
 
-    # if a scan policy has been specified, we need to make sure we can find/use it
-
-    if webinspect_client.scan_policy:
-        # two happy paths: either the provided policy refers to an existing builtin policy, or it refers to
-        # a local policy we need to first upload and then use.
-
-        if str(webinspect_client.scan_policy).lower() in [str(x[0]).lower() for x in webinspect_config.mapped_policies]:
-            idx = [x for x, y in enumerate(webinspect_config.mapped_policies) if
-                   y[0] == str(webinspect_client.scan_policy).lower()]
-            policy_guid = webinspect_config.mapped_policies[idx[0]][1]
-            Logger.app.info(
-                "scan_policy {} with policyID {} has been selected.".format(webinspect_client.scan_policy,
-                                                                               policy_guid))
-            Logger.app.info("Checking to make sure a policy with that ID exists in WebInspect.")
-            if not webinspect_client.policy_exists(policy_guid):
-                Logger.app.error(
-                    "Scan policy {} cannot be located on the WebInspect server. Stopping".format(
-                        webinspect_client.scan_policy))
-                exit(1)
-            else:
-                Logger.app.info("Found policy {} in WebInspect.".format(policy_guid))
-        else:
-            # Not a builtin. Assume that caller wants the provided policy to be uploaded
-            Logger.app.info("Provided scan policy is not built-in, so will assume it needs to be uploaded.")
-            webinspect_client.upload_policy()
-            policy = webinspect_client.get_policy_by_name(webinspect_client.scan_policy)
-            if policy:
-                policy_guid = policy['uniqueId']
+    try:
+        # Make sure the scan policy can be found/used and upload whatever configurations have been provided
+        if not webinspect_client.prepare_scan(webinspect_config.mapped_policies):
+            exit(1)
+
+        Logger.app.info("Launching a scan")
+        # ... And launch a scan.
+        try:
+            scan_id = webinspect_client.create_scan()
+            if scan_id:
+                global handle_scan_event
+                handle_scan_event = create_scan_event_handler(webinspect_client, scan_id, webinspect_settings)
+                handle_scan_event('scan_start')
+                Logger.app.debug("Starting scan handling")
+                Logger.app.info("Execution is waiting on scan status change")
+                with scan_running():
+                    # execution waits here, blocking call
+                    status = webinspect_client.watch_scan(scan_id, on_event=handle_scan_event)
+                Logger.app.info("Scan status has changed to {0}.".format(status))
+
+                if status.lower() != 'complete':  # case insensitive comparison is tricky. this should be good enough for now
+                    Logger.app.error('Scan is incomplete and is unrecoverable. WebBreaker will exit!!')
+                    handle_scan_event('scan_end')
+                    exit(1)
             else:
-                Logger.app.error("The policy name is either incorrect or not available in {}."
-                                 .format('.webbreaker/etc/webinspect/policies'))
                 exit(1)
+            webinspect_client.export_scan_results(scan_id, 'fpr', 'xml')
 
-        # Change the provided policy name into the corresponding policy id for scan creation.
-        policy_id = webinspect_client.get_policy_by_guid(policy_guid)['id']
-        webinspect_client.scan_policy = policy_id
-        Logger.app.debug("New scan policy has been set")
-
+        except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as e:
+            Logger.app.error(
+                "Unable to connect to WebInspect {0}, see also: {1}".format(webinspect_settings['webinspect_url'], e))
 
-    # Upload whatever configurations have been provided...
-    # All skipped unless explicitly declared in CLI
-    if webinspect_client.webinspect_upload_settings:
-        webinspect_client.upload_settings()
+        handle_scan_event('scan_end')
+        Logger.app.info("Webbreaker WebInspect has completed.")
+    finally:
+        # Scans that never launched, or exited early, shouldn't hold on to their endpoint
+        webinspect_client.release_endpoint()
 
-    if webinspect_client.webinspect_upload_webmacros:
-        webinspect_client.upload_webmacros()
 
-    # if there was a provided scan policy, we've already uploaded so don't bother doing it again. hack.
-    if webinspect_client.webinspect_upload_policy and not webinspect_client.scan_policy:
-        webinspect_client.upload_policy()
+@webinspect.command(name='batch',
+                    short_help="Launch a batch of WebInspect scans",
+                    help=WebBreakerHelper().webinspect_batch_desc()
+                    )
+@click.option('--manifest',
+              required=True,
+              type=click.Path(exists=True, dir_okay=False),
+              help="JSON file listing the scans to launch")
+@pass_config
+def webinspect_batch(config, manifest):
+    from git.exc import GitCommandError
 
-    Logger.app.info("Launching a scan")
-    # ... And launch a scan.
+    webinspect_config = WebInspectConfig()
     try:
-        scan_id = webinspect_client.create_scan()
-        if scan_id:
-            global handle_scan_event
-            handle_scan_event = create_scan_event_handler(webinspect_client, scan_id, webinspect_settings)
-            handle_scan_event('scan_start')
-            Logger.app.debug("Starting scan handling")
-            Logger.app.info("Execution is waiting on scan status change")
-            with scan_running():
-                webinspect_client.wait_for_scan_status_change(scan_id)  # execution waits here, blocking call
-            status = webinspect_client.get_scan_status(scan_id)
-            Logger.app.info("Scan status has changed to {0}.".format(status))
-
-            if status.lower() != 'complete':  # case insensitive comparison is tricky. this should be good enough for now
-                Logger.app.error('Scan is incomplete and is unrecoverable. WebBreaker will exit!!')
-                handle_scan_event('scan_end')
-                exit(1)
-        else:
-            exit(1)
-        webinspect_client.export_scan_results(scan_id, 'fpr')
-        webinspect_client.export_scan_results(scan_id, 'xml')
+        scans = load_batch_manifest(manifest)
+    except (IOError, ValueError) as e:
+        Logger.app.error("Unable to read the scan manifest {0}: {1}".format(manifest, e))
+        exit(1)
 
-    except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as e:
-        Logger.app.error(
-            "Unable to connect to WebInspect {0}, see also: {1}".format(webinspect_settings['webinspect_url'], e))
+    # Pull down the webinspect server config files from github once for the whole batch
+    custom_settings = sorted(set(scan['settings'] for scan in scans if scan['settings'] != 'Default'))
+    try:
+        webinspect_config.fetch_webinspect_configs({'settings': custom_settings or 'Default'})
+    except GitCommandError as e:
+        Logger.app.critical("{} does not have permission to access the git repo: {}".format(
+            webinspect_config.webinspect_git, e))
+        sys.exit(1)
 
-    handle_scan_event('scan_end')
-    Logger.app.info("Webbreaker WebInspect has completed.")
+    batch = WebInspectBatch(scans, webinspect_config, launch_interval=webinspect_config.queue_poll_interval)
+    if not batch.run():
+        exit(1)
+    Logger.app.info("Webbreaker WebInspect batch has completed.")
 
 
 @webinspect.command(name='list',
@@ -311,6 +315,27 @@ def webinspect_list(config, server, scan_name, protocol):
         print('\n\n\n')
 
 
+@webinspect.command(name='queue',
+                    short_help="List scans waiting on a WebInspect server",
+                    help=WebBreakerHelper().webinspect_queue_desc())
+@pass_config
+def webinspect_queue(config):
+    import sqlite3
+    try:
+        entries = AdmissionQueue().entries()
+    except sqlite3.Error as e:
+        Logger.app.error("Unable to read the WebInspect scan queue: {}".format(e))
+        return
+    if entries:
+        print("{0:^8} {1:80} {2:10} {3:10} {4:30}".format('Position', 'Scan Name', 'Priority', 'Waiting', 'Owner'))
+        print("{0:8} {1:80} {2:10} {3:10} {4:30}\n".format('-' * 8, '-' * 80, '-' * 10, '-' * 10, '-' * 30))
+        for position, entry in enumerate(entries, 1):
+            print("{0:^8} {1:80} {2:<10} {3:<10} {4:30}".format(position, entry[0], entry[1],
+                                                                 "{}s".format(int(entry[2])), entry[3]))
+    else:
+        print("No scans are waiting on a WebInspect server")
+
+
 @webinspect.command(name='servers',
                     short_help="List all WebInspect servers",
                     help=WebBreakerHelper().webinspect_servers_desc())
@@ -563,8 +588,12 @@ def fortify(config):
               required=False,
               help="Specify Fortify app name"
               )
+@click.option('--refresh',
+              required=False,
+              is_flag=True,
+              help="Refresh the local index of Fortify application versions")
 @pass_config
-def fortify_list(config, fortify_user, fortify_password, application):
+def fortify_list(config, fortify_user, fortify_password, application, refresh):
     fortify_config = FortifyConfig()
     try:
         if fortify_user and fortify_password:
@@ -591,6 +620,8 @@ def fortify_list(config, fortify_user, fortify_password, application):
                 fortify_config.write_username(fortify_user)
                 fortify_config.write_password(fortify_password)
                 Logger.app.info("Fortify credentials stored")
+        if refresh:
+            fortify_client.refresh_index(force=True)
         if application:
             fortify_client.list_application_versions(application)
         else:
@@ -1082,15 +1113,25 @@ def create(config, team_id, team, application, url):
 @click.option('--app_id',
               required=True,
               help="ThreadFix Application ID")
-def scan(config, app_id):
+@click.option('--no_filenames',
+              required=False,
+              is_flag=True,
+              help="List the scans without their filenames, which takes a request per scan not listed before")
+def scan(config, app_id, no_filenames):
     threadfix_config = ThreadFixConfig()
     threadfix_client = ThreadFixClient(host=threadfix_config.host, api_key=threadfix_config.api_key)
-    scans = threadfix_client.list_scans_by_app(app_id)
+    scans = threadfix_client.list_scans_by_app(app_id, filenames=not no_filenames)
     if scans:
-        print("{0:^10} {1:30} {2:30}".format('ID', 'Scanner Name', 'Filename'))
-        print("{0:10} {1:30} {2:30}".format('-' * 10, '-' * 30, '-' * 30))
-        for scan in scans:
-            print("{0:^10} {1:30} {2:30}".format(scan['id'], scan['scannerName'], scan['filename']))
+        if no_filenames:
+            print("{0:^10} {1:30}".format('ID', 'Scanner Name'))
+            print("{0:10} {1:30}".format('-' * 10, '-' * 30))
+            for scan in scans:
+                print("{0:^10} {1:30}".format(scan['id'], scan['scannerName']))
+        else:
+            print("{0:^10} {1:30} {2:30}".format('ID', 'Scanner Name', 'Filename'))
+            print("{0:10} {1:30} {2:30}".format('-' * 10, '-' * 30, '-' * 30))
+            for scan in scans:
+                print("{0:^10} {1:30} {2:30}".format(scan['id'], scan['scannerName'], scan['filename']))
         Logger.app.info("Successfully listed threadfix scans")
         print('\n\n')
     else:
@@ -1120,15 +1161,11 @@ def threadfix_upload(config, app_id, application, scan_file):
     threadfix_client = ThreadFixClient(host=threadfix_config.host, api_key=threadfix_config.api_key)
     if not app_id:
         Logger.app.info("Attempting to find application matching name {}".format(application))
-        apps = threadfix_client.list_all_apps()
-        if not apps:
+        matches = threadfix_client.find_apps(app_name=application, exact=True)
+        if matches is False:
             Logger.app.error("Failed to retrieve applications from ThreadFix")
             return
         else:
-            matches = []
-            for app in apps:
-                if app['app_name'] == application:
-                    matches.append(app.copy())
             if len(matches) == 0:
                 Logger.app.error("No application was found matching name {}".format(application))
                 return
@@ -1164,11 +1201,17 @@ def threadfix_upload(config, app_id, application, scan_file):
               required=False,
               default=None,
               help="Specify application name to list")
+@click.option('--refresh',
+              required=False,
+              is_flag=True,
+              help="List the applications from ThreadFix rather than the local index")
 @pass_config
-def threadfix_list(config, team, application):
+def threadfix_list(config, team, application, refresh):
     threadfix_config = ThreadFixConfig()
     threadfix_client = ThreadFixClient(host=threadfix_config.host, api_key=threadfix_config.api_key)
-    applications = threadfix_client.list_all_apps(team, application)
+    if refresh and not threadfix_client.refresh_index(force=True):
+        Logger.app.error("Unable to refresh the ThreadFix index")
+    applications = threadfix_client.find_apps(team, application)
     if applications is not False:
         if len(applications):
             print("{0:^10} {1:55} {2:30}".format('App ID', 'Team', 'Application'))
@@ -3,6 +3,7 @@
 
 import os
 import shutil
+import threading
 
 try:
     import ConfigParser as configparser
@@ -13,6 +14,10 @@ except ImportError:  # Python3
 
     config = configparser.ConfigParser()
 
+# What the shared parser above holds, so that config.ini is only parsed again once it changes on disk
+_snapshot = {'path': None, 'stat': None, 'defaults': None}
+_snapshot_lock = threading.RLock()
+
 
 class Config(object):
     def __init__(self):
@@ -25,6 +30,9 @@ class Config(object):
         self.agent_json = None
         self.secret = None
         self.cert = None
+        # Set while set_config runs, so that missing defaults are written together once it's done
+        self.batch_writes = False
+        self.unsaved = False
 
         self.set_vars()
         self.set_config()
@@ -76,25 +84,78 @@ class Config(object):
             return dir_path
         return 1
 
-    def conf_get(self, section, option, value=None):
+    @staticmethod
+    def invalidate():
+        """
+        Forget the parsed config.ini, so that the next lookup parses it again
+        """
+        with _snapshot_lock:
+            _snapshot.update(path=None, stat=None, defaults=None)
+
+    def __config_stat__(self):
         try:
+            stat = os.stat(self.config)
+            return stat.st_mtime, stat.st_size
+        except (OSError, TypeError):
+            return None
+
+    def load(self):
+        """
+        Parse config.ini into the parser shared by every Config in the process, unless it hasn't changed since it was
+        last parsed or written.
+        """
+        with _snapshot_lock:
+            stat = self.__config_stat__()
+            if stat is not None and _snapshot['path'] == self.config and _snapshot['stat'] == stat:
+                return
+            for section in config.sections():
+                config.remove_section(section)
             config.read(self.config)
-            return config.get(section, option)
+            _snapshot.update(path=self.config, stat=stat)
+
+    def __save__(self):
+        if self.batch_writes:
+            self.unsaved = True
+            return
+        with open(self.config, 'w') as configfile:
+            config.write(configfile)
+        _snapshot.update(path=self.config, stat=self.__config_stat__())
+
+    def conf_get(self, section, option, value=None):
+        with _snapshot_lock:
+            try:
+                self.load()
+                return config.get(section, option)
 
-        except configparser.NoSectionError:
-            config.add_section(section)
-            config.set(section, option, value)
-            with open(self.config, 'w') as configfile:
-                config.write(configfile)
-            return value
+            except configparser.NoSectionError:
+                config.add_section(section)
+                config.set(section, option, value)
+                self.__save__()
+                return value
 
-        except configparser.NoOptionError:
-            config.set(section, option, value)
-            with open(self.config, 'w') as configfile:
-                config.write(configfile)
-            return value
+            except configparser.NoOptionError:
+                config.set(section, option, value)
+                self.__save__()
+                return value
 
     def set_config(self):
+        with _snapshot_lock:
+            stat = self.__config_stat__()
+            if stat is not None and _snapshot['defaults'] == (self.config, stat):
+                # Every default is already in config.ini
+                return
+            self.batch_writes = True
+            self.unsaved = False
+            try:
+                self.set_defaults()
+            finally:
+                self.batch_writes = False
+            if self.unsaved:
+                self.unsaved = False
+                self.__save__()
+            _snapshot['defaults'] = (self.config, self.__config_stat__())
+
+    def set_defaults(self):
         self.conf_get('git', 'token', '43eb3ddb7152bbecXXabcee04859ee73eaa1XXXX')
 
         self.conf_get('fortify', 'ssc_url', 'https://fortify.example.com')
@@ -102,9 +163,15 @@ class Config(object):
         self.conf_get('fortify', 'application_name', 'WEBINSPECT')
         self.conf_get('fortify', 'username', '')
         self.conf_get('fortify', 'password', '')
+        self.conf_get('fortify', 'token_ttl', '3600')
+        self.conf_get('fortify', 'token_refresh_margin', '300')
+        self.conf_get('fortify', 'index_ttl', '3600')
+        self.conf_get('fortify', 'transfer_retries', '3')
 
         self.conf_get('threadfix', 'host', 'https://threadfix.example.com:8443/threadfix')
         self.conf_get('threadfix', 'api_key', 'ZfO0b7dotQZnXSgkMOEuQVoFIeDZwd8OEQE7XXX')
+        self.conf_get('threadfix', 'pool_size', '8')
+        self.conf_get('threadfix', 'index_ttl', '3600')
 
         self.conf_get('webinspect', 'size_large', '2')
         self.conf_get('webinspect', 'size_medium', '1')
@@ -112,6 +179,20 @@ class Config(object):
         self.conf_get('webinspect', 'server_01', 'https://webinspect-server-1.example.com:8083')
         self.conf_get('webinspect', 'endpoint_01', '%(server_01)s|%(size_large)s')
         self.conf_get('webinspect', 'git_repo', 'git@github.com:automationdomination/WebInspect.git')
+        self.conf_get('webinspect', 'probe_timeout', '15')
+        self.conf_get('webinspect', 'probe_pool_size', '8')
+        self.conf_get('webinspect', 'scheduler', 'least_loaded')
+        self.conf_get('webinspect', 'lease_backend', 'sqlite')
+        self.conf_get('webinspect', 'lease_ttl', '600')
+        self.conf_get('webinspect', 'queue_max_wait', '0')
+        self.conf_get('webinspect', 'queue_poll_interval', '5')
+        self.conf_get('webinspect', 'queue_max_poll_interval', '60')
+        self.conf_get('webinspect', 'upload_pool_size', '4')
+        self.conf_get('webinspect', 'scan_poll_interval', '5')
+        self.conf_get('webinspect', 'scan_max_poll_interval', '60')
+        self.conf_get('webinspect', 'scan_reconnect_timeout', '600')
+        self.conf_get('webinspect', 'scan_stall_timeout', '3600')
+        self.conf_get('webinspect', 'scan_long_poll_timeout', '300')
 
         self.conf_get('webinspect_policy', 'aggressivesqlinjection', '032b1266-294d-42e9-b5f0-2a4239b23941')
         self.conf_get('webinspect_policy', 'allchecks', '08cd4862-6334-4b0e-abf5-cb7685d0cde7')
@@ -143,6 +224,14 @@ class Config(object):
         self.conf_get('webinspect_policy', 'transportlayersecurity', '0fa627de-3f1c-4640-a7d3-154e96cda93c')
 
 
+        self.conf_get('logging', 'queue_size', '10000')
+        self.conf_get('logging', 'max_bytes', '0')
+        self.conf_get('logging', 'backup_count', '5')
+
+        self.conf_get('metrics', 'jsonl_path', '')
+        self.conf_get('metrics', 'prometheus_file', '')
+        self.conf_get('metrics', 'prometheus_port', '0')
+
         self.conf_get('emailer', 'smtp_host', 'smtp.example.com')
         self.conf_get('emailer', 'smtp_port', '25')
         self.conf_get('emailer', 'from_address', 'webbreaker-no-reply@example.com')
@@ -3,14 +3,32 @@
 
 import os
 import socket
+import time
 from webbreaker.webbreakerhelper import WebBreakerHelper
 from webbreaker.webbreakerlogger import Logger
+from webbreaker.webbreakermetrics import metrics
+from webbreaker.fortifyindex import FortifyIndex
+from webbreaker.fortifytokencache import FortifyTokenCache, parse_terminal_date
+from webbreaker.fortifytransfer import download_artifact, upload_artifact
 from fortifyapi.fortify import FortifyApi
 
+# Items asked for per request when paging through SSC search results
+PAGE_SIZE = 200
+PROJECT_FIELDS = 'id,name'
+VERSION_FIELDS = 'id,name,project'
+
+
+def search_term(field, value):
+    """
+    :return: A term of an SSC search expression, q=, matching field to value
+    """
+    return '{0}:"{1}"'.format(field, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+
 
 class FortifyClient(object):
     def __init__(self, fortify_url, project_template=None, application_name=None, fortify_username=None,
-                 fortify_password=None, scan_name=None, extension=None, token=None):
+                 fortify_password=None, scan_name=None, extension=None, token=None, token_cache=None,
+                 index=None):
         self.ssc_server = fortify_url
         self.project_template = project_template
         self.application_name = application_name
@@ -19,6 +37,9 @@ class FortifyClient(object):
         self.fortify_version = scan_name
         self.extension = extension
         self.runenv = WebBreakerHelper.check_run_env()
+        self.token_cache = token_cache
+        # FortifyIndex, set up on first use unless given, or False not to use one
+        self.index = index
         self.token = token
         if not token:
             self.token = self.get_token()
@@ -27,23 +48,148 @@ class FortifyClient(object):
             raise ValueError("Unable to obtain a Fortify API token.")
 
     def get_token(self):
+        """
+        :return: A token for the user, from the token cache while it is still good for a while
+        """
+        if not self.user:
+            return self.__authenticate__()[0]
+        try:
+            if self.token_cache is None:
+                self.token_cache = FortifyTokenCache()
+            return self.token_cache.get(self.ssc_server, self.user, self.password, self.__authenticate__)
+        except Exception as e:
+            Logger.app.error("Unable to use the Fortify token cache: {}".format(e))
+            return self.__authenticate__()[0]
+
+    @metrics.timed('fortify_client')
+    def __authenticate__(self):
+        """
+        :return: (token, expiry in seconds since the epoch or None) from logging in to SSC, or (None, None)
+        """
         try:
             api = FortifyApi(self.ssc_server, username=self.user, password=self.password, verify_ssl=False)
             response = api.get_token()
             if response.success:
-                token = response.data['data']['token']
-                return token
+                data = response.data['data']
+                return data['token'], parse_terminal_date(data.get('terminalDate'))
             else:
                 Logger.app.critical(response.message)
         except Exception as e:
             if hasattr(e, 'message'):
                 Logger.app.critical("Exception while getting Fortify token: {0}".format(e.message))
 
+        return None, None
+
+    def __reauthenticate__(self):
+        """
+        SSC turned the token down, e.g. it was revoked before it expired, so log in again rather than reusing it
+        :return: True if there is a new token
+        """
+        if not self.user or not self.password:
+            return False
+        Logger.app.info("Fortify token was rejected, requesting a new one")
+        if self.token_cache is not None:
+            try:
+                self.token_cache.invalidate(self.ssc_server, self.user, self.password)
+            except Exception as e:
+                Logger.app.error("Unable to use the Fortify token cache: {}".format(e))
+        token = self.get_token()
+        if token:
+            self.token = token
+        return bool(token)
+
+    @metrics.timed('fortify_client')
+    def __search__(self, path, query=None, fields=None, page_size=PAGE_SIZE):
+        """
+        Page through an SSC collection filtered by SSC, rather than fetching all of it and filtering here
+        :param path: e.g. /api/v1/projectVersions
+        :param query: Terms of an SSC search expression, see search_term, all of which have to match
+        :param fields: Comma separated fields to return of each item, all of them if None
+        :return: FortifyResponse with every matching item in data['data'], or the first unsuccessful response
+        """
+        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
+        params = {'limit': page_size}
+        if query:
+            params['q'] = '+'.join(query)
+        if fields:
+            params['fields'] = fields
+        items = []
+        while True:
+            params['start'] = len(items)
+            response = api._request('GET', path, params=dict(params))
+            if not response.success:
+                return response
+            page = response.data.get('data') or []
+            items.extend(page)
+            if not page or len(items) >= response.data.get('count', 0):
+                response.data = {'data': items, 'count': len(items)}
+                return response
+
+    def __search_versions__(self, application_name, version_name=None):
+        query = [search_term('project.name', application_name)]
+        if version_name is not None:
+            query.append(search_term('name', version_name))
+        response = self.__search__('/api/v1/projectVersions', query, VERSION_FIELDS)
+        if response.success and self.__index__():
+            self.index.record(self.ssc_server, response.data['data'])
+        return response
+
+    def __index__(self):
+        """
+        :return: The FortifyIndex, or None if it can't be used
+        """
+        if self.index is None:
+            try:
+                self.index = FortifyIndex()
+            except Exception as e:
+                Logger.app.error("Unable to use the Fortify index: {}".format(e))
+                self.index = False
+        return self.index or None
+
+    @metrics.timed('fortify_client')
+    def refresh_index(self, force=False):
+        """
+        Bring the index up to date with SSC, if it hasn't been refreshed within [fortify] index_ttl seconds or force.
+        Pages of versions that haven't changed since the last refresh are answered with 304 Not Modified.
+        :return: None, or the unsuccessful response if SSC couldn't be listed
+        """
+        index = self.__index__()
+        if not index or not force and not index.is_stale(self.ssc_server):
+            return None
+        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
+        started = time.time()
+        start = 0
+        count = None
+        while True:
+            headers = {'Accept': 'application/json'}
+            validator = index.page_validator(self.ssc_server, start)
+            if validator:
+                headers['If-None-Match'] = validator
+            response = api._request('GET', '/api/v1/projectVersions', params={'start': start, 'limit': PAGE_SIZE,
+                                                                              'fields': VERSION_FIELDS,
+                                                                              'orderby': 'id'}, headers=headers)
+            if response.response_code == 304:
+                listed = index.keep_page(self.ssc_server, start)
+            elif response.success:
+                page = response.data.get('data') or []
+                index.store_page(self.ssc_server, start, page, (response.headers or {}).get('ETag'))
+                listed = len(page)
+                count = response.data.get('count')
+            else:
+                return response
+            start += PAGE_SIZE
+            if listed < PAGE_SIZE or count is not None and start >= count:
+                break
+        index.finish_refresh(self.ssc_server, started, start)
         return None
 
+    @metrics.timed('fortify_client')
     def __get_project_id__(self, project_name):
-        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
-        response = api.get_projects()
+        index = self.__index__()
+        project_id = index.project_id(self.ssc_server, project_name) if index else None
+        if project_id:
+            return project_id
+        response = self.__search__('/api/v1/projects', [search_term('name', project_name)], PROJECT_FIELDS)
         if response.success:
             for project in response.data['data']:
                 if project['name'] == project_name:
@@ -56,6 +202,7 @@ class FortifyClient(object):
         else:
             return "WebBreaker scan from WebBreaker host " + socket.getfqdn()
 
+    @metrics.timed('fortify_client')
     def __create_project_version__(self):
         """
         Create, add required attributes to, and commit a new project version
@@ -94,6 +241,7 @@ class FortifyClient(object):
 
         return None
 
+    @metrics.timed('fortify_client')
     def __create_new_project_version__(self):
         api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
 
@@ -128,6 +276,7 @@ class FortifyClient(object):
 
         return project_version_id
 
+    @metrics.timed('fortify_client')
     def __get_attribute_definition_id__(self, search_expression):
         api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
         response = api.get_attribute_definition(search_expression=search_expression)
@@ -136,6 +285,7 @@ class FortifyClient(object):
         else:
             return None
 
+    @metrics.timed('fortify_client')
     def __get_project_version__(self):
         """
         If a project version already exists, return it's project_version_id
@@ -143,9 +293,13 @@ class FortifyClient(object):
         If none of the above succeeds, log the reason(s) and return None
         :return:
         """
-        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
+        index = self.__index__()
+        version_id = index.version_id(self.ssc_server, self.application_name, self.fortify_version) if index else None
+        if version_id:
+            Logger.app.debug("Found existing project version {0} in the index".format(version_id))
+            return version_id
         try:
-            response = api.get_project_versions()  # api should support a search expression here. alas...
+            response = self.__search_versions__(self.application_name, self.fortify_version)
             if response.success:
                 for project_version in response.data['data']:
                     if project_version['project']['name'] == self.application_name:
@@ -154,10 +308,9 @@ class FortifyClient(object):
                             Logger.app.debug("Found existing project version {0}".format(project_version['id']))
                             return project_version['id']
                 # Didn't find a matching project version, verify that our project exists
-                for project_version in response.data['data']:
-                    if project_version['project']['name'] == self.application_name:
-                        # Our project exsits, so create a new version
-                        return self.__create_project_version__()
+                if self.__get_project_id__(self.application_name):
+                    # Our project exsits, so create a new version
+                    return self.__create_project_version__()
                 # Let upload_scan know that our project doesn't exist
                 return -2
             elif "401" in response.message:
@@ -170,21 +323,23 @@ class FortifyClient(object):
 
         return None
 
+    @metrics.timed('fortify_client')
     def upload_scan(self, file_name):
         file_name = self.trim_ext(file_name)
-        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
         project_version_id = self.__get_project_version__()
+        if project_version_id == -1 and self.__reauthenticate__():
+            project_version_id = self.__get_project_version__()
         # If our project doesn't exist, exit upload_scan
         if project_version_id == -1:
             return -1
+        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
         project_id = self.__get_project_id__(self.application_name)
         if not project_id:
             project_version_id = self.__create_new_project_version__()
         if not project_version_id:
             project_version_id = self.__create_project_version__()
         if project_version_id:
-            response = api.upload_artifact_scan(file_path=('{0}.{1}'.format(file_name, self.extension)),
-                                                project_version_id=project_version_id)
+            response = upload_artifact(api, '{0}.{1}'.format(file_name, self.extension), project_version_id)
 
         if response.success:
             Logger.console.info(
@@ -197,9 +352,9 @@ class FortifyClient(object):
             Logger.app.error("Error uploading {0}.{1}!!!".format(self.fortify_version, self.extension))
         return response
 
+    @metrics.timed('fortify_client')
     def list_projects(self):
-        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
-        response = api.get_projects()
+        response = self.__search__('/api/v1/projects', fields=PROJECT_FIELDS)
         if response.success:
             Logger.console.info("{0:^5} {1:30}".format('ID', 'Name'))
             Logger.console.info("{0:5} {1:30}".format('-' * 5, '-' * 30))
@@ -207,36 +362,56 @@ class FortifyClient(object):
                 Logger.console.info("{0:^5} {1:30}".format(proj['id'], proj['name']))
         return None
 
+    @staticmethod
+    def __print_versions__(versions):
+        """
+        :param versions: (version id, application, version) of each version
+        """
+        Logger.console.info("{0:^8} {1:30} {2:30}".format('ID', 'Application', 'Version'))
+        Logger.console.info("{0:8} {1:30} {2:30}".format('-' * 8, '-' * 30, '-' * 30))
+        for version_id, application, version in versions:
+            Logger.console.info("{0:8} {1:30} {2:30}".format(version_id, application, version))
+
+    @metrics.timed('fortify_client')
     def list_versions(self):
-        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
-        response = api.get_project_versions()
+        if self.__index__():
+            response = self.refresh_index()
+            if response is None:
+                self.__print_versions__(self.index.versions(self.ssc_server))
+                return None
+        else:
+            response = self.__search__('/api/v1/projectVersions', fields=VERSION_FIELDS)
         if response.success:
-            Logger.console.info("{0:^8} {1:30} {2:30}".format('ID', 'Application', 'Version'))
-            Logger.console.info("{0:8} {1:30} {2:30}".format('-' * 8, '-' * 30, '-' * 30))
-            for version in response.data['data']:
-                Logger.console.info(
-                    "{0:8} {1:30} {2:30}".format(version['id'], version['project']['name'], version['name']))
+            self.__print_versions__((version['id'], version['project']['name'], version['name'])
+                                    for version in response.data['data'])
         elif not response.success and "401" in response.message:
             return response.response_code
         return None
 
+    @metrics.timed('fortify_client')
     def list_application_versions(self, application):
-        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
-        response = api.get_project_versions()
+        """
+        Listed from the index while it is current, otherwise looked up in SSC
+        """
+        index = self.__index__()
+        if index and not index.is_stale(self.ssc_server):
+            self.__print_versions__(index.versions(self.ssc_server, application))
+            return None
+        response = self.__search_versions__(application)
         if response.success:
-            Logger.console.info("{0:^8} {1:30} {2:30}".format('ID', 'Application', 'Version'))
-            Logger.console.info("{0:8} {1:30} {2:30}".format('-' * 8, '-' * 30, '-' * 30))
-            for version in response.data['data']:
-                if version['project']['name'] == application:
-                    Logger.console.info(
-                        "{0:8} {1:30} {2:30}".format(version['id'], version['project']['name'], version['name']))
+            self.__print_versions__((version['id'], version['project']['name'], version['name'])
+                                    for version in response.data['data'] if version['project']['name'] == application)
         elif not response.success and "401" in response.message:
             return response.response_code
         return None
 
+    @metrics.timed('fortify_client')
     def find_version_id(self, version_name):
-        api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
-        response = api.get_project_versions()
+        index = self.__index__()
+        version_id = index.version_id(self.ssc_server, self.application_name, version_name) if index else None
+        if version_id:
+            return version_id
+        response = self.__search_versions__(self.application_name, version_name)
         if response.success:
             for version in response.data['data']:
                 if version['project']['name'] == self.application_name:
@@ -245,13 +420,11 @@ class FortifyClient(object):
 
         return False
 
+    @metrics.timed('fortify_client')
     def download_scan(self, version_id):
         api = FortifyApi(self.ssc_server, token=self.token, verify_ssl=False)
-        response, file_name = api.download_artifact_scan(version_id)
+        response, file_name = download_artifact(api, version_id)
         if response.success:
-            file_content = response.data
-            with open(file_name, 'wb') as f:
-                f.write(file_content)
             return file_name
         else:
             Logger.app.error("Error downloading scan file: {}".format(response.message))
@@ -260,6 +433,8 @@ class FortifyClient(object):
     def build_pv_url(self):
         try:
             version_id = self.__get_project_version__()
+            if version_id == -1 and self.__reauthenticate__():
+                version_id = self.__get_project_version__()
 
             if version_id == -1:
                 # This signals that an auth error occurred, CLI will attempt to reauth
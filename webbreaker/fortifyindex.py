@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import time
+from webbreaker.confighelper import Config
+from webbreaker.webinspectlease import default_lease_db
+
+
+class FortifyIndex(object):
+    """
+    Local copy of the application versions in each SSC, so that finding the id of an application or version doesn't
+    take a request. Entries are trusted for ttl seconds after they were last seen in SSC, after which they are looked
+    up in SSC again. A refresh lists every version a page at a time, and keeps the validator of each page, so that
+    pages which haven't changed since the last refresh are answered with 304 Not Modified.
+    """
+
+    def __init__(self, db_path=None, ttl=None, timeout=30):
+        """
+        :param db_path: SQLite database holding the index
+        :param ttl: Seconds entries are trusted for, see [fortify] index_ttl
+        """
+        self.db_path = db_path if db_path else default_lease_db()
+        self.ttl = float(ttl if ttl is not None else Config().conf_get('fortify', 'index_ttl', '3600'))
+        self.timeout = timeout
+        connection = self.__connect__()
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS fortify_versions ("
+                               "ssc_url TEXT NOT NULL, "
+                               "version_id INTEGER NOT NULL, "
+                               "project_id INTEGER NOT NULL, "
+                               "application TEXT NOT NULL, "
+                               "version TEXT NOT NULL, "
+                               "page_start INTEGER, "
+                               "seen REAL NOT NULL, "
+                               "PRIMARY KEY (ssc_url, version_id))")
+            connection.execute("CREATE INDEX IF NOT EXISTS fortify_versions_name "
+                               "ON fortify_versions (ssc_url, application, version)")
+            connection.execute("CREATE TABLE IF NOT EXISTS fortify_index_pages ("
+                               "ssc_url TEXT NOT NULL, "
+                               "page_start INTEGER NOT NULL, "
+                               "validator TEXT NOT NULL, "
+                               "PRIMARY KEY (ssc_url, page_start))")
+            connection.execute("CREATE TABLE IF NOT EXISTS fortify_index_refreshes ("
+                               "ssc_url TEXT PRIMARY KEY, "
+                               "refreshed REAL NOT NULL)")
+        finally:
+            connection.close()
+
+    def __connect__(self):
+        return sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+
+    @staticmethod
+    def __server__(ssc_url):
+        return ssc_url.rstrip('/')
+
+    def version_id(self, ssc_url, application, version):
+        """
+        :return: The id of the version of application, or None if it isn't in the index or is due to be looked up again
+        """
+        connection = self.__connect__()
+        try:
+            row = connection.execute("SELECT version_id FROM fortify_versions WHERE ssc_url = ? AND application = ? "
+                                     "AND version = ? AND seen > ?",
+                                     (self.__server__(ssc_url), application, version,
+                                      time.time() - self.ttl)).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def project_id(self, ssc_url, application):
+        """
+        :return: The id of application, or None if none of its versions are in the index or are due to be looked up
+        again
+        """
+        connection = self.__connect__()
+        try:
+            row = connection.execute("SELECT project_id FROM fortify_versions WHERE ssc_url = ? AND application = ? "
+                                     "AND seen > ? LIMIT 1",
+                                     (self.__server__(ssc_url), application, time.time() - self.ttl)).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def versions(self, ssc_url, application=None):
+        """
+        :return: (version id, application, version) of every indexed version, of application if given
+        """
+        query = "SELECT version_id, application, version FROM fortify_versions WHERE ssc_url = ?"
+        params = [self.__server__(ssc_url)]
+        if application is not None:
+            query += " AND application = ?"
+            params.append(application)
+        connection = self.__connect__()
+        try:
+            return connection.execute(query + " ORDER BY version_id", params).fetchall()
+        finally:
+            connection.close()
+
+    def record(self, ssc_url, versions):
+        """
+        Add or update versions found in SSC outside of a refresh
+        :param versions: SSC project versions, with at least their id, name and project
+        """
+        connection = self.__connect__()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            self.__upsert__(connection, self.__server__(ssc_url), versions, None)
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    @staticmethod
+    def __upsert__(connection, server, versions, page_start):
+        now = time.time()
+        for version in versions:
+            # Versions recorded between refreshes keep the page they were listed on
+            connection.execute("INSERT OR REPLACE INTO fortify_versions "
+                               "(ssc_url, version_id, project_id, application, version, page_start, seen) "
+                               "VALUES (?, ?, ?, ?, ?, COALESCE(?, (SELECT page_start FROM fortify_versions "
+                               "WHERE ssc_url = ? AND version_id = ?)), ?)",
+                               (server, version['id'], version['project']['id'], version['project']['name'],
+                                version['name'], page_start, server, version['id'], now))
+
+    def is_stale(self, ssc_url):
+        """
+        :return: True if the index of ssc_url hasn't been refreshed within ttl seconds
+        """
+        connection = self.__connect__()
+        try:
+            row = connection.execute("SELECT refreshed FROM fortify_index_refreshes WHERE ssc_url = ?",
+                                     (self.__server__(ssc_url),)).fetchone()
+        finally:
+            connection.close()
+        return not row or row[0] <= time.time() - self.ttl
+
+    def page_validator(self, ssc_url, page_start):
+        """
+        :return: The ETag of the page from the last refresh, or None
+        """
+        connection = self.__connect__()
+        try:
+            row = connection.execute("SELECT validator FROM fortify_index_pages WHERE ssc_url = ? AND page_start = ?",
+                                     (self.__server__(ssc_url), page_start)).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def store_page(self, ssc_url, page_start, versions, validator):
+        """
+        Record a page of versions listed during a refresh
+        """
+        server = self.__server__(ssc_url)
+        connection = self.__connect__()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            # Versions that were on the page last time are listed on another page now, or were deleted
+            connection.execute("UPDATE fortify_versions SET page_start = NULL WHERE ssc_url = ? AND page_start = ?",
+                               (server, page_start))
+            self.__upsert__(connection, server, versions, page_start)
+            if validator:
+                connection.execute("INSERT OR REPLACE INTO fortify_index_pages (ssc_url, page_start, validator) "
+                                   "VALUES (?, ?, ?)", (server, page_start, validator))
+            else:
+                connection.execute("DELETE FROM fortify_index_pages WHERE ssc_url = ? AND page_start = ?",
+                                   (server, page_start))
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def keep_page(self, ssc_url, page_start):
+        """
+        The page hasn't changed since the last refresh, so its versions are still current
+        :return: The number of versions on the page
+        """
+        connection = self.__connect__()
+        try:
+            return connection.execute("UPDATE fortify_versions SET seen = ? WHERE ssc_url = ? AND page_start = ?",
+                               (time.time(), self.__server__(ssc_url), page_start)).rowcount
+        finally:
+            connection.close()
+
+    def finish_refresh(self, ssc_url, started, pages_end):
+        """
+        Drop the versions that weren't listed by the refresh that began at started, i.e. were deleted from SSC
+        :param pages_end: Start of the first page past the end of the listing
+        """
+        server = self.__server__(ssc_url)
+        connection = self.__connect__()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM fortify_versions WHERE ssc_url = ? AND seen < ?", (server, started))
+            connection.execute("DELETE FROM fortify_index_pages WHERE ssc_url = ? AND page_start >= ?",
+                               (server, pages_end))
+            connection.execute("INSERT OR REPLACE INTO fortify_index_refreshes (ssc_url, refreshed) VALUES (?, ?)",
+                               (server, time.time()))
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
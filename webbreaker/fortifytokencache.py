@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import calendar
+import datetime
+import hashlib
+import hmac
+import os
+import sqlite3
+import time
+from webbreaker.webbreakerlogger import Logger
+from webbreaker.confighelper import Config
+from webbreaker.webinspectlease import default_lease_db
+
+
+def parse_terminal_date(terminal_date):
+    """
+    :param terminal_date: Expiry of an SSC token, e.g. 2018-03-14T18:32:06.000+0000
+    :return: The expiry in seconds since the epoch, or None if it can't be parsed
+    """
+    try:
+        expires = calendar.timegm(datetime.datetime.strptime(terminal_date[:19], '%Y-%m-%dT%H:%M:%S').timetuple())
+        offset = terminal_date[19:].split('+')[-1].split('-')[-1].replace(':', '')[-4:]
+        if len(offset) == 4 and offset.isdigit():
+            sign = -1 if '+' in terminal_date[19:] else 1
+            expires += sign * (int(offset[:2]) * 3600 + int(offset[2:]) * 60)
+        return expires
+    except (TypeError, ValueError):
+        return None
+
+
+class FortifyTokenCache(object):
+    """
+    Fortify SSC tokens shared by every WebBreaker run on this host, so that commands run back to back log in once.
+    Tokens are kept per server and user, encrypted with the Fernet secret of SecretClient, along with an HMAC of the
+    password under the same secret so that a changed password isn't answered with the old token, and are replaced once
+    they are within refresh_margin seconds of expiring. Only one process at a time logs in, the others wait for it
+    and reuse its token. The wait is on a lock database of its own, so that a slow login doesn't hold up the leases
+    and queue sharing the token database.
+    """
+
+    def __init__(self, db_path=None, fernet_key=None, token_ttl=None, refresh_margin=None, timeout=30):
+        """
+        :param db_path: SQLite database holding the tokens
+        :param fernet_key: Defaults to the SecretClient secret
+        :param token_ttl: Seconds a token is assumed to last when SSC doesn't say
+        :param refresh_margin: Seconds ahead of expiry a token is replaced
+        :param timeout: Seconds to wait on another process logging in
+        """
+        config = Config() if token_ttl is None or refresh_margin is None else None
+        self.db_path = db_path if db_path else default_lease_db()
+        self.lock_path = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), 'fortify-login.lock')
+        self.fernet_key = fernet_key
+        self.token_ttl = float(token_ttl if token_ttl is not None else
+                               config.conf_get('fortify', 'token_ttl', '3600'))
+        self.refresh_margin = float(refresh_margin if refresh_margin is not None else
+                                    config.conf_get('fortify', 'token_refresh_margin', '300'))
+        self.timeout = timeout
+        connection = self.__connect__()
+        try:
+            # Keyed on an unsalted hash of the password, replaced by fortify_user_tokens
+            connection.execute("DROP TABLE IF EXISTS fortify_tokens")
+            connection.execute("CREATE TABLE IF NOT EXISTS fortify_user_tokens ("
+                               "ssc_url TEXT NOT NULL, "
+                               "username TEXT NOT NULL, "
+                               "fingerprint TEXT NOT NULL, "
+                               "token BLOB NOT NULL, "
+                               "expires REAL NOT NULL, "
+                               "PRIMARY KEY (ssc_url, username))")
+        finally:
+            connection.close()
+
+    def __connect__(self):
+        return sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+
+    def __secret__(self):
+        if not self.fernet_key:
+            from webbreaker.secretclient import SecretClient
+            self.fernet_key = SecretClient().fernet_key
+        return self.fernet_key if isinstance(self.fernet_key, bytes) else self.fernet_key.encode()
+
+    def __cipher__(self):
+        from cryptography.fernet import Fernet
+        return Fernet(self.__secret__())
+
+    def __fingerprint__(self, password):
+        return hmac.new(self.__secret__(), (password or '').encode('utf-8'), hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def __server__(ssc_url):
+        return ssc_url.rstrip('/')
+
+    def __lookup__(self, ssc_url, username, password):
+        connection = self.__connect__()
+        try:
+            row = connection.execute("SELECT token, expires, fingerprint FROM fortify_user_tokens "
+                                     "WHERE ssc_url = ? AND username = ?",
+                                     (self.__server__(ssc_url), username or '')).fetchone()
+        finally:
+            connection.close()
+        if not row or row[1] - self.refresh_margin <= time.time():
+            return None
+        try:
+            if not hmac.compare_digest(str(row[2]), self.__fingerprint__(password)):
+                # The password was changed, or the secret was rotated
+                return None
+            return self.__cipher__().decrypt(bytes(row[0])).decode()
+        except Exception as e:
+            # e.g. the secret was rotated with 'webbreaker admin secret'
+            Logger.app.debug("Unable to decrypt the cached Fortify token: {}".format(e))
+            return None
+
+    def __store__(self, ssc_url, username, password, token, expires):
+        connection = self.__connect__()
+        try:
+            connection.execute("INSERT OR REPLACE INTO fortify_user_tokens "
+                               "(ssc_url, username, fingerprint, token, expires) VALUES (?, ?, ?, ?, ?)",
+                               (self.__server__(ssc_url), username or '', self.__fingerprint__(password),
+                                sqlite3.Binary(self.__cipher__().encrypt(token.encode())), expires))
+        finally:
+            connection.close()
+
+    def __login_lock__(self):
+        """
+        :return: Connection holding the login lock, or None if it couldn't be taken within timeout seconds
+        """
+        try:
+            lock = sqlite3.connect(self.lock_path, timeout=self.timeout, isolation_level=None)
+        except sqlite3.Error as e:
+            Logger.app.debug("Unable to open the Fortify login lock, logging in without it: {}".format(e))
+            return None
+        try:
+            lock.execute("BEGIN IMMEDIATE")
+            return lock
+        except sqlite3.Error as e:
+            Logger.app.debug("Fortify login lock is taken, logging in without it: {}".format(e))
+            lock.close()
+            return None
+
+    def get(self, ssc_url, username, password, authenticate):
+        """
+        :param authenticate: Called when there's no usable cached token, returns (token, expiry in seconds since the
+        epoch or None)
+        :return: The token, or None if there was none cached and authenticate didn't return one
+        """
+        try:
+            token = self.__lookup__(ssc_url, username, password)
+        except sqlite3.Error as e:
+            Logger.app.debug("Fortify token cache unavailable: {}".format(e))
+            return authenticate()[0]
+        if token:
+            Logger.app.debug("Reusing cached Fortify token")
+            return token
+        lock = self.__login_lock__()
+        try:
+            if lock:
+                # Another run may have logged in while we waited on the lock
+                token = self.__lookup__(ssc_url, username, password)
+                if token:
+                    Logger.app.debug("Reusing cached Fortify token")
+                    return token
+            token, expires = authenticate()
+            if token:
+                try:
+                    self.__store__(ssc_url, username, password, token,
+                                   expires if expires else time.time() + self.token_ttl)
+                except sqlite3.Error as e:
+                    Logger.app.debug("Unable to cache the Fortify token: {}".format(e))
+            return token
+        finally:
+            if lock:
+                lock.execute("ROLLBACK")
+                lock.close()
+
+    def invalidate(self, ssc_url, username, password):
+        """
+        Drop the cached token, e.g. once SSC has turned it down
+        """
+        connection = self.__connect__()
+        try:
+            connection.execute("DELETE FROM fortify_user_tokens WHERE ssc_url = ? AND username = ?",
+                               (self.__server__(ssc_url), username or ''))
+        finally:
+            connection.close()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import ntpath
+import os
+import re
+import time
+import zipfile
+import requests
+import requests.exceptions
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from fortifyapi.fortify import FortifyResponse, FortifyTokenAuth
+from webbreaker.confighelper import Config
+from webbreaker.webbreakerlogger import Logger
+from webbreaker.transferutil import CHUNK_SIZE, MultipartFileStream, TransferProgress, read_validator, remove_files, \
+    replace_file, write_validator
+
+# Responses worth trying a transfer again for
+TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+def retry_wait(attempt, backoff):
+    return backoff * 2 ** (attempt - 1)
+
+
+def transfer_retries():
+    return int(Config().conf_get('fortify', 'transfer_retries', '3'))
+
+
+def connect_failed(error):
+    """
+    :return: True if a request failed because the connection couldn't be opened, i.e. before anything was sent
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def upload_artifact(api, file_path, project_version_id, retries=None, backoff=5, chunk_size=CHUNK_SIZE):
+    """
+    Upload a scan to SSC as an artifact of project_version_id, streaming it from disk so that memory use doesn't grow
+    with its size. Failures to get a file token or to connect to SSC are retried with a new file token. Once the scan
+    has been sent it isn't sent again, whatever the outcome, as SSC may already have processed it and would end up with
+    the artifact twice.
+    :param api: FortifyApi, for its host, token and settings
+    :param retries: Attempts after the first, [fortify] transfer_retries by default
+    :param backoff: Seconds to wait before the first retry, doubled for each retry after it
+    :return: FortifyResponse
+    """
+    file_name = ntpath.basename(file_path)
+    retries = transfer_retries() if retries is None else retries
+    response = None
+    for attempt in range(retries + 1):
+        if attempt:
+            wait = retry_wait(attempt, backoff)
+            Logger.app.warning("Upload of {0} failed: {1}. Trying again in {2} seconds".format(file_name,
+                                                                                           response.message, wait))
+            time.sleep(wait)
+
+        upload = api.get_file_token('UPLOAD')
+        if not upload.success or not isinstance(upload.data, dict) or not upload.data.get('data'):
+            response = FortifyResponse(message='Failed to get the SSC upload file token. {}'.format(upload.message),
+                                       response_code=upload.response_code, success=False)
+            if upload.response_code in TRANSIENT_STATUS_CODES or upload.response_code == -1:
+                continue
+            return response
+
+        body = MultipartFileStream(file_path, chunk_size=chunk_size,
+                                   progress=TransferProgress("Uploading {}".format(file_name),
+                                                             os.path.getsize(file_path)))
+        try:
+            result = requests.post(api.host + '/upload/resultFileUpload.html',
+                                   params={'mat': upload.data['data']['token'],
+                                           'entityId': project_version_id,
+                                           'clientVersion': api.client_version,
+                                           'Upload': 'Submit Query',
+                                           'Filename': file_name},
+                                   data=body,
+                                   headers={'Accept': 'application/xml, text/xml, */*; q=0.01',
+                                            'Content-Type': body.content_type,
+                                            'User-Agent': api.user_agent},
+                                   auth=FortifyTokenAuth(api.token), verify=api.verify_ssl, timeout=api.timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            response = FortifyResponse(message='A connection error occurred. {0}'.format(e), success=False)
+            if connect_failed(e):
+                continue
+            return response
+        except requests.exceptions.RequestException as e:
+            return FortifyResponse(message='There was an error while handling the request. {0}'.format(e),
+                                   success=False)
+        finally:
+            body.close()
+
+        if result.status_code // 100 == 2:
+            return FortifyResponse(success=True, response_code=result.status_code, data=result.content,
+                                   headers=result.headers)
+        return FortifyResponse(message='{0} {1}'.format(result.status_code, result.reason),
+                               response_code=result.status_code, success=False)
+    return response
+
+
+def response_digest(headers):
+    """
+    :return: (hashlib algorithm, base64 digest) of the body from the Digest or Content-MD5 header, or None
+    """
+    for part in (headers.get('Digest') or '').split(','):
+        algorithm, _, value = part.strip().partition('=')
+        if algorithm.lower() in ('sha-256', 'md5') and value:
+            return algorithm.lower().replace('-', ''), value
+    if headers.get('Content-MD5'):
+        return 'md5', headers['Content-MD5']
+    return None
+
+
+def attachment_name(headers, default):
+    match = re.search(r'filename="?([^";]+)"?', headers.get('Content-Disposition') or '')
+    return ntpath.basename(match.group(1)) if match else default
+
+
+def verify_artifact(file_path):
+    """
+    :return: None if the CRC-32 of every file in the FPR, which is a zip archive, matches, otherwise why not
+    """
+    try:
+        with zipfile.ZipFile(file_path) as fpr:
+            bad_file = fpr.testzip()
+    except (zipfile.BadZipfile, IOError, OSError) as e:
+        return 'not a valid FPR: {}'.format(e)
+    return 'checksum mismatch in {}'.format(bad_file) if bad_file else None
+
+
+class TransferError(Exception):
+    """
+    A download that didn't complete, and is worth trying again
+    """
+    pass
+
+
+def fetch_artifact(api, file_token, version_id, part_path, chunk_size):
+    """
+    Stream the artifact to part_path, resuming a part_path left by an earlier attempt with If-Range
+    :return: The file name SSC gave the artifact
+    """
+    validator_path = part_path + '.validator'
+    # The length has to match what was asked for, so that a resumed download lines up with the part already saved
+    headers = {'Accept': 'application/octet-stream, */*', 'Accept-Encoding': 'identity', 'User-Agent': api.user_agent}
+    offset = 0
+    validator = read_validator(validator_path) if os.path.exists(part_path) else None
+    if validator:
+        offset = os.path.getsize(part_path)
+        headers['Range'] = 'bytes={}-'.format(offset)
+        headers['If-Range'] = validator
+
+    result = requests.get(api.host + '/download/currentStateFprDownload.html',
+                          params={'mat': file_token, 'id': version_id, 'clientVersion': api.client_version,
+                                  'includeSource': 'true'},
+                          headers=headers, auth=FortifyTokenAuth(api.token), verify=api.verify_ssl,
+                          timeout=api.timeout, stream=True)
+    try:
+        if result.status_code == 416 and offset:
+            # The part saved doesn't line up with the artifact anymore
+            remove_files(part_path, validator_path)
+            raise TransferError('416 {}'.format(result.reason))
+        if result.status_code // 100 != 2:
+            return FortifyResponse(message='{0} {1}'.format(result.status_code, result.reason),
+                                   response_code=result.status_code, success=False), None
+
+        resume = offset and result.status_code == 206
+        if not resume:
+            offset = 0
+            # Only a download that can be told apart from a newer artifact is worth resuming
+            write_validator(validator_path, result.headers.get('ETag') or result.headers.get('Last-Modified'))
+        total = result.headers.get('Content-Range', '').rpartition('/')[2]
+        total = int(total) if total.isdigit() else \
+            offset + int(result.headers['Content-Length']) if result.headers.get('Content-Length') else None
+        digest = response_digest(result.headers) if not resume else None
+        hasher = hashlib.new(digest[0]) if digest else None
+        file_name = attachment_name(result.headers, '{}.fpr'.format(version_id))
+        progress = TransferProgress("Downloading {}".format(file_name), total)
+        done = offset
+        with open(part_path, 'ab' if resume else 'wb') as f:
+            for chunk in result.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    if hasher:
+                        hasher.update(chunk)
+                    done += len(chunk)
+                    progress.update(done)
+    finally:
+        result.close()
+
+    if total is not None and done != total:
+        raise TransferError('received {0} of {1} bytes'.format(done, total))
+    if hasher and base64.b64encode(hasher.digest()).decode('ascii') != digest[1]:
+        remove_files(part_path, validator_path)
+        raise TransferError('{} digest mismatch'.format(digest[0]))
+    if file_name.lower().endswith('.fpr'):
+        problem = verify_artifact(part_path)
+        if problem:
+            remove_files(part_path, validator_path)
+            raise TransferError(problem)
+    return FortifyResponse(success=True, response_code=result.status_code, headers=result.headers), file_name
+
+
+def download_artifact(api, version_id, directory='', retries=None, backoff=5, chunk_size=CHUNK_SIZE):
+    """
+    Download the current FPR of a project version, streaming it to a .part file which is only moved into place once
+    it is complete and its checksums match. An interrupted download is resumed with a Range request where SSC allows
+    it, and restarted otherwise.
+    :param api: FortifyApi, for its host, token and settings
+    :param directory: Where to save the FPR, under the file name SSC gives it, the working directory by default
+    :param retries: Attempts after the first, [fortify] transfer_retries by default
+    :param backoff: Seconds to wait before the first retry, doubled for each retry after it
+    :return: (FortifyResponse, path to the FPR or None)
+    """
+    part_path = os.path.join(directory, 'fortify-version-{}.fpr.part'.format(version_id))
+    retries = transfer_retries() if retries is None else retries
+    response = None
+    for attempt in range(retries + 1):
+        if attempt:
+            wait = retry_wait(attempt, backoff)
+            Logger.app.warning("Download of version {0} failed: {1}. Trying again in {2} seconds".format(
+                version_id, response.message, wait))
+            time.sleep(wait)
+
+        download = api.get_file_token('DOWNLOAD')
+        if not download.success or not isinstance(download.data, dict) or not download.data.get('data'):
+            response = FortifyResponse(message='Failed to get the SSC download file token. {}'.format(
+                download.message), response_code=download.response_code, success=False)
+            if download.response_code in TRANSIENT_STATUS_CODES or download.response_code == -1:
+                continue
+            return response, None
+
+        try:
+            response, file_name = fetch_artifact(api, download.data['data']['token'], version_id, part_path,
+                                                     chunk_size)
+        except (TransferError, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            response = FortifyResponse(message='The download was interrupted. {0}'.format(e), success=False)
+            continue
+        except requests.exceptions.RequestException as e:
+            return FortifyResponse(message='There was an error while handling the request. {0}'.format(e),
+                                   success=False), None
+        except (IOError, OSError) as e:
+            return FortifyResponse(message='Unable to save version {0}: {1}'.format(version_id, e),
+                                   success=False), None
+
+        if response.success:
+            file_path = os.path.join(directory, file_name)
+            replace_file(part_path, file_path)
+            remove_files(part_path + '.validator')
+            return response, file_path
+        if response.response_code not in TRANSIENT_STATUS_CODES:
+            return response, None
+    return response, None
@@ -8,6 +8,7 @@ import requests
 import urllib3
 import requests.exceptions
 import requests.packages.urllib3
+from webbreaker.webbreakermetrics import instrumented_request
 
 
 class GitApi(object):
@@ -38,6 +39,7 @@ class GitApi(object):
         return self._request('GET', "/repos/{}/{}/contributors".format(owner, repo))
 
 
+    @instrumented_request('git')
     def _request(self, method, url):
         try:
             logger('Performing method {}'.format(method))
@@ -1,19 +1,93 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import atexit
 import json
+import ntpath
+import os
+import threading
 import requests
 import urllib3
 import requests.exceptions
 import requests.packages.urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from . import __version__ as version
+from webbreaker.transferutil import CHUNK_SIZE, MultipartFileStream, TransferProgress
+from webbreaker.webbreakermetrics import instrumented_request
+
+try:
+    from urlparse import urlparse
+except ImportError:  # Python3
+    from urllib.parse import urlparse
+
+# Max keep-alive connections held open to a single ThreadFix server
+POOL_MAXSIZE = 10
+# Times a request is tried again after a connection error, or a GET after one of RETRY_STATUS_CODES
+RETRIES = 3
+# Seconds to wait before retrying, doubled for each retry in a row
+RETRY_BACKOFF = 0.5
+# 429 is left to ThreadFixClient, which holds back every request to the server rather than just the one turned down
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _retry():
+    kwargs = dict(total=RETRIES, backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUS_CODES,
+                  raise_on_status=False)
+    # Uploads aren't retried after they have been sent, ThreadFix may have imported the scan
+    methods = frozenset(['GET', 'HEAD', 'OPTIONS'])
+    try:
+        return Retry(allowed_methods=methods, **kwargs)
+    except TypeError:  # urllib3 < 1.26
+        return Retry(method_whitelist=methods, **kwargs)
+
+
+def get_session(host, verify_ssl=True, pool_size=None):
+    """
+    Return the requests.Session shared by every ThreadFix API call to host in this process, so that connections are
+    kept alive between calls and only the first call to a server pays for the TCP and TLS handshake.
+    :param host: ThreadFix server URL, any path is ignored
+    :param verify_ssl: Verify the server's certificate
+    :param pool_size: Max keep-alive connections to the server, POOL_MAXSIZE by default
+    :return: requests.Session
+    """
+    parsed = urlparse(host)
+    pool_size = pool_size if pool_size else POOL_MAXSIZE
+    key = (parsed.scheme, parsed.netloc, verify_ssl, pool_size)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=_retry())
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.verify = verify_ssl
+            _sessions[key] = session
+        return session
+
+
+def close_sessions():
+    """
+    Close the connections held open by every shared session.
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+atexit.register(close_sessions)
 
 
 class ThreadFixAPI(object):
     """An API wrapper to facilitate interactions to and from ThreadFix."""
 
-    def __init__(self, host, api_key, verify_ssl=True, timeout=30, user_agent=None, cert=None, debug=False):
+    def __init__(self, host, api_key, verify_ssl=True, timeout=30, user_agent=None, cert=None, debug=False,
+                 pool_size=None):
         """
         Initialize a ThreadFix API instance.
         :param host: The URL for the ThreadFix server. (e.g., http://localhost:8080/threadfix/)
@@ -24,6 +98,7 @@ class ThreadFixAPI(object):
         :param cert: You can also specify a local cert to use as client side certificate, as a single file (containing
         the private key and the certificate) or as a tuple of both file’s path
         :param debug: Prints requests and responses, useful for debugging.
+        :param pool_size: Max keep-alive connections to the server, shared with every other ThreadFixAPI of the host.
         """
 
         self.host = host
@@ -38,6 +113,7 @@ class ThreadFixAPI(object):
 
         self.cert = cert
         self.debug = debug  # Prints request and response information.
+        self.session = get_session(host, verify_ssl, pool_size)
 
         if not self.verify_ssl:
             urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning) # Disabling SSL warning messages if verification is disabled.
@@ -99,16 +175,24 @@ class ThreadFixAPI(object):
 
     # Scans
 
-    def upload_scan(self, application_id, file_path):
+    def upload_scan(self, application_id, file_path, chunk_size=CHUNK_SIZE):
         """
-        Uploads and processes a scan file.
+        Uploads and processes a scan file. The file is streamed from disk chunk_size bytes at a time, so memory use
+        doesn't grow with its size, and closed once the upload is over.
         :param application_id: Application identifier.
         :param file_path: Path to the scan file to be uploaded.
+        :param chunk_size: Bytes read from the file at a time.
         """
-        return self._request(
-            'POST', 'rest/latest/applications/' + str(application_id) + '/upload',
-            files={'file': open(file_path, 'rb')}
-        )
+        progress = TransferProgress('Uploading ' + ntpath.basename(file_path), os.path.getsize(file_path))
+        body = MultipartFileStream(file_path, chunk_size=chunk_size, progress=progress)
+        try:
+            response = self._request('POST', 'rest/latest/applications/' + str(application_id) + '/upload',
+                                     data=body, headers={'Content-Type': body.content_type})
+        finally:
+            body.close()
+        if response.success:
+            progress.finish()
+        return response
 
     def list_scans(self, application_id):
         """
@@ -130,25 +214,39 @@ class ThreadFixAPI(object):
 
     # Utility
 
-
-    def _request(self, method, url, params=None, files=None):
+    def pool_stats(self):
+        """
+        :return: Dict of the connection pool size and the connections opened and requests sent over it so far, across
+        every ThreadFixAPI sharing the session
+        """
+        adapter = self.session.get_adapter(self.host)
+        pools = [adapter.poolmanager.pools[key] for key in adapter.poolmanager.pools.keys()]
+        return {'pool_size': adapter._pool_maxsize,
+                'connections': sum(pool.num_connections for pool in pools),
+                'requests': sum(pool.num_requests for pool in pools)}
+
+    @instrumented_request('threadfix')
+    def _request(self, method, url, params=None, files=None, data=None, headers=None):
         """Common handler for all HTTP requests."""
         if not params:
             params = {}
         params['apiKey'] = self.api_key
 
-        headers = {
+        request_headers = {
             'User-Agent': self.user_agent,
             'Accept': 'application/json'
         }
+        if headers:
+            request_headers.update(headers)
 
         try:
             if self.debug:
                 print(method + ' ' + url)
                 print(params)
 
-            response = requests.request(method=method, url=self.host + url, params=params, files=files, headers=headers,
-                                        timeout=self.timeout, verify=self.verify_ssl, cert=self.cert)
+            response = self.session.request(method=method, url=self.host + url, params=params, files=files, data=data,
+                                            headers=request_headers, timeout=self.timeout, verify=self.verify_ssl,
+                                            cert=self.cert)
 
             if self.debug:
                 print(response.status_code)
@@ -163,8 +261,10 @@ class ThreadFixAPI(object):
                 data = json_response['object']
 
                 return ThreadFixResponse(message=message, success=success, response_code=response_code, data=data)
-            except ValueError:
-                return ThreadFixResponse(message='JSON response could not be decoded.', success=False)
+            except (ValueError, KeyError):
+                # e.g. 429 Too Many Requests from a proxy in front of ThreadFix
+                return ThreadFixResponse(message='JSON response could not be decoded.', success=False,
+                                         response_code=response.status_code)
         except requests.exceptions.SSLError:
             return ThreadFixResponse(message='An SSL error occurred.', success=False)
         except requests.exceptions.ConnectionError:
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+from webbreaker.webinspectlease import default_lease_db
+
+
+class ThreadFixScanCache(object):
+    """
+    Filenames of the ThreadFix scans already looked up. A scan never changes once uploaded, so entries are kept for
+    good and listing the scans of an application again only needs the details of the scans uploaded since.
+    """
+
+    def __init__(self, db_path=None, timeout=30):
+        """
+        :param db_path: SQLite database holding the cache
+        """
+        self.db_path = db_path if db_path else default_lease_db()
+        self.timeout = timeout
+        connection = self.__connect__()
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS threadfix_scans ("
+                               "host TEXT NOT NULL, "
+                               "scan_id INTEGER NOT NULL, "
+                               "filename TEXT NOT NULL, "
+                               "PRIMARY KEY (host, scan_id))")
+        finally:
+            connection.close()
+
+    def __connect__(self):
+        return sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+
+    @staticmethod
+    def __server__(host):
+        return host.rstrip('/')
+
+    def filenames(self, host, scan_ids):
+        """
+        :return: {scan id: filename} of the scans in scan_ids that are cached
+        """
+        found = {}
+        scan_ids = list(scan_ids)
+        connection = self.__connect__()
+        try:
+            # Stay under the SQLite limit of 999 parameters
+            for start in range(0, len(scan_ids), 500):
+                batch = scan_ids[start:start + 500]
+                found.update(connection.execute("SELECT scan_id, filename FROM threadfix_scans WHERE host = ? "
+                                                "AND scan_id IN ({})".format(', '.join('?' * len(batch))),
+                                                [self.__server__(host)] + batch).fetchall())
+        finally:
+            connection.close()
+        return found
+
+    def store(self, host, filenames):
+        """
+        :param filenames: {scan id: filename} of scans looked up in ThreadFix
+        """
+        connection = self.__connect__()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany("INSERT OR REPLACE INTO threadfix_scans (host, scan_id, filename) VALUES (?, ?, ?)",
+                                   [(self.__server__(host), scan_id, filename)
+                                    for scan_id, filename in filenames.items()])
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
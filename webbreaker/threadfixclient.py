@@ -1,17 +1,66 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from webbreaker.confighelper import Config
 from webbreaker.webbreakerlogger import Logger
 from webbreaker.threadfixapi.threadfix import ThreadFixAPI
+from webbreaker.threadfixcache import ThreadFixScanCache
+from webbreaker.threadfixindex import ThreadFixIndex
+
+# Times a request turned down with 429 Too Many Requests is tried again
+RATE_LIMIT_RETRIES = 5
+# Seconds to hold off after a 429, doubled for each 429 in a row
+RATE_LIMIT_BACKOFF = 1
+# Lookups that find nothing refresh the index at most this many times per [threadfix] index_ttl
+MISS_REFRESHES_PER_TTL = 10
 
 
 class ThreadFixClient(object):
-    def __init__(self, host, api_key):
+    def __init__(self, host, api_key, pool_size=None, scan_cache=None, index=None):
+        """
+        :param pool_size: Max requests made at once when fanning out, [threadfix] pool_size by default
+        :param scan_cache: ThreadFixScanCache to keep scan filenames in, or False to look them up every time
+        :param index: ThreadFixIndex to find applications in, or False to list them from ThreadFix every time
+        """
         self.host = host
         self.api_key = api_key
+        self.scan_cache = scan_cache
+        self.index = index
+        self.pool_size = int(pool_size if pool_size is not None else Config().conf_get('threadfix', 'pool_size', '8'))
+        self.throttle_lock = threading.Lock()
+        self.throttled_until = 0
+
+    def pool_stats(self):
+        """
+        :return: Size of the connection pool to ThreadFix and the connections opened and requests sent over it so far
+        """
+        return ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False,
+                            pool_size=self.pool_size).pool_stats()
+
+    def __throttled__(self, request, *args):
+        """
+        Make a request, holding off while ThreadFix is rate limiting this client. A 429 holds back every worker of
+        the client rather than just the one that got it, so that a fan-out slows down as a whole.
+        """
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            with self.throttle_lock:
+                wait = self.throttled_until - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            response = request(*args)
+            if response.response_code != 429:
+                break
+            with self.throttle_lock:
+                self.throttled_until = max(self.throttled_until, time.time() + RATE_LIMIT_BACKOFF * 2 ** attempt)
+            Logger.app.debug("ThreadFix is rate limiting requests, holding off for {} seconds".format(
+                RATE_LIMIT_BACKOFF * 2 ** attempt))
+        return response
 
     def upload_scan(self, app_id, file_name):
-        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False)
+        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False, pool_size=self.pool_size)
         response = api.upload_scan(app_id, file_name)
         if response.success:
             return response.data
@@ -20,8 +69,8 @@ class ThreadFixClient(object):
             return False
 
     def list_teams(self):
-        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False)
-        response = api.list_teams()
+        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False, pool_size=self.pool_size)
+        response = self.__throttled__(api.list_teams)
         if response.success:
             return response.data
         else:
@@ -36,8 +85,8 @@ class ThreadFixClient(object):
         return None
 
     def list_apps_by_team(self, team_id):
-        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False)
-        response = api.get_applications_by_team(team_id)
+        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False, pool_size=self.pool_size)
+        response = self.__throttled__(api.get_applications_by_team, team_id)
         if response.success:
             return response.data
         else:
@@ -56,8 +105,14 @@ class ThreadFixClient(object):
                     team_ids.append({'id': team['id'], 'name': team['name']})
             if not len(team_ids):
                 Logger.app.info("No teams containing {} were found".format(team_name))
-            for team in team_ids:
-                app_response = self.list_apps_by_team(team['id'])
+            # One request per team, so look them up concurrently. map keeps the teams in order.
+            pool = ThreadPool(processes=max(1, min(len(team_ids), self.pool_size)))
+            try:
+                team_apps = pool.map(lambda team: self.list_apps_by_team(team['id']), team_ids)
+            finally:
+                pool.close()
+                pool.join()
+            for team, app_response in zip(team_ids, team_apps):
                 if app_response:
                     for app in app_response:
                         if app_name is not None and app_name.lower() in app['name'].lower():
@@ -78,27 +133,123 @@ class ThreadFixClient(object):
         else:
             return False
 
-    def list_scans_by_app(self, app_id):
-        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False)
+    def __index__(self):
+        """
+        :return: The ThreadFixIndex, or None if it can't be used
+        """
+        if self.index is None:
+            try:
+                self.index = ThreadFixIndex()
+            except Exception as e:
+                Logger.app.error("Unable to use the ThreadFix index: {}".format(e))
+                self.index = False
+        return self.index or None
+
+    def refresh_index(self, force=False):
+        """
+        List every application in ThreadFix into the index, if it hasn't been refreshed within [threadfix] index_ttl
+        seconds or force
+        :return: False if the applications couldn't be listed, otherwise True
+        """
+        index = self.__index__()
+        if not index or not force and not index.is_stale(self.host):
+            return True
+        applications = self.list_all_apps()
+        if applications is False:
+            return False
+        index.replace(self.host, applications)
+        return True
+
+    def find_apps(self, team_name=None, app_name=None, exact=False):
+        """
+        Like list_all_apps, but looked up in the index while it is current
+        :param exact: Only applications named app_name, rather than containing it
+        :return: The matching applications, or False if ThreadFix couldn't be listed
+        """
+        index = self.__index__()
+        if not index:
+            applications = self.list_all_apps(team_name, None if exact else app_name)
+            if applications and exact:
+                applications = [app for app in applications if app['app_name'] == app_name]
+            return applications
+        was_stale = index.is_stale(self.host)
+        if not self.refresh_index():
+            return False
+        applications = index.find(self.host, team_name, app_name, exact)
+        # The application may have been created since the last refresh, which lists every team, so a run of lookups
+        # for names that don't exist doesn't get to refresh each time
+        if not applications and not was_stale and \
+                index.age(self.host) >= index.ttl / MISS_REFRESHES_PER_TTL:
+            if not self.refresh_index(force=True):
+                return False
+            applications = index.find(self.host, team_name, app_name, exact)
+        return applications
+
+    def __scan_cache__(self):
+        """
+        :return: The ThreadFixScanCache, or None if it can't be used
+        """
+        if self.scan_cache is None:
+            try:
+                self.scan_cache = ThreadFixScanCache()
+            except Exception as e:
+                Logger.app.error("Unable to use the ThreadFix scan cache: {}".format(e))
+                self.scan_cache = False
+        return self.scan_cache or None
+
+    def __scan_filename__(self, api, scan_id):
+        response = self.__throttled__(api.get_scan_details, scan_id)
+        if response.success:
+            if len(response.data['originalFileNames']):
+                return response.data['originalFileNames'][-1]
+            return 'None'
+        return None
+
+    def list_scans_by_app(self, app_id, filenames=True):
+        """
+        :param filenames: Add the filename each scan was uploaded from, which takes a request per scan not looked up
+        before
+        """
+        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False, pool_size=self.pool_size)
         response = api.list_scans(app_id)
         if response.success:
             master_data = response.data
-            for scan in master_data:
-                response = api.get_scan_details(scan['id'])
-                if response.success:
-                    if len(response.data['originalFileNames']):
-                        scan['filename'] = response.data['originalFileNames'][-1]
-                    else:
-                        scan['filename'] = 'None'
-                else:
-                    scan['filename'] = 'Error'
+            if filenames:
+                self.__add_filenames__(api, master_data)
             return master_data
         else:
             Logger.app.error(response.message)
             return False
 
+    def __add_filenames__(self, api, scans):
+        cache = self.__scan_cache__()
+        known = {}
+        if cache:
+            try:
+                known = cache.filenames(self.host, [scan['id'] for scan in scans])
+            except Exception as e:
+                Logger.app.debug("Unable to read the ThreadFix scan cache: {}".format(e))
+        missing = [scan['id'] for scan in scans if scan['id'] not in known]
+        if missing:
+            pool = ThreadPool(processes=max(1, min(len(missing), self.pool_size)))
+            try:
+                found = dict((scan_id, filename) for scan_id, filename in
+                             zip(missing, pool.map(lambda scan_id: self.__scan_filename__(api, scan_id), missing))
+                             if filename is not None)
+            finally:
+                pool.close()
+                pool.join()
+            if cache and found:
+                try:
+                    cache.store(self.host, found)
+                except Exception as e:
+                    Logger.app.debug("Unable to update the ThreadFix scan cache: {}".format(e))
+            known.update(found)
+        for scan in scans:
+            scan['filename'] = known.get(scan['id'], 'Error')
+
     def create_application(self, team_id, name, url):
-        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False)
+        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False, pool_size=self.pool_size)
         response = api.create_application(team_id, name, url)
         if response.success:
             return response.data
@@ -108,7 +259,7 @@ class ThreadFixClient(object):
 
     # TODO verify this works. Unable to test due to ThreadFix configurations
     def download_scan(self, scan_id):
-        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False)
+        api = ThreadFixAPI(host=self.host, api_key=self.api_key, verify_ssl=False, pool_size=self.pool_size)
         details_response = api.get_scan_details(scan_id)
         if details_response.success:
             if len(details_response.data['originalFileNames']):
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import time
+from webbreaker.confighelper import Config
+from webbreaker.webinspectlease import default_lease_db
+
+
+def normalize_name(name):
+    """
+    :return: name lowercased with its whitespace collapsed, what team and application names are matched on
+    """
+    return ' '.join(name.split()).lower()
+
+
+class ThreadFixIndex(object):
+    """
+    Local copy of the teams and applications in each ThreadFix, so that finding the id of an application by its name
+    doesn't take a request per team. The whole index is listed from ThreadFix again once it is older than ttl seconds.
+    """
+
+    def __init__(self, db_path=None, ttl=None, timeout=30):
+        """
+        :param db_path: SQLite database holding the index
+        :param ttl: Seconds the index is trusted for, see [threadfix] index_ttl
+        """
+        self.db_path = db_path if db_path else default_lease_db()
+        self.ttl = float(ttl if ttl is not None else Config().conf_get('threadfix', 'index_ttl', '3600'))
+        self.timeout = timeout
+        connection = self.__connect__()
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS threadfix_apps ("
+                               "host TEXT NOT NULL, "
+                               "position INTEGER NOT NULL, "
+                               "team_id INTEGER NOT NULL, "
+                               "team_name TEXT NOT NULL, "
+                               "team_key TEXT NOT NULL, "
+                               "app_id INTEGER NOT NULL, "
+                               "app_name TEXT NOT NULL, "
+                               "app_key TEXT NOT NULL, "
+                               "PRIMARY KEY (host, position))")
+            connection.execute("CREATE INDEX IF NOT EXISTS threadfix_apps_name ON threadfix_apps (host, app_key)")
+            connection.execute("CREATE TABLE IF NOT EXISTS threadfix_index_refreshes ("
+                               "host TEXT PRIMARY KEY, "
+                               "refreshed REAL NOT NULL)")
+        finally:
+            connection.close()
+
+    def __connect__(self):
+        return sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+
+    @staticmethod
+    def __server__(host):
+        return host.rstrip('/')
+
+    def age(self, host):
+        """
+        :return: Seconds since the index of host was refreshed, or None if it never was
+        """
+        connection = self.__connect__()
+        try:
+            row = connection.execute("SELECT refreshed FROM threadfix_index_refreshes WHERE host = ?",
+                                     (self.__server__(host),)).fetchone()
+        finally:
+            connection.close()
+        return time.time() - row[0] if row else None
+
+    def is_stale(self, host):
+        """
+        :return: True if the index of host hasn't been refreshed within ttl seconds
+        """
+        age = self.age(host)
+        return age is None or age >= self.ttl
+
+    def replace(self, host, applications):
+        """
+        Replace the index of host with a fresh listing
+        :param applications: Dicts of team_id, team_name, app_id and app_name, as listed by ThreadFixClient
+        """
+        server = self.__server__(host)
+        connection = self.__connect__()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM threadfix_apps WHERE host = ?", (server,))
+            connection.executemany("INSERT INTO threadfix_apps (host, position, team_id, team_name, team_key, app_id, "
+                                   "app_name, app_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [(server, position, app['team_id'], app['team_name'],
+                                     normalize_name(app['team_name']), app['app_id'], app['app_name'],
+                                     normalize_name(app['app_name'])) for position, app in enumerate(applications)])
+            connection.execute("INSERT OR REPLACE INTO threadfix_index_refreshes (host, refreshed) VALUES (?, ?)",
+                               (server, time.time()))
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def find(self, host, team_name=None, app_name=None, exact=False):
+        """
+        :param team_name: Only applications of teams with a name containing team_name
+        :param app_name: Only applications with a name containing app_name, or named app_name if exact
+        :return: Dicts of team_id, team_name, app_id and app_name, in the order ThreadFix listed them
+        """
+        query = "SELECT team_id, team_name, app_id, app_name FROM threadfix_apps WHERE host = ?"
+        params = [self.__server__(host)]
+        if team_name is not None:
+            query += " AND instr(team_key, ?) > 0"
+            params.append(normalize_name(team_name))
+        if app_name is not None and exact:
+            query += " AND app_key = ? AND app_name = ?"
+            params.extend([normalize_name(app_name), app_name])
+        elif app_name is not None:
+            query += " AND instr(app_key, ?) > 0"
+            params.append(normalize_name(app_name))
+        connection = self.__connect__()
+        try:
+            rows = connection.execute(query + " ORDER BY position", params).fetchall()
+        finally:
+            connection.close()
+        return [dict(zip(('team_id', 'team_name', 'app_id', 'app_name'), row)) for row in rows]
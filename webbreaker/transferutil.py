@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import ntpath
+import os
+import time
+import uuid
+from webbreaker.webbreakerlogger import Logger
+
+# Bytes read from disk at a time while sending, or written to disk at a time while receiving
+CHUNK_SIZE = 1024 * 1024
+
+
+def replace_file(source, destination):
+    try:
+        os.replace(source, destination)
+    except AttributeError:  # Python2
+        if os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+def remove_files(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def read_validator(validator_path):
+    try:
+        with open(validator_path) as f:
+            return f.read().strip() or None
+    except (IOError, OSError):
+        return None
+
+
+def write_validator(validator_path, validator):
+    if validator:
+        with open(validator_path, 'w') as f:
+            f.write(validator)
+    else:
+        remove_files(validator_path)
+
+
+class TransferProgress(object):
+    """
+    Logs how far a transfer has got and how fast it is going, each time it passes another step percent of its size
+    """
+
+    def __init__(self, description, total, step=10):
+        self.description = description
+        self.total = total
+        self.step = step
+        self.logged = 0
+        self.done = 0
+        self.started = time.time()
+
+    def __rate__(self):
+        elapsed = time.time() - self.started
+        return self.done / 1048576.0 / elapsed if elapsed > 0 else 0.0
+
+    def update(self, done):
+        self.done = done
+        if not self.total:
+            return
+        percent = min(100, done * 100 // self.total)
+        if percent >= self.logged + self.step:
+            self.logged = percent - percent % self.step
+            Logger.console.info("{0}: {1}% ({2:.1f} of {3:.1f} MB, {4:.1f} MB/s)".format(
+                self.description, self.logged, done / 1048576.0, self.total / 1048576.0, self.__rate__()))
+
+    def finish(self):
+        Logger.console.info("{0}: {1:.1f} MB in {2:.1f} seconds ({3:.1f} MB/s)".format(
+            self.description, self.done / 1048576.0, time.time() - self.started, self.__rate__()))
+
+
+class MultipartFileStream(object):
+    """
+    A multipart/form-data body of a single file, read from disk as it is sent rather than built in memory. Its length
+    is known up front, so it is sent with a Content-Length like the body requests builds for files=.
+    """
+
+    def __init__(self, file_path, field='file', chunk_size=CHUNK_SIZE, progress=None):
+        self.boundary = uuid.uuid4().hex
+        head = ('--{0}\r\nContent-Disposition: form-data; name="{1}"; filename="{2}"\r\n'
+                'Content-Type: application/octet-stream\r\n\r\n').format(self.boundary, field,
+                                                                        ntpath.basename(file_path)).encode('utf-8')
+        tail = '\r\n--{0}--\r\n'.format(self.boundary).encode('utf-8')
+        self.length = len(head) + os.path.getsize(file_path) + len(tail)
+        self.parts = [io.BytesIO(head), open(file_path, 'rb'), io.BytesIO(tail)]
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.sent = 0
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary={}'.format(self.boundary)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        """
+        :return: Up to size bytes of the body, and never more than chunk_size
+        """
+        size = self.chunk_size if size is None or size < 0 else min(size, self.chunk_size)
+        data = b''
+        while self.parts and len(data) < size:
+            chunk = self.parts[0].read(size - len(data))
+            if not chunk:
+                self.parts.pop(0).close()
+                continue
+            data += chunk
+        self.sent += len(data)
+        if self.progress:
+            self.progress.update(self.sent)
+        return data
+
+    def close(self):
+        while self.parts:
+            self.parts.pop(0).close()
@@ -1,9 +1,35 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import importlib
 import os
 
 
+class LazyImport(object):
+    """
+    Stands in for module_name.attribute until it's first called or looked into, so that a command only pays for
+    importing the clients it uses.
+    """
+
+    def __init__(self, module_name, attribute):
+        self.module_name = module_name
+        self.attribute = attribute
+        self.target = None
+
+    def __resolve__(self):
+        if self.target is None:
+            self.target = getattr(importlib.import_module(self.module_name), self.attribute)
+        return self.target
+
+    def __call__(self, *args, **kwargs):
+        return self.__resolve__()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name in ('module_name', 'attribute', 'target'):
+            raise AttributeError(name)
+        return getattr(self.__resolve__(), name)
+
+
 class WebBreakerHelper(object):
     @classmethod
     def check_run_env(cls):
@@ -61,6 +87,21 @@ class WebBreakerHelper(object):
         https unless http is specified. 
         """
 
+    @classmethod
+    def webinspect_batch_desc(cls):
+        return """
+        Launch every WebInspect scan listed in a JSON manifest across the WebInspect servers, and follow them all
+        from this one process. Each scan takes the options of webinspect scan, results are downloaded locally in
+        both XML and FPR formats as each scan completes.
+        """
+
+    @classmethod
+    def webinspect_queue_desc(cls):
+        return """
+        List WebInspect scans on this host waiting in queue for a WebInspect server, see the --max_wait option of
+        webinspect scan.
+        """
+
     @classmethod
     def webinspect_servers_desc(cls):
         return """
@@ -93,7 +134,8 @@ class WebBreakerHelper(object):
     @classmethod
     def fortify_list_desc(cls):
         return """
-        Interactive Listing of all Fortify SSC Project/Application Versions. 
+        Interactive Listing of all Fortify SSC Project/Application Versions. The versions are listed from a local index,
+        refreshed from SSC once it is older than index_ttl in the [fortify] section of config.ini, or with --refresh.
         
         WARNING :: Do not specify fortify username and & password using options unless you are willing to have 
         your credentials in your terminal history. An interactive prompt is recommended to store command line credentials! 
@@ -173,12 +215,15 @@ class WebBreakerHelper(object):
     @classmethod
     def threadfix_list_desc(cls):
         return """
-        List all applications across all teams. Use OPTIONS to specify either teams or applications to list.
+        List all applications across all teams. Use OPTIONS to specify either teams or applications to list. The
+        applications are listed from a local index, refreshed from ThreadFix once it is older than index_ttl in the
+        [threadfix] section of config.ini, or with --refresh.
         """
     @classmethod
     def threadfix_scan_desc(cls):
         return """
-        List all application scans per ID, Scanner, and Filename in ThreadFix
+        List all application scans per ID, Scanner, and Filename in ThreadFix. Filenames take a request per scan
+        the first time it is listed, use --no_filenames to list the scans with a single request
         """
     @classmethod
     def threadfix_team_desc(cls):
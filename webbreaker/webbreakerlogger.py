@@ -1,19 +1,43 @@
 #!/usr/bin/env python
 # -*-coding:utf-8-*-
 
+import atexit
 import logging.config
 import logging
+import logging.handlers
 import datetime
 import sys
 import os
+import threading
 from webbreaker.confighelper import Config
 
-LOG_PATH = Config().log
+try:
+    import Queue as queue
+except ImportError:  # Python3
+    import queue
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:  # Python2, log files are written synchronously
+    QueueHandler = None
+    QueueListener = None
+
 FORMATTER = logging.Formatter('%(message)s')
 DATETIME_SUFFIX = datetime.datetime.now().strftime("%m-%d-%Y")
-APP_LOG = os.path.abspath(os.path.join(LOG_PATH, 'webbreaker-' + DATETIME_SUFFIX + '.log'))
-DEBUG_LOG = os.path.abspath(os.path.join(LOG_PATH, 'webbreaker-debug-' + DATETIME_SUFFIX + '.log'))
-STOUT_LOG = os.path.abspath(os.path.join(LOG_PATH, 'webbreaker-out' + DATETIME_SUFFIX + '.log'))
+
+# Background writers for the log files, see queued
+_listeners = []
+
+
+def log_file(prefix):
+    return os.path.abspath(os.path.join(Config().log, prefix + DATETIME_SUFFIX + '.log'))
+
+
+def log_settings():
+    config = Config()
+    return {'queue_size': int(config.conf_get('logging', 'queue_size', '10000')),
+            'max_bytes': int(config.conf_get('logging', 'max_bytes', '0')),
+            'backup_count': int(config.conf_get('logging', 'backup_count', '5'))}
 
 
 def singleton(cls):
@@ -27,6 +51,70 @@ def singleton(cls):
     return get_instance()
 
 
+if QueueHandler:
+    class NonBlockingQueueHandler(QueueHandler):
+        """
+        Hands records to a background writer. When the writer has fallen behind and the queue is full, records are
+        dropped and counted rather than holding up the caller.
+        """
+
+        def __init__(self, records):
+            QueueHandler.__init__(self, records)
+            self.dropped = 0
+
+        def enqueue(self, record):
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+
+
+def file_handler(path, settings):
+    if settings['max_bytes'] > 0:
+        return logging.handlers.RotatingFileHandler(path, mode='a', maxBytes=settings['max_bytes'],
+                                                    backupCount=settings['backup_count'])
+    return logging.FileHandler(path, mode='a')
+
+
+def queued(handler, settings):
+    """
+    :return: A handler that passes records on to handler from a background thread, or handler itself where the
+    standard library has no QueueHandler
+    """
+    if not QueueHandler:
+        return handler
+    records = queue.Queue(maxsize=max(0, settings['queue_size']))
+    queue_handler = NonBlockingQueueHandler(records)
+    queue_handler.setLevel(handler.level)
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append((listener, queue_handler))
+    return queue_handler
+
+
+def flush_logs():
+    """
+    Writes out every queued record and stops the background writers, called at exit and before WebBreaker is
+    terminated by a signal. Later records are written synchronously.
+    """
+    while _listeners:
+        listener, queue_handler = _listeners.pop()
+        listener.stop()
+        for logger in (logging.getLogger("__webbreaker__"), logging.getLogger("__webbreaker_debug__")):
+            if queue_handler in logger.handlers:
+                logger.removeHandler(queue_handler)
+                for handler in listener.handlers:
+                    logger.addHandler(handler)
+        for handler in listener.handlers:
+            handler.flush()
+        if queue_handler.dropped:
+            sys.stderr.write(str("{0} log records were dropped while the log writer was behind\n".format(
+                queue_handler.dropped)))
+
+
+atexit.register(flush_logs)
+
+
 def get_console_logger():
     try:
         console_logger = logging.getLogger()
@@ -52,28 +140,28 @@ def get_console_logger():
     return console_logger
 
 
-def get_app_logger(name=None):
+def get_app_logger(name=None, settings=None):
     try:
-        logger_map = {"__webbreaker__": APP_LOG}
+        logger_map = {"__webbreaker__": log_file('webbreaker-')}
         app_logger = logging.getLogger("__webbreaker__")
-        app_logger.setLevel(logging.NOTSET)
+        # Nothing below INFO is written anywhere, so don't build debug records only to drop them
+        app_logger.setLevel(logging.INFO)
         # if there are two app_loggers use only one.
         if app_logger.handlers:
             app_logger.handlers.pop()
 
         formatter = logging.Formatter('%(asctime)s: %(name)s %(levelname)s(%(message)s')
-        fh = logging.FileHandler(logger_map[name], mode='a')
+        fh = file_handler(logger_map[name], settings)
         fh.setFormatter(formatter)
-        fh.setLevel(logging.DEBUG)
         fh.setLevel(logging.INFO)
-        app_logger.addHandler(fh)
+        app_logger.addHandler(queued(fh, settings))
     except TypeError as e:
         sys.stdout.write(str("App logger error: {}!\n".format(e)))
 
     return app_logger
 
 
-def get_debug_logger(name=None):
+def get_debug_logger(name=None, settings=None):
     try:
         debug_logger = logging.getLogger(name)
         debug_logger.setLevel(logging.NOTSET)
@@ -82,10 +170,10 @@ def get_debug_logger(name=None):
             debug_logger.handlers.pop()
 
         debug_formatter = logging.Formatter('%(asctime)s: %(name)s %(levelname)s(%(message)s')
-        fh = logging.FileHandler(DEBUG_LOG, mode='a')
+        fh = file_handler(log_file('webbreaker-debug-'), settings)
         fh.setFormatter(debug_formatter)
         fh.setLevel(logging.DEBUG)
-        debug_logger.addHandler(fh)
+        debug_logger.addHandler(queued(fh, settings))
     except TypeError as e:
         sys.stdout.write(str("Debug logger error: {}!\n".format(e)))
 
@@ -104,9 +192,42 @@ class LessThanFilter(logging.Filter):
 
 @singleton
 class Logger():
+    """
+    The loggers are set up on first use rather than at import, as that reads config.ini and opens the log files.
+    """
+
     def __init__(self):
-        self.app = get_app_logger("__webbreaker__")
-        self.debug = get_debug_logger("__webbreaker_debug__")
-        self.console = get_console_logger()
-        self.app_logfile = APP_LOG
-        self.app_debug = DEBUG_LOG
+        self.lock = threading.Lock()
+        self.loggers = None
+
+    def __setup__(self):
+        if self.loggers is None:
+            with self.lock:
+                if self.loggers is None:
+                    settings = log_settings()
+                    self.loggers = {'app': get_app_logger("__webbreaker__", settings),
+                                    'debug': get_debug_logger("__webbreaker_debug__", settings),
+                                    'console': get_console_logger(),
+                                    'app_logfile': log_file('webbreaker-'),
+                                    'app_debug': log_file('webbreaker-debug-')}
+        return self.loggers
+
+    @property
+    def app(self):
+        return self.__setup__()['app']
+
+    @property
+    def debug(self):
+        return self.__setup__()['debug']
+
+    @property
+    def console(self):
+        return self.__setup__()['console']
+
+    @property
+    def app_logfile(self):
+        return self.__setup__()['app_logfile']
+
+    @property
+    def app_debug(self):
+        return self.__setup__()['app_debug']
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from webbreaker.webbreakerlogger import Logger
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:  # Python3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Upper bounds of the histogram buckets in seconds, from a quick API call up to a long scan
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600, float('inf'))
+# Spans are written to the JSON-lines file in batches of this many
+JSONL_BATCH_SIZE = 100
+
+OUTCOME_OK = 'ok'
+OUTCOME_ERROR = 'error'
+OUTCOME_EXCEPTION = 'exception'
+
+# Path segments that identify one scan, project version, application etc. rather than the kind of call
+_ID_SEGMENT = re.compile(r'/(?:[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)(?=/|$)')
+
+
+def path_template(url):
+    """
+    :return: url without its query string and with ids replaced by {id}, so that it can be used as a label
+    """
+    return _ID_SEGMENT.sub('/{id}', url.split('?')[0])
+
+
+def outcome_of(response):
+    """
+    :return: OUTCOME_ERROR for API responses that weren't successful and for False, which the clients return when a
+    call fails, otherwise OUTCOME_OK
+    """
+    if response is False:
+        return OUTCOME_ERROR
+    return OUTCOME_OK if getattr(response, 'success', True) else OUTCOME_ERROR
+
+
+class Histogram(object):
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Span(object):
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.outcome = OUTCOME_OK
+        self.start = time.time()
+
+    def record(self, response):
+        """
+        Set the outcome from an API response
+        :return: response
+        """
+        self.outcome = outcome_of(response)
+        return response
+
+
+class Metrics(object):
+    """
+    In-process counters, histograms and spans. Finished spans are appended to a JSON-lines file, and the totals can
+    be scraped from a Prometheus text endpoint or written to a file in the Prometheus text format, e.g. for the node
+    exporter textfile collector or to push to a pushgateway. Outputs are set in the [metrics] section of config.ini.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.events = []
+        self.configured = False
+        self.jsonl_path = None
+        self.prometheus_file = None
+        self.server = None
+
+    def __configure__(self):
+        if self.configured:
+            return
+        with self.lock:
+            if self.configured:
+                return
+            self.configured = True
+        try:
+            from webbreaker.confighelper import Config
+            config = Config()
+            self.jsonl_path = config.conf_get('metrics', 'jsonl_path', '') or None
+            self.prometheus_file = config.conf_get('metrics', 'prometheus_file', '') or None
+            port = int(config.conf_get('metrics', 'prometheus_port', '0'))
+        except Exception as e:
+            Logger.app.error("Unable to read the metrics settings, metrics are kept in memory only: {}".format(e))
+            return
+        if port:
+            self.serve(port)
+
+    @staticmethod
+    def __key__(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        self.__configure__()
+        key = self.__key__(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        self.__configure__()
+        key = self.__key__(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Time the enclosed block as name_seconds, and count it as name_total, labelled with its outcome. The span is
+        also written to the JSON-lines file. Use span.record(response) to take the outcome from an API response.
+        """
+        span = Span(name, labels)
+        try:
+            yield span
+        except BaseException:
+            span.outcome = OUTCOME_EXCEPTION
+            raise
+        finally:
+            self.finish(span)
+
+    def finish(self, span):
+        elapsed = time.time() - span.start
+        self.observe(span.name + '_seconds', elapsed, **span.labels)
+        self.increment(span.name + '_total', outcome=span.outcome, **span.labels)
+        if self.jsonl_path:
+            event = {'name': span.name, 'start': round(span.start, 6), 'seconds': round(elapsed, 6),
+                     'outcome': span.outcome, 'labels': span.labels, 'pid': os.getpid()}
+            with self.lock:
+                self.events.append(event)
+                full = len(self.events) >= JSONL_BATCH_SIZE
+            if full:
+                self.flush()
+
+    def timed(self, name, **labels):
+        """
+        Decorator running the function in a span, labelled with the function name as operation
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name, operation=func.__name__.strip('_'), **labels) as span:
+                    return span.record(func(*args, **kwargs))
+
+            return wrapper
+
+        return decorator
+
+    def render(self):
+        """
+        :return: Every counter and histogram in the Prometheus text exposition format
+        """
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count)) for key, h in self.histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append('# TYPE webbreaker_{} counter'.format(name))
+                typed.add(name)
+            lines.append('webbreaker_{0}{1} {2}'.format(name, self.__labels__(labels), value))
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in typed:
+                lines.append('# TYPE webbreaker_{} histogram'.format(name))
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('webbreaker_{0}_bucket{1} {2}'.format(name, self.__labels__(labels + (('le', le),)),
+                                                                   cumulative))
+            lines.append('webbreaker_{0}_sum{1} {2}'.format(name, self.__labels__(labels), total))
+            lines.append('webbreaker_{0}_count{1} {2}'.format(name, self.__labels__(labels), count))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def __labels__(labels):
+        if not labels:
+            return ''
+        return '{' + ','.join('{0}="{1}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                              for key, value in labels) + '}'
+
+    def flush(self):
+        """
+        Append pending spans to the JSON-lines file and rewrite the Prometheus text file
+        """
+        with self.lock:
+            events, self.events = self.events, []
+        try:
+            if self.jsonl_path and events:
+                with open(self.jsonl_path, 'a') as f:
+                    for event in events:
+                        f.write(json.dumps(event, sort_keys=True) + '\n')
+            if self.prometheus_file:
+                part_path = self.prometheus_file + '.part'
+                with open(part_path, 'w') as f:
+                    f.write(self.render())
+                os.rename(part_path, self.prometheus_file)
+        except (IOError, OSError) as e:
+            Logger.app.error("Unable to write metrics: {}".format(e))
+
+    def serve(self, port):
+        """
+        Serve the Prometheus text format on http://<host>:port/metrics from a background thread
+        """
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self.server = HTTPServer(('', port), MetricsHandler)
+        except (IOError, OSError) as e:
+            Logger.app.error("Unable to serve metrics on port {0}: {1}".format(port, e))
+            return
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+metrics = Metrics()
+atexit.register(metrics.flush)
+
+
+def instrumented_request(client):
+    """
+    Decorator for the _request(self, method, url, ...) method of an API wrapper, timing each call as http_request
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(api, method, url, *args, **kwargs):
+            with metrics.span('http_request', client=client, method=method, path=path_template(url)) as span:
+                return span.record(func(api, method, url, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
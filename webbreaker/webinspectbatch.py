@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+import json
+import time
+from multiprocessing.pool import ThreadPool
+from webbreaker.webbreakerlogger import Logger
+from webbreaker.webinspectclient import WebinspectClient
+from webbreaker.webinspectscanhelpers import create_scan_event_handler
+from webbreaker.webinspectscanwatcher import ScanWatcher
+
+# The options of a batch scan, and their defaults, match those of the webinspect scan command
+SCAN_OPTIONS = {'allowed_hosts': [],
+                'fortify_user': None,
+                'login_macro': None,
+                'max_wait': None,
+                'priority': 0,
+                'scan_name': None,
+                'scan_mode': None,
+                'scan_policy': None,
+                'scan_scope': None,
+                'scan_start': None,
+                'settings': 'Default',
+                'size': None,
+                'start_urls': [],
+                'upload_policy': None,
+                'upload_settings': None,
+                'upload_webmacros': None,
+                'workflow_macros': []}
+MULTIPLE_SCAN_OPTIONS = ('allowed_hosts', 'start_urls', 'workflow_macros')
+
+SCAN_PENDING = 'pending'
+SCAN_RUNNING = 'running'
+SCAN_EXPORTING = 'exporting'
+SCAN_DONE = 'done'
+SCAN_FAILED = 'failed'
+
+
+def load_batch_manifest(manifest_path):
+    """
+    Read the scans of a batch from a JSON manifest, either a list of scans or an object like
+    {"defaults": {"settings": "MySettings"}, "scans": [{"scan_name": "app-1", "start_urls": ["https://app-1"]}]}
+    where each scan takes the options of the webinspect scan command.
+    :param manifest_path: Path to the manifest
+    :return: List of scan options, with defaults filled in
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'scans': manifest}
+
+    defaults = manifest.get('defaults', {})
+    scans = []
+    names = {}
+    for index, scan in enumerate(manifest.get('scans', [])):
+        options = dict(SCAN_OPTIONS)
+        options.update(defaults)
+        options.update(scan)
+        unknown = set(options) - set(SCAN_OPTIONS)
+        if unknown:
+            raise ValueError("Scan {0} in {1} has unknown options: {2}".format(index + 1, manifest_path,
+                                                                               ', '.join(sorted(unknown))))
+        # Scans are exported to files named after them
+        if options['scan_name'] and options['scan_name'] in names:
+            raise ValueError("Scans {0} and {1} in {2} are both named {3}".format(
+                names[options['scan_name']] + 1, index + 1, manifest_path, options['scan_name']))
+        names[options['scan_name']] = index
+        for option in MULTIPLE_SCAN_OPTIONS:
+            if not options[option]:
+                options[option] = []
+            elif not isinstance(options[option], list):
+                options[option] = [options[option]]
+        scans.append(options)
+    return scans
+
+
+class BatchScan(object):
+    def __init__(self, options):
+        self.options = options
+        self.name = options.get('scan_name')
+        self.settings = None
+        self.client = None
+        self.scan_id = None
+        self.watcher = None
+        self.handle_scan_event = None
+        self.state = SCAN_PENDING
+        self.status = None
+
+
+class WebInspectBatch(object):
+    """
+    Launches a batch of WebInspect scans across the scan engine farm and follows all of them from a single loop.
+    Scans wait their turn while every engine is busy, and each scan is exported as soon as it completes, while the
+    rest of the batch is still running.
+    """
+
+    def __init__(self, scans, webinspect_config, launch_interval=30, export_pool_size=4):
+        """
+        :param scans: Scan options, see load_batch_manifest
+        :param webinspect_config: WebInspectConfig
+        :param launch_interval: Seconds between attempts to launch waiting scans while every engine is busy
+        :param export_pool_size: Max scans exported at once
+        """
+        self.webinspect_config = webinspect_config
+        self.scans = [BatchScan(options) for options in scans]
+        self.launch_interval = float(launch_interval)
+        self.export_pool_size = int(export_pool_size)
+        self.exports = {}
+        self.last_summary = None
+
+    def __unique_name__(self, batch_scan, name):
+        """
+        Scans without a scan_name are all named after the Jenkins job, and would be exported over each other's files
+        :return: name, or name suffixed with the position of the scan in the batch if another scan already has it
+        """
+        if any(other is not batch_scan and other.name == name for other in self.scans):
+            unique_name = '{0}-{1}'.format(name, self.scans.index(batch_scan) + 1)
+            Logger.app.info("Another scan in the batch is named {0}, naming this one {1}".format(name, unique_name))
+            return unique_name
+        return name
+
+    def __launch__(self, batch_scan):
+        """
+        :return: False if the scan has to wait for an engine, True otherwise
+        """
+        if batch_scan.settings is None:
+            try:
+                batch_scan.settings = self.webinspect_config.parse_webinspect_options(dict(batch_scan.options))
+                batch_scan.name = self.__unique_name__(batch_scan, batch_scan.settings['webinspect_scan_name'])
+                batch_scan.settings['webinspect_scan_name'] = batch_scan.name
+            except (AttributeError, UnboundLocalError, KeyError, SystemExit) as e:
+                Logger.app.error("Your configuration or settings for {0} are incorrect: {1}".format(batch_scan.name, e))
+                batch_scan.state = SCAN_FAILED
+                return True
+
+        # Waiting happens here, in the batch, rather than in the admission queue
+        batch_scan.settings['webinspect_max_wait'] = None
+        try:
+            batch_scan.client = WebinspectClient(batch_scan.settings)
+        except EnvironmentError:
+            return False
+        except (UnboundLocalError, NameError, TypeError) as e:
+            Logger.app.critical("Incorrect WebInspect configurations found for {0}!! {1}".format(batch_scan.name, e))
+            batch_scan.state = SCAN_FAILED
+            return True
+
+        try:
+            if batch_scan.client.prepare_scan(self.webinspect_config.mapped_policies):
+                Logger.app.info("Launching scan {}".format(batch_scan.name))
+                batch_scan.scan_id = batch_scan.client.create_scan()
+        except Exception as e:
+            Logger.app.error("Unable to launch scan {0}: {1}".format(batch_scan.name, e))
+        if not batch_scan.scan_id:
+            batch_scan.client.release_endpoint()
+            batch_scan.state = SCAN_FAILED
+            return True
+
+        batch_scan.handle_scan_event = create_scan_event_handler(batch_scan.client, batch_scan.scan_id,
+                                                                 batch_scan.settings)
+        batch_scan.handle_scan_event('scan_start')
+        config = batch_scan.client.config
+        # No long-polling, it would hold up every other scan in the batch
+        batch_scan.watcher = ScanWatcher(batch_scan.scan_id, batch_scan.client.current_scan_status,
+                                         on_event=batch_scan.handle_scan_event,
+                                         poll_interval=config.scan_poll_interval,
+                                         max_poll_interval=config.scan_max_poll_interval,
+                                         reconnect_timeout=config.scan_reconnect_timeout,
+                                         stall_timeout=config.scan_stall_timeout)
+        batch_scan.state = SCAN_RUNNING
+        return True
+
+    @staticmethod
+    def __export__(batch_scan):
+        try:
+            batch_scan.client.export_scan_results(batch_scan.scan_id, 'fpr', 'xml')
+        finally:
+            batch_scan.handle_scan_event('scan_end')
+
+    def __finish__(self, batch_scan, pool):
+        batch_scan.status = batch_scan.watcher.result
+        Logger.app.info("Scan {0} status has changed to {1}.".format(batch_scan.name, batch_scan.status))
+        if batch_scan.status.lower() != 'complete':
+            Logger.app.error("Scan {} is incomplete and is unrecoverable.".format(batch_scan.name))
+            batch_scan.handle_scan_event('scan_end')
+            batch_scan.state = SCAN_FAILED
+            return
+        batch_scan.state = SCAN_EXPORTING
+        self.exports[batch_scan] = pool.apply_async(self.__export__, (batch_scan,))
+
+    def __collect_exports__(self):
+        for batch_scan, export in list(self.exports.items()):
+            if export.ready():
+                del self.exports[batch_scan]
+                try:
+                    export.get()
+                    batch_scan.state = SCAN_DONE
+                except Exception as e:
+                    Logger.app.error("Unable to export scan {0}: {1}".format(batch_scan.name, e))
+                    batch_scan.state = SCAN_FAILED
+
+    def __log_summary__(self):
+        counts = dict((state, len([s for s in self.scans if s.state == state]))
+                      for state in (SCAN_PENDING, SCAN_RUNNING, SCAN_EXPORTING, SCAN_DONE, SCAN_FAILED))
+        engines = {}
+        for batch_scan in self.scans:
+            if batch_scan.state == SCAN_RUNNING:
+                engines[batch_scan.client.url] = engines.get(batch_scan.client.url, 0) + 1
+        summary = ("Batch: {0} waiting, {1} running, {2} exporting, {3} done, {4} failed. Running on: {5}".format(
+            counts[SCAN_PENDING], counts[SCAN_RUNNING], counts[SCAN_EXPORTING], counts[SCAN_DONE],
+            counts[SCAN_FAILED], ', '.join('{0} ({1})'.format(url, n) for url, n in sorted(engines.items()))
+            or 'none'))
+        if summary != self.last_summary:
+            Logger.app.info(summary)
+            self.last_summary = summary
+
+    def run(self):
+        """
+        Blocking call, launches and follows every scan of the batch until all are exported or have failed.
+        :return: True if every scan was exported
+        """
+        pool = ThreadPool(processes=max(1, self.export_pool_size))
+        # (when to check next, order launched, scan) for every running scan
+        checks = []
+        launched = 0
+        next_launch = 0
+        try:
+            while True:
+                now = time.time()
+                pending = [s for s in self.scans if s.state == SCAN_PENDING]
+                if pending and now >= next_launch:
+                    for batch_scan in pending:
+                        if not self.__launch__(batch_scan):
+                            # Every engine is busy, try again once some scans have had a chance to finish
+                            next_launch = now + self.launch_interval
+                            break
+                        if batch_scan.state == SCAN_RUNNING:
+                            heapq.heappush(checks, (time.time(), launched, batch_scan))
+                            launched += 1
+
+                while checks and checks[0][0] <= time.time():
+                    due, order, batch_scan = heapq.heappop(checks)
+                    wait = batch_scan.watcher.step()
+                    if wait is None:
+                        self.__finish__(batch_scan, pool)
+                    else:
+                        heapq.heappush(checks, (time.time() + wait, order, batch_scan))
+
+                self.__collect_exports__()
+                self.__log_summary__()
+                if all(s.state in (SCAN_DONE, SCAN_FAILED) for s in self.scans):
+                    break
+
+                wake = [next_launch] if any(s.state == SCAN_PENDING for s in self.scans) else []
+                if checks:
+                    wake.append(checks[0][0])
+                # Exports finish in the background, so look in on them at least every second
+                time.sleep(max(0, min(wake + [time.time() + 1]) - time.time()))
+        finally:
+            pool.close()
+            pool.join()
+            for batch_scan in self.scans:
+                if batch_scan.client:
+                    batch_scan.client.release_endpoint()
+        return all(s.state == SCAN_DONE for s in self.scans)
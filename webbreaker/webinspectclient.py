@@ -3,14 +3,24 @@
 
 import sys
 import json
+import functools
+import logging
 import ntpath
+import sqlite3
 import requests
 import urllib3
-import webinspectapi.webinspect as webinspectapi
+from multiprocessing.pool import ThreadPool
+from webbreaker.webinspectsession import PooledWebInspectApi
 from webbreaker.webbreakerlogger import Logger
+from webbreaker.webbreakermetrics import metrics
 from webbreaker.webbreakerhelper import WebBreakerHelper
 from webbreaker.webinspectconfig import WebInspectConfig
 from webbreaker.webinspectjitscheduler import WebInspectJitScheduler
+from webbreaker.webinspectlease import get_lease_backend
+from webbreaker.webinspectmanifest import AssetManifest, ASSET_POLICY, ASSET_SETTINGS, ASSET_WEBMACRO, asset_name, \
+    file_digest
+from webbreaker.webinspectqueue import AdmissionQueue
+from webbreaker.webinspectscanwatcher import ScanWatcher
 import webbreaker.webinspectjson as webinspectjson
 
 try:
@@ -26,12 +36,34 @@ class WebinspectClient(object):
         config = WebInspectConfig()
         lb = WebInspectJitScheduler(endpoints=config.endpoints,
                                     size_list=config.sizing,
-                                    size_needed=webinspect_setting['webinspect_scan_size'])
+                                    size_needed=webinspect_setting['webinspect_scan_size'],
+                                    probe_timeout=config.probe_timeout,
+                                    probe_pool_size=config.probe_pool_size,
+                                    strategy=config.scheduler,
+                                    leases=get_lease_backend(config.lease_backend, config.lease_ttl))
         Logger.app.info("Querying WebInspect scan engines for availability.")
-        endpoint = lb.get_endpoint()
+        if webinspect_setting.get('webinspect_max_wait'):
+            # Get in line even if an engine looks free, runs already waiting on one have first pick. With nobody
+            # else in line the engines are probed straight away.
+            try:
+                queue = AdmissionQueue(poll_interval=config.queue_poll_interval,
+                                       max_poll_interval=config.queue_max_poll_interval)
+                endpoint = queue.admit(lb.get_endpoint, scan_name=webinspect_setting['webinspect_scan_name'],
+                                       max_wait=webinspect_setting['webinspect_max_wait'],
+                                       priority=webinspect_setting.get('webinspect_priority', 0))
+            except sqlite3.Error as e:
+                # e.g. webinspect.db is locked or read-only
+                Logger.app.warning("Unable to use the WebInspect scan queue, probing the scan engines directly: "
+                                   "{}".format(e))
+                endpoint = lb.get_endpoint()
+        else:
+            endpoint = lb.get_endpoint()
         if not endpoint:
             raise EnvironmentError("Scheduler found no available endpoints.")
         self.url = endpoint
+        self.lease = lb.lease
+        self.upload_pool_size = int(config.upload_pool_size)
+        self.config = config
         self.settings = webinspect_setting['webinspect_settings']
         self.scan_name = webinspect_setting['webinspect_scan_name']
         self.webinspect_upload_settings = webinspect_setting['webinspect_upload_settings']
@@ -66,7 +98,7 @@ class WebinspectClient(object):
 
     def __settings_exists__(self):
         try:
-            api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
             response = api.list_settings()
 
             if response.success:
@@ -79,6 +111,7 @@ class WebinspectClient(object):
                              "Error: {}".format(e))
         return False
 
+    @metrics.timed('webinspect_client')
     def create_scan(self):
         """
         Launches and monitors a scan
@@ -92,48 +125,64 @@ class WebinspectClient(object):
                                                                          self.start_urls, self.workflow_macros,
                                                                          self.allowed_hosts))
 
-        api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+        api = PooledWebInspectApi(self.url, verify_ssl=False)
         response = api.create_scan(overrides)
 
-        logger_response = json.dumps(response, default=lambda o: o.__dict__, sort_keys=True)
-        Logger.app.debug("Request sent to {0}:\n{1}".format(self.url, overrides))
-        Logger.app.debug("Response from {0}:\n{1}\n".format(self.url, logger_response))
+        # Serializing the payloads is only worth it when someone will read them
+        if Logger.app.isEnabledFor(logging.DEBUG):
+            logger_response = json.dumps(response, default=lambda o: o.__dict__, sort_keys=True)
+            Logger.app.debug("Request sent to {0}:\n{1}".format(self.url, overrides))
+            Logger.app.debug("Response from {0}:\n{1}\n".format(self.url, logger_response))
 
         if response.success:
             scan_id = response.data['ScanId']
+            if self.lease:
+                self.lease.attach_scan(scan_id)
             sys.stdout.write(str('WebInspect scan launched on {0} your scan id: {1}\n'.format(self.url, scan_id)))
         else:
             Logger.app.error("No scan was launched!")
             Logger.app.error("{}".format(response.message))
+            self.release_endpoint()
             return False
         return scan_id
 
-    def export_scan_results(self, scan_id, extension):
+    @metrics.timed('webinspect_client')
+    def export_scan_results(self, scan_id, *extensions):
         """
-        Save scan results to file
+        Save scan results to file, one file per extension. The exports run at the same time and are streamed
+        straight to disk.
         :param scan_id:
-        :param extension:
+        :param extensions: e.g. 'fpr', 'xml'
         :return:
         """
         # Export scan as a xml for Threadfix or other Vuln Management System
-        Logger.app.info('Exporting scan: {} as {}'.format(scan_id, extension))
+        for extension in extensions:
+            Logger.app.info('Exporting scan: {} as {}'.format(scan_id, extension))
+
+        if len(extensions) == 1:
+            self.__export_scan__(scan_id, extensions[0])
+            return
+        pool = ThreadPool(len(extensions))
+        try:
+            pool.map(lambda extension: self.__export_scan__(scan_id, extension), extensions)
+        finally:
+            pool.close()
+            pool.join()
+
+    def __export_scan__(self, scan_id, extension):
+        file_name = '{0}.{1}'.format(self.scan_name, extension)
         detail_type = 'Full' if extension == 'xml' else None
-        api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
-        response = api.export_scan_format(scan_id, extension, detail_type)
+        api = PooledWebInspectApi(self.url, verify_ssl=False)
+        response = api.download_scan_format(scan_id, extension, file_name, detail_type)
 
         if response.success:
-            try:
-                with open('{0}.{1}'.format(self.scan_name, extension), 'wb') as f:
-                    Logger.app.debug(str('Scan results file is available: {0}.{1}\n'.format(self.scan_name, extension)))
-                    f.write(response.data)
-                    print(str('Scan results file is available: {0}.{1}\n'.format(self.scan_name, extension)))
-            except UnboundLocalError as e:
-                Logger.app.error('Error saving file locally {}'.format(e))
+            Logger.app.debug(str('Scan results file is available: {0}\n'.format(file_name)))
+            print(str('Scan results file is available: {0}\n'.format(file_name)))
         else:
             Logger.app.error('Unable to retrieve scan results. {} '.format(response.message))
 
     def get_policy_by_guid(self, policy_guid):
-        api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+        api = PooledWebInspectApi(self.url, verify_ssl=False)
         response = api.get_policy_by_guid(policy_guid)
         if response.success:
             return response.data
@@ -141,7 +190,7 @@ class WebinspectClient(object):
             return None
 
     def get_policy_by_name(self, policy_name):
-        api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+        api = PooledWebInspectApi(self.url, verify_ssl=False)
         response = api.get_policy_by_name(policy_name)
         if response.success:
             return response.data
@@ -152,7 +201,7 @@ class WebinspectClient(object):
         try:
 
             if scan_name:
-                api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+                api = PooledWebInspectApi(self.url, verify_ssl=False)
                 response = api.get_scan_by_name(scan_name)
                 if response.success:
                     scan_guid = response.data[0]['ID']
@@ -160,7 +209,7 @@ class WebinspectClient(object):
                     Logger.app.error(response.message)
                     return None
 
-            api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
             response = api.get_scan_issues(scan_guid)
             if response.success:
                 return response.data_json(pretty=True)
@@ -173,7 +222,7 @@ class WebinspectClient(object):
         try:
 
             if scan_name:
-                api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+                api = PooledWebInspectApi(self.url, verify_ssl=False)
                 response = api.get_scan_by_name(scan_name)
                 if response.success:
                     scan_guid = response.data[0]['ID']
@@ -181,7 +230,7 @@ class WebinspectClient(object):
                     Logger.app.error(response.message)
                     return None
 
-            api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
             response = api.get_scan_log(scan_guid)
             if response.success:
                 return response.data_json()
@@ -191,7 +240,7 @@ class WebinspectClient(object):
             Logger.app.error("get_scan_log failed: {}".format(e))
 
     def get_scan_status(self, scan_guid):
-        api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+        api = PooledWebInspectApi(self.url, verify_ssl=False)
         try:
             response = api.get_current_status(scan_guid)
             status = json.loads(response.data_json())['ScanStatus']
@@ -202,7 +251,7 @@ class WebinspectClient(object):
 
     def list_policies(self):
         try:
-            api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
             response = api.list_policies()
 
             if response.success:
@@ -217,7 +266,7 @@ class WebinspectClient(object):
     def list_scans(self):
 
         try:
-            api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
             response = api.list_scans()
 
             if response.success:
@@ -231,7 +280,7 @@ class WebinspectClient(object):
 
     def list_webmacros(self):
         try:
-            api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
             response = api.list_webmacros()
 
             if response.success:
@@ -245,25 +294,188 @@ class WebinspectClient(object):
 
     def policy_exists(self, policy_guid):
         # true if policy exists
-        api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+        api = PooledWebInspectApi(self.url, verify_ssl=False)
         response = api.get_policy_by_guid(policy_guid)
         return response.success
 
+    def release_endpoint(self):
+        """
+        Give back the slot leased on the endpoint by the scheduler. Safe to call more than once.
+        """
+        if self.lease:
+            try:
+                self.lease.release()
+            except Exception as e:
+                Logger.app.error("Unable to release lease on {}, it will expire on its own: {}".format(self.url, e))
+
     def stop_scan(self, scan_guid):
-        api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+        api = PooledWebInspectApi(self.url, verify_ssl=False)
         response = api.stop_scan(scan_guid)
         return response.success
 
+    @metrics.timed('webinspect_client')
+    def prepare_scan(self, mapped_policies):
+        """
+        Resolve the scan policy and upload the scan's settings, webmacros and policy ahead of create_scan
+        :param mapped_policies: The built-in policies, as [name, GUID] pairs from WebInspectConfig
+        :return: True if the scan is ready to launch
+        """
+        # if a scan policy has been specified, we need to make sure we can find/use it
+        policy_guid = None
+        # if there was a provided scan policy, it's either built-in or the policy to upload. hack.
+        upload_policy = not self.scan_policy
+        if self.scan_policy:
+            # two happy paths: either the provided policy refers to an existing builtin policy, or it refers to
+            # a local policy we need to first upload and then use.
+
+            if str(self.scan_policy).lower() in [str(x[0]).lower() for x in mapped_policies]:
+                idx = [x for x, y in enumerate(mapped_policies) if y[0] == str(self.scan_policy).lower()]
+                policy_guid = mapped_policies[idx[0]][1]
+                Logger.app.info("scan_policy {} with policyID {} has been selected.".format(self.scan_policy,
+                                                                                            policy_guid))
+                Logger.app.info("Checking to make sure a policy with that ID exists in WebInspect.")
+                if not self.policy_exists(policy_guid):
+                    Logger.app.error("Scan policy {} cannot be located on the WebInspect server. Stopping".format(
+                        self.scan_policy))
+                    return False
+                else:
+                    Logger.app.info("Found policy {} in WebInspect.".format(policy_guid))
+            else:
+                # Not a builtin. Assume that caller wants the provided policy to be uploaded
+                Logger.app.info("Provided scan policy is not built-in, so will assume it needs to be uploaded.")
+                upload_policy = True
+
+        # Upload whatever configurations have been provided, all at once...
+        # All skipped unless explicitly declared in CLI
+        failed_uploads = self.upload_assets(upload_policy=upload_policy)
+        if failed_uploads:
+            Logger.app.error("Unable to upload {0} to WebInspect, see log {1}. Stopping".format(
+                ', '.join(failed_uploads), Logger.app_logfile))
+            return False
+
+        if self.scan_policy:
+            if not policy_guid:
+                # The uploaded policy only has a GUID once the upload is done
+                policy = self.get_policy_by_name(self.scan_policy)
+                if policy:
+                    policy_guid = policy['uniqueId']
+                else:
+                    Logger.app.error("The policy name is either incorrect or not available in {}."
+                                     .format('.webbreaker/etc/webinspect/policies'))
+                    return False
+
+            # Change the provided policy name into the corresponding policy id for scan creation.
+            self.scan_policy = self.get_policy_by_guid(policy_guid)['id']
+            Logger.app.debug("New scan policy has been set")
+        return True
+
+    @metrics.timed('webinspect_client')
+    def upload_assets(self, upload_policy=False):
+        """
+        Upload the settings, webmacros and, if upload_policy, the policy declared for this scan. Files that are
+        unchanged since they were last uploaded to this endpoint are skipped. The uploads are independent of each other
+        so they all run at once, failures are reported together once every upload is done.
+        :param upload_policy: Upload webinspect_upload_policy along with the rest
+        :return: List of the files that failed to upload
+        """
+        uploads = []
+        if self.webinspect_upload_settings:
+            uploads.append((ASSET_SETTINGS, self.webinspect_upload_settings, self.upload_settings))
+        for webmacro in self.webinspect_upload_webmacros or []:
+            uploads.append((ASSET_WEBMACRO, webmacro, functools.partial(self.upload_webmacro, webmacro)))
+        if upload_policy and self.webinspect_upload_policy:
+            uploads.append((ASSET_POLICY, self.webinspect_upload_policy, self.upload_policy))
+        if not uploads:
+            return []
+
+        try:
+            manifest = AssetManifest()
+        except sqlite3.Error as e:
+            Logger.app.error("Unable to open the upload manifest, every file will be uploaded: {}".format(e))
+            manifest = None
+        uploads = self.__changed_assets__(manifest, uploads)
+        if not uploads:
+            return []
+
+        pool = ThreadPool(processes=max(1, min(len(uploads), self.upload_pool_size)))
+        try:
+            results = pool.map(lambda upload: self.__upload_asset__(manifest, *upload), uploads)
+        finally:
+            pool.close()
+            pool.join()
+
+        failed = [upload[1] for upload, uploaded in zip(uploads, results) if not uploaded]
+        if failed:
+            Logger.app.error("Unable to upload {0} of {1} files to {2}: {3}".format(len(failed), len(uploads),
+                                                                                  self.url, ', '.join(failed)))
+        return failed
+
+    def __changed_assets__(self, manifest, uploads):
+        """
+        Drop the uploads whose file is byte for byte the one last uploaded to this endpoint, and still listed there.
+        :param manifest: AssetManifest, or None to keep every upload
+        :param uploads: (kind, file path, upload function) tuples
+        :return: (kind, file path, upload function, file digest) tuples still to be uploaded
+        """
+        digests = [file_digest(upload[1]) for upload in uploads]
+        unchanged = [False] * len(uploads)
+        if manifest:
+            try:
+                unchanged = [digest is not None and manifest.get(self.url, kind, asset_name(file_path)) == digest
+                             for (kind, file_path, _), digest in zip(uploads, digests)]
+            except sqlite3.Error as e:
+                Logger.app.error("Unable to read the upload manifest, every file will be uploaded: {}".format(e))
+
+        listed = self.__list_assets__(set(upload[0] for upload, same in zip(uploads, unchanged) if same))
+        changed = []
+        for (kind, file_path, upload), digest, same in zip(uploads, digests, unchanged):
+            if same and asset_name(file_path).lower() in listed.get(kind, ()):
+                Logger.app.debug("{0} {1} is unchanged on {2}, skipping upload".format(kind, file_path, self.url))
+            else:
+                changed.append((kind, file_path, upload, digest))
+        return changed
+
+    def __list_assets__(self, kinds):
+        """
+        :param kinds: Asset kinds to list
+        :return: dict of asset kind to the lower cased names listed by the endpoint
+        """
+        listed = {}
+        if not kinds:
+            return listed
+        api = PooledWebInspectApi(self.url, verify_ssl=False)
+        listings = {ASSET_SETTINGS: 'list_settings',
+                    ASSET_WEBMACRO: 'list_webmacros',
+                    ASSET_POLICY: 'list_policies'}
+        for kind in kinds:
+            response = getattr(api, listings[kind])()
+            if response.success and isinstance(response.data, list):
+                listed[kind] = set(str(item.get('name') if isinstance(item, dict) else item).lower()
+                                   for item in response.data)
+        return listed
+
+    def __upload_asset__(self, manifest, kind, file_path, upload, digest):
+        uploaded = upload()
+        if manifest and digest:
+            try:
+                if uploaded:
+                    manifest.record(self.url, kind, asset_name(file_path), digest)
+                else:
+                    manifest.forget(self.url, kind, asset_name(file_path))
+            except sqlite3.Error as e:
+                Logger.app.error("Unable to update the upload manifest: {}".format(e))
+        return uploaded
+
     def upload_policy(self):
         # if a policy of the same name already exists, delete it prior to upload
         try:
-            api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
             # bit of ugliness here. I'd like to just have the policy name at this point but I don't
             # so find it in the full path
             # TODO: Verify split here
             response = api.get_policy_by_name(ntpath.basename(self.webinspect_upload_policy).split('.')[0])
             if response.success and response.response_code == 200:  # the policy exists on the server already
-                api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+                api = PooledWebInspectApi(self.url, verify_ssl=False)
                 response = api.delete_policy(response.data['uniqueId'])
                 if response.success:
                     Logger.app.debug("Deleted policy {} from server".format(
@@ -272,55 +484,97 @@ class WebinspectClient(object):
             Logger.app.error("Verify if deletion of existing policy failed: {}".format(e))
 
         try:
-            api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
             response = api.upload_policy(self.webinspect_upload_policy)
 
             if response.success:
                 Logger.console.debug("Uploaded policy {} to server.".format(self.webinspect_upload_policy))
+                return True
             else:
                 Logger.app.error("Error uploading policy {0}. {1}".format(self.webinspect_upload_policy,
                                                                           response.message))
 
-        except (ValueError, UnboundLocalError, TypeError) as e:
+        except (ValueError, UnboundLocalError, TypeError, IOError) as e:
             Logger.app.error("Error uploading policy {}".format(e))
+        return False
 
     def upload_settings(self):
 
         try:
-            api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
             response = api.upload_settings(self.webinspect_upload_settings)
 
             if response.success:
                 Logger.console.debug("Uploaded settings {} to server.".format(self.webinspect_upload_settings))
+                return True
             else:
                 Logger.app.error(
                     "Error uploading settings {0}. \nResponse Message: {1}".format(self.webinspect_upload_settings,
                                                                                    response.message))
 
-        except (ValueError, UnboundLocalError, NameError) as e:
+        except (ValueError, UnboundLocalError, NameError, IOError) as e:
             Logger.app.error("Error uploading settings {}".format(e))
+        return False
 
-    def upload_webmacros(self):
+    def upload_webmacro(self, webmacro):
         try:
-            for webmacro in self.webinspect_upload_webmacros:
-                api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
-                response = api.upload_webmacro(webmacro)
-                if response.success:
-                    Logger.console.debug("Uploaded webmacro {} to server.".format(webmacro))
-                else:
-                    Logger.app.error("Error uploading webmacro {0}. {1}".format(webmacro, response.message))
+            api = PooledWebInspectApi(self.url, verify_ssl=False)
+            response = api.upload_webmacro(webmacro)
+            if response.success:
+                Logger.console.debug("Uploaded webmacro {} to server.".format(webmacro))
+                return True
+            else:
+                Logger.app.error("Error uploading webmacro {0}. {1}".format(webmacro, response.message))
 
-        except (ValueError, UnboundLocalError) as e:
+        except (ValueError, UnboundLocalError, IOError) as e:
             Logger.app.error("Error uploading webmacro {}".format(e))
+        return False
+
+    def upload_webmacros(self):
+        return all([self.upload_webmacro(webmacro) for webmacro in self.webinspect_upload_webmacros])
+
+    @metrics.timed('webinspect_client')
+    def watch_scan(self, scan_id, on_event=None):
+        """
+        Blocking call, will remain in this method until the scan reaches a terminal status
+        :param scan_id:
+        :param on_event: Called on each scan status change, see ScanWatcher
+        :return: The final scan status
+        """
+        long_poll_timeout = float(self.config.scan_long_poll_timeout)
+        watcher = ScanWatcher(scan_id, self.current_scan_status,
+                              wait_for_change=lambda scan: self.wait_for_scan_status_change(scan, long_poll_timeout),
+                              on_event=on_event,
+                              poll_interval=self.config.scan_poll_interval,
+                              max_poll_interval=self.config.scan_max_poll_interval,
+                              reconnect_timeout=self.config.scan_reconnect_timeout,
+                              stall_timeout=self.config.scan_stall_timeout)
+        return watcher.watch()
+
+    def current_scan_status(self, scan_id):
+        """
+        :return: The scan status, or None if it couldn't be retrieved
+        """
+        api = PooledWebInspectApi(self.url, verify_ssl=False)
+        response = api.get_current_status(scan_id)
+        if not response.success:
+            Logger.app.debug('Scan status not known because: {}'.format(response.message))
+            return None
+        try:
+            return json.loads(response.data_json())['ScanStatus']
+        except (ValueError, KeyError, TypeError) as e:
+            Logger.app.debug('Scan status not known because: {}'.format(e))
+            return None
 
-    def wait_for_scan_status_change(self, scan_id):
+    def wait_for_scan_status_change(self, scan_id, timeout=None):
         """
         Blocking call, will remain in this method until status of scan changes
         :param scan_id:
+        :param timeout: Max seconds to wait, None waits as long as the server holds the request
         :return:
         """
         # WebInspect Scan has started, wait here until it's done
-        api = webinspectapi.WebInspectApi(self.url, verify_ssl=False)
+        api = PooledWebInspectApi(self.url, verify_ssl=False, timeout=timeout)
         response = api.wait_for_status_change(scan_id)  # this line is the blocker
 
         if response.success:
@@ -47,6 +47,20 @@ class WebInspectConfig(object):
             self.default_size = webinspect_dict['default_size']
             self.webinspect_git = webinspect_dict['git']
             self.mapped_policies = webinspect_dict['mapped_policies']
+            self.probe_timeout = webinspect_dict['probe_timeout']
+            self.probe_pool_size = webinspect_dict['probe_pool_size']
+            self.scheduler = webinspect_dict['scheduler']
+            self.lease_backend = webinspect_dict['lease_backend']
+            self.lease_ttl = webinspect_dict['lease_ttl']
+            self.queue_max_wait = webinspect_dict['queue_max_wait']
+            self.queue_poll_interval = webinspect_dict['queue_poll_interval']
+            self.queue_max_poll_interval = webinspect_dict['queue_max_poll_interval']
+            self.upload_pool_size = webinspect_dict['upload_pool_size']
+            self.scan_poll_interval = webinspect_dict['scan_poll_interval']
+            self.scan_max_poll_interval = webinspect_dict['scan_max_poll_interval']
+            self.scan_reconnect_timeout = webinspect_dict['scan_reconnect_timeout']
+            self.scan_stall_timeout = webinspect_dict['scan_stall_timeout']
+            self.scan_long_poll_timeout = webinspect_dict['scan_long_poll_timeout']
         except KeyError as e:
             Logger.app.error("Your configurations file or scan setting is incorrect : {}!!!".format(e))
         Logger.app.debug("Completed webinspect config initialization")
@@ -72,6 +86,24 @@ class WebInspectConfig(object):
 
             webinspect_dict['git'] = wb_config.conf_get('webinspect', 'git_repo')
             webinspect_dict['default_size'] = wb_config.conf_get('webinspect', 'default_size')
+            webinspect_dict['probe_timeout'] = wb_config.conf_get('webinspect', 'probe_timeout', '15')
+            webinspect_dict['probe_pool_size'] = wb_config.conf_get('webinspect', 'probe_pool_size', '8')
+            webinspect_dict['scheduler'] = wb_config.conf_get('webinspect', 'scheduler', 'least_loaded')
+            webinspect_dict['lease_backend'] = wb_config.conf_get('webinspect', 'lease_backend', 'sqlite')
+            webinspect_dict['lease_ttl'] = wb_config.conf_get('webinspect', 'lease_ttl', '600')
+            webinspect_dict['queue_max_wait'] = wb_config.conf_get('webinspect', 'queue_max_wait', '0')
+            webinspect_dict['queue_poll_interval'] = wb_config.conf_get('webinspect', 'queue_poll_interval', '5')
+            webinspect_dict['queue_max_poll_interval'] = wb_config.conf_get('webinspect', 'queue_max_poll_interval',
+                                                                            '60')
+            webinspect_dict['upload_pool_size'] = wb_config.conf_get('webinspect', 'upload_pool_size', '4')
+            webinspect_dict['scan_poll_interval'] = wb_config.conf_get('webinspect', 'scan_poll_interval', '5')
+            webinspect_dict['scan_max_poll_interval'] = wb_config.conf_get('webinspect', 'scan_max_poll_interval',
+                                                                           '60')
+            webinspect_dict['scan_reconnect_timeout'] = wb_config.conf_get('webinspect', 'scan_reconnect_timeout',
+                                                                           '600')
+            webinspect_dict['scan_stall_timeout'] = wb_config.conf_get('webinspect', 'scan_stall_timeout', '3600')
+            webinspect_dict['scan_long_poll_timeout'] = wb_config.conf_get('webinspect', 'scan_long_poll_timeout',
+                                                                           '300')
             webinspect_dict['endpoints'] = [[endpoint[1].split('|')[0], endpoint[1].split('|')[1]] for endpoint in
                                             endpoints]
             webinspect_dict['size_list'] = sizes
@@ -263,6 +295,9 @@ class WebInspectConfig(object):
             webinspect_dict['webinspect_allowed_hosts'] = options['allowed_hosts']
             webinspect_dict['webinspect_scan_size'] = 'size_' + options['size'] if options['size'] else self.default_size
             webinspect_dict['fortify_user'] = options['fortify_user']
+            webinspect_dict['webinspect_max_wait'] = options.get('max_wait') if options.get('max_wait') is not None \
+                else int(self.queue_max_wait)
+            webinspect_dict['webinspect_priority'] = options.get('priority') or 0
 
         except argparse.ArgumentError as e:
             Logger.app.error("There was an error in the options provided!: ".format(e))
@@ -272,12 +307,16 @@ class WebInspectConfig(object):
 
     # TODO: Move to the WebbreakerConfig class
     def fetch_webinspect_configs(self, options):
+        """
+        :param options: Scan options, where settings is a settings name or a list of the settings of several scans
+        """
         config_helper = Config()
         etc_dir = config_helper.etc
         git_dir = os.path.join(config_helper.git, '.git')
+        settings = options['settings'] if isinstance(options['settings'], list) else [options['settings']]
 
         try:
-            if options['settings'] == 'Default':
+            if all(setting == 'Default' for setting in settings):
                 Logger.app.debug("Default settings were used")
             elif os.path.exists(git_dir):
                 Logger.app.info("Updating your WebInspect configurations from {}".format(etc_dir))
@@ -4,27 +4,73 @@
 import random
 import sys
 import time
-import webinspectapi.webinspect as webinspectapi
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from webbreaker.webinspectsession import PooledWebInspectApi
 from webbreaker.webbreakerlogger import Logger
+from webbreaker.webbreakermetrics import metrics
+
+
+# Scans in these states hold a slot on the scan engine
+ACTIVE_SCAN_STATUSES = ('Running',)
+# Scans in these states have been accepted by the scan engine but are waiting on a slot
+QUEUED_SCAN_STATUSES = ('Pending', 'Queued')
+
+SCHEDULER_LEAST_LOADED = 'least_loaded'
+SCHEDULER_FIRST_FIT = 'first_fit'
+
+
+class EndpointLoad(object):
+    def __init__(self, endpoint, max_scans, running=0, queued=0, latency=None, reachable=True):
+        self.endpoint = endpoint
+        self.max_scans = int(max_scans)
+        self.running = running
+        self.queued = queued
+        self.leased = 0
+        self.scan_ids = set()
+        self.latency = latency
+        self.reachable = reachable
+
+    @property
+    def observed_capacity(self):
+        """Free slots according to the endpoint itself, without leases held by other WebBreaker runs"""
+        if not self.reachable:
+            return 0
+        return self.max_scans - self.running - self.queued
+
+    @property
+    def spare_capacity(self):
+        return self.observed_capacity - self.leased
+
+    def __repr__(self):
+        return "EndpointLoad({0}, running={1}, queued={2}, leased={3}, latency={4})".format(
+            self.endpoint[0], self.running, self.queued, self.leased, self.latency)
 
 
 class WebInspectJitScheduler(object):
-    def __init__(self, endpoints, size_list, size_needed='size_large'):
+    def __init__(self, endpoints, size_list, size_needed='size_large', probe_timeout=15, probe_pool_size=8,
+                 strategy=SCHEDULER_LEAST_LOADED, leases=None):
         self.endpoints = endpoints
         self.size_list = size_list
         self.size_needed = size_needed
+        self.strategy = strategy
+        self.leases = leases
+        self.lease = None
+        self.probe_timeout = float(probe_timeout)
+        self.probe_pool_size = int(probe_pool_size)
         self.max_scans = self.__convert_size_to_count__()
 
+    @metrics.timed('webinspect_scheduler')
     def get_endpoint(self):
 
         try:
             endpoint = self.__get_available_endpoints__()
             if endpoint:
                 Logger.app.info("WebBreaker has selected: {} for your WebInspect scan.".format(endpoint[0]))
-            else:
-                Logger.app.error("No available WebInspect servers are available, due to misconfigation or "
-                                 "all scan engines are fully utilized!")
-            return endpoint[0]
+                return endpoint[0]
+            Logger.app.error("No available WebInspect servers are available, due to misconfigation or "
+                             "all scan engines are fully utilized!")
+            return None
         except Exception as e:  # Ugly. Not sure what to expect for problems, so Pokemon handling, catch'em all :(
             Logger.app.error("Error has occured with identifying an appropriate WebInspect scan engine. {}".format(e))
             return None
@@ -41,18 +87,60 @@ class WebInspectJitScheduler(object):
         # Expectation is that multiple instances of this program start simultaneously,
         # and there is significant delay b/w the selection of an endpoint and the endpoint
         # starting a scan. In an effort to prevent the same endpoint being selected as "available"
-        # by multiple program instances, we will randomize the available endpoints AND
-        # introduce a random/arbitrary length delay before testing. Might help, might not.
-        # Need a re-architecture or some kind of inter-process communication?
+        # by multiple program instances, a slot is leased on the endpoint before it is handed out
+        # (see webinspectlease), and leases held by other runs are counted alongside Running scans.
         possible_endpoints = self.__get_possible_endpoints__(max_concurrent_scans=self.max_scans)
         random.shuffle(possible_endpoints)
         # time.sleep(random.randint(0, 30))
-        for endpoint in possible_endpoints:
-            if self.__is_endpoint_available__(endpoint=endpoint, max_concurrent_scans=self.max_scans):
-                return endpoint
+        if self.strategy == SCHEDULER_FIRST_FIT:
+            for load in self.__probe_endpoints__(possible_endpoints):
+                if load.spare_capacity > 0 and self.__reserve__(load):
+                    return load.endpoint
+            return None
 
+        return self.__get_least_loaded_endpoint__(possible_endpoints)
+
+    def __get_least_loaded_endpoint__(self, endpoints):
+        """
+        Rank every endpoint that answers by spare capacity, breaking ties on how quickly it answered. An endpoint
+        with no running or queued scans can't be beaten by anything answering after it, so stop there.
+        :param endpoints: The endpoints to evaluate
+        :return: The endpoint with the most headroom, or None if every endpoint is full or unreachable
+        """
+        candidates = []
+        for load in self.__probe_endpoints__(endpoints):
+            if load.spare_capacity <= 0:
+                continue
+            if load.spare_capacity == load.max_scans:
+                if self.__reserve__(load):
+                    return load.endpoint
+                continue
+            candidates.append(load)
+
+        candidates.sort(key=lambda l: (-l.spare_capacity, l.latency))
+        Logger.app.debug("WebInspect scanner ranking: {}".format(candidates))
+        for load in candidates:
+            if self.__reserve__(load):
+                return load.endpoint
         return None
 
+    def __reserve__(self, load):
+        """
+        Atomically lease a slot on the endpoint. Another WebBreaker run may have taken the last slot since the
+        endpoint was probed, in which case the caller should move on to the next endpoint.
+        :param load: EndpointLoad of the endpoint to reserve
+        :return: True if the endpoint may be handed out
+        """
+        if not self.leases:
+            return True
+        try:
+            self.lease = self.leases.acquire(load.endpoint[0], load.observed_capacity, load.scan_ids)
+        except Exception as e:
+            Logger.app.error("Unable to lease a slot on {}, continuing without a lease: {}".format(load.endpoint[0],
+                                                                                                  e))
+            return True
+        return self.lease is not None
+
     def __get_possible_endpoints__(self, max_concurrent_scans):
         """
         Given the provided max_concurrent_scans value, return a list of endpoints that are capable of running
@@ -67,22 +155,65 @@ class WebInspectJitScheduler(object):
                 possible_endpoints.append(endpoint)
         return possible_endpoints
 
-    def __is_endpoint_available__(self, endpoint, max_concurrent_scans):
+    def __probe_endpoints__(self, endpoints):
+        """
+        Probe all of the provided endpoints at once over a bounded thread pool. Results are yielded in the order
+        the endpoints answer, so the caller can stop as soon as it has what it needs. Endpoints that have not
+        answered within probe_timeout seconds are abandoned.
+        :param endpoints: The endpoints to evaluate
+        :return: Generator of EndpointLoad
         """
-        Determine if the provided endpoint is available. (i.e. are there less than max_concurrent_scans
-        with a Status of Running on the endpointß
+        if not endpoints:
+            return
+        pool = ThreadPool(processes=max(1, min(len(endpoints), self.probe_pool_size)))
+        try:
+            results = pool.imap_unordered(self.__probe_endpoint__, endpoints)
+            deadline = time.time() + self.probe_timeout
+            for _ in endpoints:
+                try:
+                    yield results.next(timeout=max(0, deadline - time.time()))
+                except TimeoutError:
+                    Logger.app.debug("Timed out after {} seconds waiting on WebInspect scanner probes".format(
+                        self.probe_timeout))
+                    return
+        finally:
+            # Don't wait around for slow or dead scan engines, their answers are no longer needed.
+            pool.terminate()
+
+    def __probe_endpoint__(self, endpoint):
+        try:
+            return self.__get_endpoint_load__(endpoint=endpoint, max_concurrent_scans=self.max_scans)
+        except Exception as e:
+            Logger.app.debug("WebInspect scanner {} could not be probed: {}".format(endpoint, e))
+            metrics.increment('webinspect_probe_unreachable', endpoint=endpoint[0])
+            return EndpointLoad(endpoint, self.max_scans, reachable=False)
+
+    def __get_endpoint_load__(self, endpoint, max_concurrent_scans):
+        """
+        Count the Running and queued scans on the provided endpoint, and time how long it took to answer.
         :param endpoint: The endpoint to evaluate
         :param max_concurrent_scans:  The max number of allowed scans to be running on the endpoint
+        :return: EndpointLoad for the endpoint. Endpoints that fail to answer are marked unreachable.
         """
-        api = webinspectapi.WebInspectApi(endpoint[0], verify_ssl=False)
+        api = PooledWebInspectApi(endpoint[0], verify_ssl=False, timeout=self.probe_timeout)
+        start = time.time()
         response = api.list_scans()
-        active_scans = 0
-        if response.success:
-            for scan in response.data:
-                if scan['Status'] == 'Running':
-                    active_scans += 1
-                    Logger.app.debug('WebInspect scanner {} has {} active scans'.format(endpoint, str(active_scans)))
-            if active_scans < int(max_concurrent_scans):
-                return True
-
-        return False
+        latency = time.time() - start
+        if not response.success:
+            metrics.increment('webinspect_probe_unreachable', endpoint=endpoint[0])
+            return EndpointLoad(endpoint, max_concurrent_scans, latency=latency, reachable=False)
+
+        load = EndpointLoad(endpoint, max_concurrent_scans, latency=latency)
+        for scan in response.data:
+            if scan['Status'] in ACTIVE_SCAN_STATUSES:
+                load.running += 1
+            elif scan['Status'] in QUEUED_SCAN_STATUSES:
+                load.queued += 1
+            else:
+                continue
+            load.scan_ids.add(str(scan.get('ID')))
+        if self.leases:
+            load.leased = self.leases.count(endpoint[0], load.scan_ids)
+        Logger.app.debug('WebInspect scanner {} has {} active, {} queued and {} leased scans'.format(
+            endpoint, load.running, load.queued, load.leased))
+        return load
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import importlib
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from webbreaker.webbreakerlogger import Logger
+from webbreaker.confighelper import Config
+
+LEASE_BACKEND_SQLITE = 'sqlite'
+LEASE_BACKEND_NONE = 'none'
+
+
+def default_lease_db():
+    return os.path.join(Config().etc, 'webinspect.db')
+
+
+class EndpointLease(object):
+    """
+    A slot reserved on a WebInspect endpoint. The lease covers the window between picking an endpoint and the new
+    scan showing up as Running on it, so that simultaneous WebBreaker runs don't all pick the same "available" engine.
+    """
+
+    def __init__(self, backend, lease_id, endpoint):
+        self.backend = backend
+        self.lease_id = lease_id
+        self.endpoint = endpoint
+        self.released = False
+
+    def attach_scan(self, scan_id):
+        """
+        Record the scan launched under this lease. Once the scan is visible on the endpoint it is counted there,
+        and the lease stops counting against the endpoint.
+        :param scan_id: The scan id returned by create_scan
+        """
+        if not self.released:
+            self.backend.attach_scan(self.lease_id, scan_id)
+
+    def release(self):
+        if not self.released:
+            self.backend.release(self.lease_id)
+            self.released = True
+            Logger.app.debug("Released lease {} on {}".format(self.lease_id, self.endpoint))
+
+
+class LeaseBackend(object):
+    """
+    Base class for lease backends. A backend must make acquire atomic across every WebBreaker process sharing it.
+    """
+
+    def acquire(self, endpoint, limit, visible_scan_ids=()):
+        """
+        Reserve a slot on endpoint if fewer than limit leases are held on it.
+        :param endpoint: The endpoint URL
+        :param limit: The number of free slots observed on the endpoint
+        :param visible_scan_ids: Scan ids already counted on the endpoint, leases for these scans are ignored
+        :return: EndpointLease if a slot was reserved, otherwise None
+        """
+        raise NotImplementedError
+
+    def count(self, endpoint, visible_scan_ids=()):
+        """
+        :return: The number of unexpired leases held on endpoint, ignoring leases for scans in visible_scan_ids
+        """
+        raise NotImplementedError
+
+    def attach_scan(self, lease_id, scan_id):
+        raise NotImplementedError
+
+    def release(self, lease_id):
+        raise NotImplementedError
+
+
+class SqliteLeaseBackend(LeaseBackend):
+    """
+    Lease backend for WebBreaker processes sharing a host. SQLite's write lock serializes acquire across processes.
+    """
+
+    def __init__(self, db_path=None, ttl=600, timeout=30):
+        self.db_path = db_path if db_path else default_lease_db()
+        self.ttl = float(ttl)
+        self.timeout = timeout
+        self.owner = "{0}:{1}".format(socket.gethostname(), os.getpid())
+        connection = self.__connect__()
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS endpoint_lease ("
+                               "lease_id TEXT PRIMARY KEY, "
+                               "endpoint TEXT NOT NULL, "
+                               "scan_id TEXT, "
+                               "owner TEXT, "
+                               "expires REAL NOT NULL)")
+        finally:
+            connection.close()
+
+    def __connect__(self):
+        # isolation_level=None so that transactions are only the ones we explicitly BEGIN
+        return sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+
+    @staticmethod
+    def __count_leases__(connection, endpoint, visible_scan_ids):
+        count = 0
+        for scan_id, in connection.execute("SELECT scan_id FROM endpoint_lease WHERE endpoint = ? AND expires > ?",
+                                           (endpoint, time.time())):
+            if scan_id is None or scan_id not in visible_scan_ids:
+                count += 1
+        return count
+
+    def acquire(self, endpoint, limit, visible_scan_ids=()):
+        connection = self.__connect__()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute("DELETE FROM endpoint_lease WHERE expires <= ?", (time.time(),))
+                if self.__count_leases__(connection, endpoint, visible_scan_ids) >= int(limit):
+                    connection.execute("COMMIT")
+                    return None
+                lease_id = uuid.uuid4().hex
+                connection.execute("INSERT INTO endpoint_lease (lease_id, endpoint, owner, expires) "
+                                   "VALUES (?, ?, ?, ?)", (lease_id, endpoint, self.owner, time.time() + self.ttl))
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+        Logger.app.debug("Acquired lease {} on {}".format(lease_id, endpoint))
+        return EndpointLease(self, lease_id, endpoint)
+
+    def count(self, endpoint, visible_scan_ids=()):
+        connection = self.__connect__()
+        try:
+            return self.__count_leases__(connection, endpoint, visible_scan_ids)
+        finally:
+            connection.close()
+
+    def attach_scan(self, lease_id, scan_id):
+        connection = self.__connect__()
+        try:
+            # Give the new scan a full ttl to show up on the endpoint
+            connection.execute("UPDATE endpoint_lease SET scan_id = ?, expires = ? WHERE lease_id = ?",
+                               (str(scan_id), time.time() + self.ttl, lease_id))
+        finally:
+            connection.close()
+
+    def release(self, lease_id):
+        connection = self.__connect__()
+        try:
+            connection.execute("DELETE FROM endpoint_lease WHERE lease_id = ?", (lease_id,))
+        finally:
+            connection.close()
+
+
+def get_lease_backend(backend=LEASE_BACKEND_SQLITE, ttl=600):
+    """
+    Build the lease backend named in config.ini. Besides the builtin sqlite backend, a dotted path to a LeaseBackend
+    subclass (e.g. mycompany.leases.CoordinatorLeaseBackend) may be given to share leases between hosts.
+    :param backend: sqlite, none, or a dotted class path
+    :param ttl: Seconds an unreleased lease is held before it expires
+    :return: LeaseBackend, or None if leasing is disabled
+    """
+    if not backend or backend.lower() == LEASE_BACKEND_NONE:
+        return None
+    try:
+        if backend.lower() == LEASE_BACKEND_SQLITE:
+            return SqliteLeaseBackend(ttl=ttl)
+        module_name, class_name = backend.rsplit('.', 1)
+        return getattr(importlib.import_module(module_name), class_name)(ttl=ttl)
+    except (ImportError, AttributeError, ValueError, sqlite3.Error) as e:
+        Logger.app.error("Unable to load lease backend {}, endpoints will not be leased: {}".format(backend, e))
+        return None
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import ntpath
+import sqlite3
+import time
+from webbreaker.webbreakerlogger import Logger
+from webbreaker.webinspectlease import default_lease_db
+
+ASSET_SETTINGS = 'settings'
+ASSET_WEBMACRO = 'webmacro'
+ASSET_POLICY = 'policy'
+
+
+def asset_name(file_path):
+    """
+    The name WebInspect lists an uploaded file under, i.e. its file name without the extension
+    """
+    return ntpath.basename(file_path).split('.')[0]
+
+
+def file_digest(file_path, chunk_size=64 * 1024):
+    """
+    :return: sha256 hex digest of the file, or None if it can't be read
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except (IOError, OSError, TypeError):
+        return None
+    return digest.hexdigest()
+
+
+class AssetManifest(object):
+    """
+    Record of the settings, webmacros and policies uploaded to each WebInspect endpoint from this host, keyed on the
+    content hash of the uploaded file. A file whose hash matches the last upload to an endpoint doesn't need to be
+    uploaded there again, as long as the endpoint still lists it.
+    """
+
+    def __init__(self, db_path=None, timeout=30):
+        self.db_path = db_path if db_path else default_lease_db()
+        self.timeout = timeout
+        connection = self.__connect__()
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS asset_manifest ("
+                               "endpoint TEXT NOT NULL, "
+                               "kind TEXT NOT NULL, "
+                               "name TEXT NOT NULL, "
+                               "digest TEXT NOT NULL, "
+                               "uploaded REAL NOT NULL, "
+                               "PRIMARY KEY (endpoint, kind, name))")
+        finally:
+            connection.close()
+
+    def __connect__(self):
+        return sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+
+    def get(self, endpoint, kind, name):
+        """
+        :return: The digest of the last upload of name to endpoint, or None
+        """
+        connection = self.__connect__()
+        try:
+            row = connection.execute("SELECT digest FROM asset_manifest WHERE endpoint = ? AND kind = ? AND name = ?",
+                                     (endpoint, kind, name)).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def record(self, endpoint, kind, name, digest):
+        connection = self.__connect__()
+        try:
+            connection.execute("INSERT OR REPLACE INTO asset_manifest (endpoint, kind, name, digest, uploaded) "
+                               "VALUES (?, ?, ?, ?, ?)", (endpoint, kind, name, digest, time.time()))
+        finally:
+            connection.close()
+        Logger.app.debug("Recorded {0} {1} on {2} as {3}".format(kind, name, endpoint, digest))
+
+    def forget(self, endpoint, kind, name):
+        connection = self.__connect__()
+        try:
+            connection.execute("DELETE FROM asset_manifest WHERE endpoint = ? AND kind = ? AND name = ?",
+                               (endpoint, kind, name))
+        finally:
+            connection.close()
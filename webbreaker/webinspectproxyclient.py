@@ -3,7 +3,7 @@
 
 import random
 import string
-import webinspectapi.webinspect as webinspectapi
+from webbreaker.webinspectsession import PooledWebInspectApi
 from webbreaker.webbreakerlogger import Logger
 from webbreaker.confighelper import Config
 
@@ -26,7 +26,7 @@ class WebinspectProxyClient(object):
     def get_cert_proxy(self):
         path = Config().cert
 
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
         response = api.cert_proxy()
         if response.success:
             try:
@@ -40,7 +40,7 @@ class WebinspectProxyClient(object):
 
     def start_proxy(self):
 
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
         response = api.start_proxy(self.proxy_name, self.port, "")
         if response.success:
             return response.data
@@ -49,7 +49,7 @@ class WebinspectProxyClient(object):
 
     def delete_proxy(self):
 
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
         response = api.delete_proxy(self.proxy_name)
         if response.success:
             Logger.app.info("Proxy: '{0}' deleted from '{1}'".format(self.proxy_name, self.host))
@@ -57,7 +57,7 @@ class WebinspectProxyClient(object):
             Logger.app.critical("{}".format(response.message))
 
     def list_proxy(self):
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
         response = api.list_proxies()
         if response.success:
             return response.data
@@ -66,7 +66,7 @@ class WebinspectProxyClient(object):
 
     def download_proxy(self, webmacro, setting):
         Logger.app.debug('Downloading from: {}'.format(self.proxy_name))
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
         if webmacro:
             response = api.download_proxy_webmacro(self.proxy_name)
             extension = 'webmacro'
@@ -90,7 +90,7 @@ class WebinspectProxyClient(object):
     def upload_proxy(self, upload_file):
         Logger.app.info("Uploading to: '{}'".format(self.proxy_name))
         try:
-            api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+            api = PooledWebInspectApi(self.host, verify_ssl=False)
             response = api.upload_webmacro_proxy(self.proxy_name, upload_file)
 
             if response.success:
@@ -103,7 +103,7 @@ class WebinspectProxyClient(object):
             return 1
 
     def get_proxy(self):
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
         response = api.get_proxy_information(self.proxy_name)
         if response.success:
             return response.data
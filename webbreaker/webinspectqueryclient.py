@@ -3,7 +3,7 @@
 
 import os
 import json
-import webinspectapi.webinspect as webinspectapi
+from webbreaker.webinspectsession import PooledWebInspectApi
 from webbreaker.webbreakerlogger import Logger
 
 
@@ -19,7 +19,7 @@ class WebinspectQueryClient(object):
         :return: List of search results
         """
         scan_name = self.trim_ext(scan_name)
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
         return api.get_scan_by_name(scan_name).data
 
     def export_scan_results(self, scan_id, scan_name, extension):
@@ -32,16 +32,11 @@ class WebinspectQueryClient(object):
         scan_name = self.trim_ext(scan_name)
         Logger.app.debug('Exporting scan: {}'.format(scan_id))
         detail_type = 'Full' if extension == 'xml' else None
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
-        response = api.export_scan_format(scan_id, extension, detail_type)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
+        response = api.download_scan_format(scan_id, extension, '{0}.{1}'.format(scan_name, extension), detail_type)
 
         if response.success:
-            try:
-                with open('{0}.{1}'.format(scan_name, extension), 'wb') as f:
-                    Logger.app.info('Scan results file is available: {0}.{1}'.format(scan_name, extension))
-                    f.write(response.data)
-            except UnboundLocalError as e:
-                Logger.app.error('Error saving file locally {}'.format(e))
+            Logger.app.info('Scan results file is available: {0}.{1}'.format(scan_name, extension))
         else:
             Logger.app.error('Unable to retrieve scan results. {} '.format(response.message))
 
@@ -50,7 +45,7 @@ class WebinspectQueryClient(object):
         List all scans found on host
         :return: response.data from the Webinspect server
         """
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
         response = api.list_scans()
         if response.success:
             return response.data
@@ -63,7 +58,7 @@ class WebinspectQueryClient(object):
         :param scan_guid:
         :return: Current status of scan
         """
-        api = webinspectapi.WebInspectApi(self.host, verify_ssl=False)
+        api = PooledWebInspectApi(self.host, verify_ssl=False)
         try:
             response = api.get_current_status(scan_guid)
             status = json.loads(response.data_json())['ScanStatus']
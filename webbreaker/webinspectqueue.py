@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import socket
+import sqlite3
+import time
+import uuid
+from webbreaker.webbreakerlogger import Logger
+from webbreaker.webinspectlease import default_lease_db
+
+
+class AdmissionQueue(object):
+    """
+    Host-wide queue of WebBreaker runs waiting for a WebInspect scan engine. Runs are admitted by priority (highest
+    first) and then in arrival order. Only the run at the head of the queue probes the scan engines, everyone else
+    waits on the queue itself, so a freed slot goes to the run that has waited longest. Runs launched with --max_wait
+    always go through the queue; runs without it probe the engines directly and never wait.
+    """
+
+    def __init__(self, db_path=None, poll_interval=5, max_poll_interval=60, stale_after=300, timeout=30):
+        self.db_path = db_path if db_path else default_lease_db()
+        self.poll_interval = float(poll_interval)
+        self.max_poll_interval = float(max_poll_interval)
+        # Entries whose owner hasn't checked in for this long are assumed dead and dropped
+        self.stale_after = max(float(stale_after), 2 * self.max_poll_interval)
+        self.timeout = timeout
+        self.owner = "{0}:{1}".format(socket.gethostname(), os.getpid())
+        connection = self.__connect__()
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS admission_queue ("
+                               "ticket TEXT PRIMARY KEY, "
+                               "scan_name TEXT, "
+                               "priority INTEGER NOT NULL, "
+                               "enqueued REAL NOT NULL, "
+                               "heartbeat REAL NOT NULL, "
+                               "owner TEXT)")
+        finally:
+            connection.close()
+
+    def __connect__(self):
+        return sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+
+    def enqueue(self, scan_name, priority=0):
+        ticket = uuid.uuid4().hex
+        now = time.time()
+        connection = self.__connect__()
+        try:
+            connection.execute("INSERT INTO admission_queue (ticket, scan_name, priority, enqueued, heartbeat, owner) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", (ticket, scan_name, int(priority), now, now, self.owner))
+        finally:
+            connection.close()
+        return ticket
+
+    def dequeue(self, ticket):
+        connection = self.__connect__()
+        try:
+            connection.execute("DELETE FROM admission_queue WHERE ticket = ?", (ticket,))
+        finally:
+            connection.close()
+
+    def position(self, ticket):
+        """
+        Check in for ticket and find where it stands in the queue.
+        :return: (position, length) where position 0 is the head of the queue
+        """
+        now = time.time()
+        connection = self.__connect__()
+        try:
+            connection.execute("DELETE FROM admission_queue WHERE heartbeat < ?", (now - self.stale_after,))
+            connection.execute("UPDATE admission_queue SET heartbeat = ? WHERE ticket = ?", (now, ticket))
+            tickets = [row[0] for row in connection.execute("SELECT ticket FROM admission_queue "
+                                                            "ORDER BY priority DESC, enqueued ASC")]
+        finally:
+            connection.close()
+        if ticket not in tickets:
+            return None, len(tickets)
+        return tickets.index(ticket), len(tickets)
+
+    def entries(self):
+        """
+        :return: Queued runs in admission order, as (scan_name, priority, seconds waiting, owner) tuples
+        """
+        now = time.time()
+        connection = self.__connect__()
+        try:
+            rows = connection.execute("SELECT scan_name, priority, enqueued, owner FROM admission_queue "
+                                      "WHERE heartbeat >= ? ORDER BY priority DESC, enqueued ASC",
+                                      (now - self.stale_after,)).fetchall()
+        finally:
+            connection.close()
+        return [(scan_name, priority, now - enqueued, owner) for scan_name, priority, enqueued, owner in rows]
+
+    def admit(self, get_endpoint, scan_name, max_wait, priority=0):
+        """
+        Wait in the queue until get_endpoint hands out a scan engine or max_wait seconds pass. The engines are
+        re-probed with exponential backoff while this run is at the head of the queue.
+        :param get_endpoint: Callable returning an endpoint, or None when every engine is saturated
+        :param scan_name: Name shown to other runs listing the queue
+        :param max_wait: Max seconds to wait for an endpoint
+        :param priority: Runs with a higher priority are admitted first
+        :return: The endpoint, or None if max_wait passed first
+        """
+        ticket = self.enqueue(scan_name, priority)
+        deadline = time.time() + float(max_wait)
+        backoff = self.poll_interval
+        last_position = None
+        try:
+            while True:
+                position, length = self.position(ticket)
+                if position is None:
+                    # Our entry went stale (e.g. the host was suspended), get back in line
+                    Logger.app.info("Lost our place in the WebInspect scan queue, re-queueing")
+                    ticket = self.enqueue(scan_name, priority)
+                    continue
+                if position != last_position:
+                    Logger.app.info("Waiting on a WebInspect scan engine, position {0} of {1} in queue".format(
+                        position + 1, length))
+                    last_position = position
+
+                if position == 0:
+                    endpoint = get_endpoint()
+                    if endpoint:
+                        return endpoint
+                    wait = backoff
+                    backoff = min(backoff * 2, self.max_poll_interval)
+                else:
+                    # Not our turn yet, keep an eye on the line without touching the scan engines
+                    wait = min(1.0, self.poll_interval)
+                    backoff = self.poll_interval
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    Logger.app.error("Gave up waiting on a WebInspect scan engine after {} seconds".format(max_wait))
+                    return None
+                # A little jitter keeps runs sharing the queue from probing in lock step
+                time.sleep(min(remaining, wait * random.uniform(0.9, 1.1)))
+        finally:
+            self.dequeue(ticket)
@@ -9,15 +9,23 @@ try:
 except ImportError:
     from urllib.parse import urlparse
 from webbreaker.webbreakerconfig import WebBreakerConfig
-from webbreaker.webbreakerlogger import Logger
+from webbreaker.webbreakerlogger import Logger, flush_logs
 
 handle_scan_event = None
-reporter = WebBreakerConfig().create_reporter()
+reporter = None
+
+
+def get_reporter():
+    # Built on first use rather than at import, as it reads the emailer settings
+    global reporter
+    if reporter is None:
+        reporter = WebBreakerConfig().create_reporter()
+    return reporter
 
 
 # Use a closure for events related to scan status changes
 def create_scan_event_handler(webinspect_client, scan_id, webinspect_settings):
-    def scan_event_handler(event_type, external_termination=False):
+    def scan_event_handler(event_type, external_termination=False, status=None):
         try:
             event = {}
             event['scanid'] = scan_id
@@ -26,16 +34,21 @@ def create_scan_event_handler(webinspect_client, scan_id, webinspect_settings):
             event['event'] = event_type
             event['timestamp'] = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
             event['subject'] = 'WebBreaker ' + event['event']
+            if status:
+                event['status'] = status
+                event['subject'] = '{0} {1}'.format(event['subject'], status)
 
             if webinspect_settings['webinspect_allowed_hosts']:
                 event['targets'] = webinspect_settings['webinspect_allowed_hosts']
             else:
                 event['targets'] = webinspect_settings['webinspect_scan_targets']
 
-            reporter.report(event)
+            get_reporter().report(event)
 
             if external_termination:
                 webinspect_client.stop_scan(scan_id)
+            if event_type == 'scan_end':
+                webinspect_client.release_endpoint()
         except Exception as e:
             Logger.console.error("Oh no: {}".format(e.message))
 
@@ -48,6 +61,8 @@ def create_scan_event_handler(webinspect_client, scan_id, webinspect_settings):
 # handler within the scan-running context.
 def write_end_event(*args):
     handle_scan_event('scan_end', external_termination=True)
+    # os._exit skips atexit, so write out the queued log records first
+    flush_logs()
     os._exit(0)
 
 
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import time
+from webbreaker.webbreakerlogger import Logger
+
+# Scan statuses WebInspect never moves a scan on from without someone relaunching it
+TERMINAL_SCAN_STATUSES = ('complete', 'incomplete', 'stopped', 'notrunning', 'failed')
+# Scan statuses that need someone to act on the scan before it moves on
+STALLED_SCAN_STATUSES = ('paused', 'interrupted')
+SCAN_STATUS_CHANGE_EVENT = 'scan_status_change'
+
+
+class ScanWatcher(object):
+    """
+    Follows a WebInspect scan until it reaches a terminal status. The watcher long-polls the scan for status changes,
+    and falls back to polling with an interval that grows while nothing changes. Each status change is reported to
+    on_event, and failed status checks are retried until they have failed for reconnect_timeout seconds.
+    """
+
+    def __init__(self, scan_id, get_status, wait_for_change=None, on_event=None, poll_interval=5,
+                 max_poll_interval=60, reconnect_timeout=600, stall_timeout=3600):
+        """
+        :param scan_id: The scan to watch
+        :param get_status: Called as get_status(scan_id), returns the scan status or None if it couldn't be retrieved
+        :param wait_for_change: Called as wait_for_change(scan_id) to long-poll for a status change in between status
+        checks, returning on a change or a timeout. Without it the watcher only polls.
+        :param on_event: Called as on_event(SCAN_STATUS_CHANGE_EVENT, status=new_status) on every status change,
+        e.g. the handler returned by webinspectscanhelpers.create_scan_event_handler
+        :param poll_interval: Seconds between status checks right after a change
+        :param max_poll_interval: Max seconds between status checks
+        :param reconnect_timeout: Give up after the status has been unavailable this long
+        :param stall_timeout: Give up after the scan has been Paused or Interrupted this long
+        """
+        self.scan_id = scan_id
+        self.get_status = get_status
+        self.wait_for_change = wait_for_change
+        self.on_event = on_event
+        self.poll_interval = float(poll_interval)
+        self.max_poll_interval = max(float(max_poll_interval), self.poll_interval)
+        self.reconnect_timeout = float(reconnect_timeout)
+        self.stall_timeout = float(stall_timeout)
+        self.status = None
+        self.result = None
+        self.interval = self.poll_interval
+        self.unreachable_since = None
+        self.stalled_since = None
+
+    def __get_status__(self):
+        status = self.get_status(self.scan_id)
+        # 'Unknown' is what WebinspectClient.get_scan_status answers when the status can't be retrieved
+        if not status or status == 'Unknown':
+            return None
+        return status
+
+    def __transition__(self, status):
+        previous = self.status
+        self.status = status
+        if previous is None:
+            Logger.app.debug("Scan {0} status is {1}".format(self.scan_id, status))
+            return
+        Logger.app.info("Scan status has changed from {0} to {1}.".format(previous, status))
+        if self.on_event:
+            try:
+                self.on_event(SCAN_STATUS_CHANGE_EVENT, status=status)
+            except Exception as e:
+                Logger.app.error("Unable to handle scan status change to {0}: {1}".format(status, e))
+
+    def step(self):
+        """
+        Check on the scan once, so that a single loop can follow many scans.
+        :return: Seconds until the scan should be checked again, or None once watching is over, see result
+        """
+        status = self.__get_status__()
+        now = time.time()
+        if status is None:
+            if self.unreachable_since is None:
+                self.unreachable_since = now
+                self.interval = self.poll_interval
+                Logger.app.debug("Lost track of scan {0}, reconnecting".format(self.scan_id))
+            elif now - self.unreachable_since > self.reconnect_timeout:
+                Logger.app.error("Unable to check on scan {0} for {1} seconds, no longer watching it".format(
+                    self.scan_id, int(now - self.unreachable_since)))
+                self.result = self.status if self.status else 'Unknown'
+                return None
+        else:
+            if self.unreachable_since is not None:
+                Logger.app.debug("Back in touch with scan {0}".format(self.scan_id))
+                self.unreachable_since = None
+            if status != self.status:
+                self.__transition__(status)
+                self.interval = self.poll_interval
+                self.stalled_since = now if status.lower() in STALLED_SCAN_STATUSES else None
+            if status.lower() in TERMINAL_SCAN_STATUSES:
+                self.result = status
+                return None
+            if self.stalled_since is not None and now - self.stalled_since > self.stall_timeout:
+                Logger.app.error("Scan {0} has been {1} for {2} seconds, no longer watching it".format(
+                    self.scan_id, status, int(now - self.stalled_since)))
+                self.result = status
+                return None
+            if self.wait_for_change and status.lower() not in STALLED_SCAN_STATUSES:
+                self.wait_for_change(self.scan_id)
+                if self.__get_status__() not in (None, status):
+                    # Changed while we were waiting, pick it up straight away
+                    return 0
+
+        # A little jitter keeps scans launched together from polling in lock step
+        wait = self.interval * random.uniform(0.9, 1.1)
+        self.interval = min(self.interval * 2, self.max_poll_interval)
+        return wait
+
+    def watch(self):
+        """
+        Blocks until the scan reaches a terminal status, the scan stalls for longer than stall_timeout, or the server
+        can't be checked for longer than reconnect_timeout.
+        :return: The last known scan status, or 'Unknown' if it was never retrieved
+        """
+        while True:
+            wait = self.step()
+            if wait is None:
+                return self.result
+            time.sleep(wait)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*-coding:utf-8-*-
+
+import atexit
+import os
+import threading
+import requests
+import requests.exceptions
+from requests.adapters import HTTPAdapter
+import webinspectapi.webinspect as webinspectapi
+from webinspectapi.webinspect import WebInspectResponse
+from webbreaker.transferutil import read_validator, remove_files, replace_file, write_validator
+from webbreaker.webbreakermetrics import metrics, instrumented_request
+
+try:
+    from urlparse import urlparse
+except ImportError:  # Python3
+    from urllib.parse import urlparse
+
+# Max keep-alive connections held open to a single WebInspect server
+POOL_MAXSIZE = 10
+# Bytes read from the socket and written to disk at a time when streaming scan exports
+CHUNK_SIZE = 1024 * 1024
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(host, verify_ssl=False):
+    """
+    Return the requests.Session shared by every WebInspect API call to host in this process. Reusing the session
+    keeps connections alive between calls, so only the first call to a server pays for the TCP and TLS handshake.
+    :param host: WebInspect server URL, any path is ignored
+    :param verify_ssl: Verify the server's certificate
+    :return: requests.Session
+    """
+    parsed = urlparse(host)
+    key = (parsed.scheme, parsed.netloc, verify_ssl)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.verify = verify_ssl
+            _sessions[key] = session
+        return session
+
+
+def discard_stale_parts(file_path, part_path):
+    """
+    Remove the .part files of other scans saved to file_path, e.g. left by an earlier run of a job reusing the name
+    """
+    directory, name = os.path.split(os.path.abspath(file_path))
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry.startswith(name + '.') and entry.endswith(('.part', '.part.validator')) and \
+                not path.startswith(os.path.abspath(part_path)):
+            os.remove(path)
+
+
+def close_sessions():
+    """
+    Close the connections held open by every shared session.
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+atexit.register(close_sessions)
+
+
+class PooledWebInspectApi(webinspectapi.WebInspectApi):
+    """
+    WebInspectApi that sends its requests over the session shared by every client of the same WebInspect server.
+    """
+
+    def __init__(self, host, verify_ssl=False, timeout=None, **kwargs):
+        super(PooledWebInspectApi, self).__init__(host, verify_ssl=verify_ssl, **kwargs)
+        self.timeout = timeout
+        self.session = get_session(host, verify_ssl)
+
+    def __credentials__(self):
+        if self.auth_type == 'basic':
+            return (self.username, self.password), None
+        elif self.auth_type == 'certificate':
+            return None, self.cert
+        return None, None
+
+    @instrumented_request('webinspect')
+    def _request(self, method, url, params=None, files=None, data=None, headers=None):
+        """Common handler for all HTTP requests"""
+        # Mirrors webinspectapi 1.0.35 WebInspectApi._request, sending over self.session instead of requests.request.
+        # Keep the responses in line with it when upgrading webinspectapi.
+        if not params:
+            params = {}
+
+        if not headers:
+            headers = {
+                'Accept': 'application/json'
+            }
+            if method == 'GET' or method == 'POST':
+                headers.update({'Content-Type': 'application/json'})
+        headers.update({'User-Agent': self.user_agent})
+
+        auth, cert = self.__credentials__()
+        response = None
+        try:
+            response = self.session.request(method=method, url=self.host + url, params=params, files=files,
+                                            headers=headers, data=data, verify=self.verify_ssl,
+                                            timeout=self.timeout, auth=auth, cert=cert)
+            try:
+                response.raise_for_status()
+
+                # two flavors of response are successful, GETs return 200, PUTs return 204 with empty response text
+                response_code = response.status_code
+                success = True if response_code // 100 == 2 else False
+                if response.text:
+                    try:
+                        data = response.json()
+                    except ValueError:  # Sometimes the returned data isn't JSON (e.g. GetScanFormat) so return raw
+                        data = response.content
+                else:
+                    data = ''
+
+                return WebInspectResponse(success=success, response_code=response_code, data=data)
+            except ValueError as e:
+                return WebInspectResponse(success=False, message="JSON response could not be decoded {}.".format(e))
+            except requests.exceptions.HTTPError as e:
+                if response.status_code == 401:
+                    return WebInspectResponse(success=False, response_code=401, message=e)
+                return WebInspectResponse(
+                    message='There was an error while handling the request. {}'.format(response.content),
+                    response_code=response.status_code, success=False)
+        except requests.exceptions.SSLError:
+            return WebInspectResponse(message='An SSL error occurred.', success=False)
+        except requests.exceptions.ConnectionError:
+            return WebInspectResponse(message='A connection error occurred.', success=False)
+        except requests.exceptions.Timeout:
+            return WebInspectResponse(message='The request timed out after {} seconds.'.format(self.timeout),
+                                      success=False)
+        except requests.exceptions.RequestException as e:
+            return WebInspectResponse(message='There was an error while handling the request. {}'.format(e),
+                                      success=False)
+        finally:
+            # Files handed to requests by the upload calls are never closed by webinspectapi
+            if files:
+                for value in files.values():
+                    handle = value[1] if isinstance(value, tuple) else value
+                    if hasattr(handle, 'close'):
+                        handle.close()
+
+    @metrics.timed('webinspect_download')
+    def download_scan_format(self, scan_id, extension, file_path, detail_type=None, chunk_size=CHUNK_SIZE):
+        """
+        Stream a scan export to file_path without holding it in memory. The export is written to a .part file named
+        after the scan and only moved to file_path once complete. A .part file left by an interrupted download of the
+        same scan is resumed with If-Range, so the server sends the whole export again if it has changed since.
+        .part files left by other scans saved to the same file_path are discarded.
+        :param scan_id:
+        :param extension: supported extensions are xml, scan, settings, fpr, crawl, issue, all
+        :param file_path: Where to save the export
+        :param detail_type: supported if extension is xml
+        :param chunk_size: Bytes held in memory at a time
+        :return: WebInspectResponse with the path to the export as data
+        """
+        params = {'detailType': detail_type} if extension == 'xml' and detail_type else {}
+        part_path = '{0}.{1}.part'.format(file_path, scan_id)
+        validator_path = part_path + '.validator'
+        headers = {'User-Agent': self.user_agent}
+        offset = 0
+        auth, cert = self.__credentials__()
+        try:
+            discard_stale_parts(file_path, part_path)
+            validator = read_validator(validator_path) if os.path.exists(part_path) else None
+            if validator:
+                offset = os.path.getsize(part_path)
+                headers['Range'] = 'bytes={}-'.format(offset)
+                headers['If-Range'] = validator
+
+            response = self.session.request(method='GET',
+                                            url=self.host + '/webinspect/scanner/scans/{0}.{1}'.format(scan_id,
+                                                                                                        extension),
+                                            params=params, headers=headers, verify=self.verify_ssl,
+                                            timeout=self.timeout, auth=auth, cert=cert, stream=True)
+            try:
+                if response.status_code == 416 and offset:
+                    # The partial file doesn't line up with this export anymore
+                    remove_files(part_path, validator_path)
+                    return self.download_scan_format(scan_id, extension, file_path, detail_type, chunk_size)
+                if response.status_code // 100 != 2:
+                    return WebInspectResponse(
+                        message='There was an error while handling the request. {}'.format(response.content),
+                        response_code=response.status_code, success=False)
+
+                resume = offset and response.status_code == 206
+                if not resume:
+                    # Only a download that can be told apart from a newer export of the scan is worth resuming
+                    write_validator(validator_path, response.headers.get('ETag') or
+                                    response.headers.get('Last-Modified'))
+                with open(part_path, 'ab' if resume else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+            finally:
+                response.close()
+            replace_file(part_path, file_path)
+            remove_files(validator_path)
+            return WebInspectResponse(success=True, response_code=response.status_code, data=file_path)
+        except requests.exceptions.SSLError:
+            return WebInspectResponse(message='An SSL error occurred.', success=False)
+        except requests.exceptions.ConnectionError:
+            return WebInspectResponse(message='A connection error occurred.', success=False)
+        except requests.exceptions.Timeout:
+            return WebInspectResponse(message='The request timed out after {} seconds.'.format(self.timeout),
+                                      success=False)
+        except requests.exceptions.RequestException as e:
+            return WebInspectResponse(message='There was an error while handling the request. {}'.format(e),
+                                      success=False)
+        except (IOError, OSError) as e:
+            return WebInspectResponse(message='Unable to save {0}: {1}'.format(file_path, e), success=False)